@@ -1,41 +1,110 @@
-import tempfile
 import os
-import shutil
-from flask import request, send_file, jsonify
+from io import BytesIO
+from flask import request, send_file, jsonify, make_response, Response, g
 from flask_restx import Namespace, Resource, fields
-from app.services.document_service import generate_document
-from app.validators.input_validator import validate_document_request
-from app.utils.file_cleanup import file_cleanup
+from app.services.document_service import generate_document, generate_documents
+from app.services.renderer_pool import RendererBusyError
+from app.services.render_cache import render_cache, make_cache_key
+from app.services.template_registry import template_registry, TemplateError, TemplateTooLargeError
+from app.utils.request_limits import REJECTED
+from app.services.batch_service import generate_batch, stream_archive, MAX_BATCH_DOCUMENTS
+from app.validators.input_validator import validate_document_request, validate_batch_request
+from app.utils.metrics import metrics, stage_timer
 
 # Create namespace
 document_ns = Namespace('api/v1', description='Document generation operations')
 
 # Define request models for documentation
 doc_model = document_ns.model('Document', {
-    'content_html': fields.String(required=True, description='HTML content for the body'),
+    'content_html': fields.String(required=False, description='HTML content for the body (required without template_id)'),
     'header_html': fields.String(required=False, description='HTML content for the header'),
     'footer_html': fields.String(required=False, description='HTML content for the footer'),
-    'document_type': fields.String(required=True, description='Document type (pdf or docx)', enum=['pdf', 'docx']),
-    'watermark': fields.String(required=False, description='HTML content for the watermark')
+    'document_type': fields.String(required=False, description='Document type (pdf or docx); required unless the template sets it', enum=['pdf', 'docx']),
+    'formats': fields.List(fields.String(enum=['pdf', 'docx']), required=False, description='Generate several document types at once, returned as a ZIP archive (replaces document_type)'),
+    'watermark': fields.String(required=False, description='HTML content for the watermark'),
+    'docx_template': fields.String(required=False, description='Name of a registered DOCX base template'),
+    'template_id': fields.String(required=False, description='Registered template to render instead of content_html'),
+    'data': fields.Raw(required=False, description='Template variables (object) used with template_id')
 })
 
+batch_model = document_ns.model('DocumentBatch', {
+    'documents': fields.List(fields.Nested(doc_model), required=True, description='Documents to generate')
+})
+
+MIMETYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'zip': 'application/zip'
+}
+
+REQUESTS = metrics.counter('docgen_requests_total', 'Generate requests by document type and response status',
+                           ['document_type', 'status'])
+
+def send_document(buffer, document_type, etag):
+    """
+    Stream a generated document from a buffer as a download attachment
+    
+    Args:
+        buffer: Readable binary file object positioned anywhere
+        document_type (str): "pdf" or "docx"
+        etag (str): ETag identifying the document
+        
+    Returns:
+        Response: Flask response streaming the buffer
+    """
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    response = send_file(
+        buffer,
+        mimetype=MIMETYPES[document_type],
+        as_attachment=True,
+        download_name=f'document.{document_type}',
+        etag=etag,
+        max_age=0
+    )
+    response.content_length = size
+    return response
+
 @document_ns.route('/generate')
 class DocumentGenerator(Resource):
     @document_ns.expect(doc_model)
-    @document_ns.response(200, 'Success - Returns document file')
+    @document_ns.response(200, 'Success - Returns document file (a ZIP archive of all formats with formats)')
+    @document_ns.response(304, 'Not Modified - Client copy matches the ETag')
     @document_ns.response(400, 'Validation Error')
+    @document_ns.response(413, 'Request or rendered template field too large')
     @document_ns.response(500, 'Internal Server Error')
+    @document_ns.response(503, 'Renderer busy - retry later')
     def post(self):
         """Generate a document (PDF or DOCX) from HTML content"""
-        tmp_path = None
-        response_file = None
+        with stage_timer('request'):
+            response = self._generate()
+        
+        # Set once the request is validated (template requests take it from the template)
+        document_type = g.get('document_type')
+        status = response[1] if isinstance(response, tuple) else response.status_code
+        REQUESTS.inc(document_type if document_type in MIMETYPES else 'invalid', status)
+        return response
+    
+    def _generate(self):
+        buffer = None
         
         try:
             # Get request data
             data = request.json
             
+            # Template requests are expanded into a plain document request first
+            if isinstance(data, dict) and 'template_id' in data:
+                try:
+                    data = template_registry.expand(data)
+                except TemplateTooLargeError as e:
+                    REJECTED.inc('template')
+                    return {"error": str(e)}, 413
+                except TemplateError as e:
+                    return {"error": str(e)}, 400
+            
             # Validate input
-            validation_result = validate_document_request(data)
+            with stage_timer('validate'):
+                validation_result = validate_document_request(data, allow_formats=True)
             if validation_result is not True:
                 return {"error": validation_result}, 400
                 
@@ -43,48 +112,124 @@ class DocumentGenerator(Resource):
             content_html = data.get('content_html', '')
             header_html = data.get('header_html', '')
             footer_html = data.get('footer_html', '')
-            document_type = data.get('document_type', '').lower()
             watermark = data.get('watermark', None)
+            docx_template = data.get('docx_template', None)
             
-            # Create a temporary file for the output
-            fd, tmp_path = tempfile.mkstemp(suffix=f'.{document_type}')
-            os.close(fd)
+            if 'formats' in data:
+                g.document_type = 'zip'
+                return self._generate_formats(content_html, header_html, footer_html, data['formats'], watermark,
+                                              docx_template)
+            
+            document_type = data.get('document_type', '').lower()
+            g.document_type = document_type
             
-            # Generate the document
-            output_path = generate_document(
+            # Identical requests render identical documents, so the request hash doubles as the ETag
+            with stage_timer('cache_lookup'):
+                cache_key = make_cache_key(content_html, header_html, footer_html, document_type, watermark,
+                                           docx_template)
+                if cache_key in request.if_none_match:
+                    response = make_response('', 304)
+                    response.set_etag(cache_key)
+                    return response
+                
+                cached = render_cache.get(cache_key)
+            if cached is not None:
+                return send_document(BytesIO(cached), document_type, cache_key)
+            
+            # Generate the document into a spooled in-memory buffer
+            buffer = generate_document(
                 content_html=content_html,
                 header_html=header_html,
                 footer_html=footer_html,
                 document_type=document_type,
-                output_path=tmp_path,
-                watermark=watermark
+                watermark=watermark,
+                docx_template=docx_template
             )
             
-            # Create a copy of the file that Flask can safely send
-            response_file = os.path.join(tempfile.gettempdir(), f"response_{os.path.basename(tmp_path)}")
-            shutil.copy2(tmp_path, response_file)
-            
-            # Mark original file for cleanup
-            file_cleanup.mark_for_cleanup(tmp_path)
+            # Keep the rendered bytes for repeat requests
+            with stage_timer('cache_store'):
+                size = buffer.seek(0, os.SEEK_END)
+                if render_cache.accepts(size):
+                    buffer.seek(0)
+                    render_cache.put(cache_key, buffer.read())
             
-            # Mark response file for delayed cleanup
-            file_cleanup.mark_for_cleanup(response_file)
-            
-            # Return the copied file as a download attachment
-            return send_file(
-                response_file, 
-                mimetype=f'application/{"pdf" if document_type == "pdf" else "vnd.openxmlformats-officedocument.wordprocessingml.document"}', 
-                as_attachment=True,
-                download_name=f'document.{document_type}',
-                max_age=0
-            )
+            # Stream the buffer back; it is closed when the response is closed
+            with stage_timer('send'):
+                return send_document(buffer, document_type, cache_key)
                 
+        except RendererBusyError as e:
+            # Render queue is full - apply backpressure instead of queueing forever
+            if buffer is not None:
+                buffer.close()
+            return {"error": str(e)}, 503, {'Retry-After': '1'}
         except Exception as e:
-            # Clean up files in case of error
-            for path in [tmp_path, response_file]:
-                if path and os.path.exists(path):
-                    try:
-                        os.unlink(path)
-                    except:
-                        pass
-            return {"error": str(e)}, 500
\ No newline at end of file
+            if buffer is not None:
+                buffer.close()
+            return {"error": str(e)}, 500
+
+    def _generate_formats(self, content_html, header_html, footer_html, formats, watermark, docx_template):
+        """
+        Generate several formats of one document and return them as a ZIP archive
+        
+        Formats missing from the render cache are rendered concurrently from one
+        parse of the inputs, so the response takes about as long as the slowest format.
+        """
+        document_types = list(dict.fromkeys(document_type.lower() for document_type in formats))
+        
+        with stage_timer('cache_lookup'):
+            cache_keys = {
+                document_type: make_cache_key(content_html, header_html, footer_html, document_type, watermark,
+                                              docx_template)
+                for document_type in document_types
+            }
+            etag = make_cache_key(content_html, header_html, footer_html, '+'.join(document_types), watermark,
+                                  docx_template)
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+            
+            files = {document_type: render_cache.get(key) for document_type, key in cache_keys.items()}
+        
+        missing = [document_type for document_type in document_types if files[document_type] is None]
+        if missing:
+            buffers = generate_documents(content_html, header_html, footer_html, missing, watermark, docx_template)
+            with stage_timer('cache_store'):
+                for document_type, buffer in buffers.items():
+                    size = buffer.seek(0, os.SEEK_END)
+                    buffer.seek(0)
+                    if render_cache.accepts(size):
+                        render_cache.put(cache_keys[document_type], buffer.read())
+                        buffer.seek(0)
+                    files[document_type] = buffer
+        
+        # Buffers are closed by the archive stream once copied
+        response = Response(
+            stream_archive([(f'document.{document_type}', files[document_type]) for document_type in document_types]),
+            mimetype=MIMETYPES['zip'],
+            headers={'Content-Disposition': 'attachment; filename=document.zip'},
+            direct_passthrough=True
+        )
+        response.set_etag(etag)
+        return response
+
+@document_ns.route('/generate/batch')
+class DocumentBatchGenerator(Resource):
+    # Items are validated individually so one bad document does not fail the batch
+    @document_ns.expect(batch_model, validate=False)
+    @document_ns.response(200, 'Success - Streams a ZIP archive with the documents and manifest.json')
+    @document_ns.response(400, 'Validation Error')
+    def post(self):
+        """Generate many documents in one request, streamed back as a ZIP archive"""
+        data = request.json
+        
+        validation_result = validate_batch_request(data, MAX_BATCH_DOCUMENTS)
+        if validation_result is not True:
+            return {"error": validation_result}, 400
+        
+        return Response(
+            generate_batch(data['documents']),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=documents.zip'},
+            direct_passthrough=True
+        )
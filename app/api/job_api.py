@@ -0,0 +1,103 @@
+from flask import request, send_file
+from flask_restx import Namespace, Resource, fields
+from app.api.document_api import MIMETYPES
+from app.services.job_service import job_manager, JobQueueFullError, SUCCEEDED
+from app.services.template_registry import template_registry, TemplateError, TemplateTooLargeError
+from app.utils.request_limits import REJECTED
+from app.validators.input_validator import validate_job_request
+
+# Create namespace
+job_ns = Namespace('api/v1/jobs', description='Asynchronous document generation jobs')
+
+# Define request models for documentation
+job_model = job_ns.model('Job', {
+    'content_html': fields.String(required=False, description='HTML content for the body (required without template_id)'),
+    'header_html': fields.String(required=False, description='HTML content for the header'),
+    'footer_html': fields.String(required=False, description='HTML content for the footer'),
+    'document_type': fields.String(required=False, description='Document type (pdf or docx); required unless the template sets it', enum=['pdf', 'docx']),
+    'watermark': fields.String(required=False, description='HTML content for the watermark'),
+    'docx_template': fields.String(required=False, description='Name of a registered DOCX base template'),
+    'template_id': fields.String(required=False, description='Registered template to render instead of content_html'),
+    'data': fields.Raw(required=False, description='Template variables (object) used with template_id'),
+    'priority': fields.Integer(required=False, description='Higher priorities run first', default=0),
+    'callback_url': fields.String(required=False, description='URL that receives the job state when it finishes')
+})
+
+JOB_FIELDS = ['content_html', 'header_html', 'footer_html', 'document_type', 'watermark', 'docx_template']
+
+@job_ns.route('')
+class JobList(Resource):
+    @job_ns.expect(job_model)
+    @job_ns.response(202, 'Accepted - Returns the job')
+    @job_ns.response(400, 'Validation Error')
+    @job_ns.response(413, 'Rendered template field too large')
+    @job_ns.response(503, 'Job queue full - retry later')
+    def post(self):
+        """Queue a document for background generation"""
+        data = request.json
+        
+        # The template is rendered now, so the job holds a plain document request
+        if isinstance(data, dict) and 'template_id' in data:
+            try:
+                data = template_registry.expand(data)
+            except TemplateTooLargeError as e:
+                REJECTED.inc('template')
+                return {"error": str(e)}, 413
+            except TemplateError as e:
+                return {"error": str(e)}, 400
+        
+        validation_result = validate_job_request(data)
+        if validation_result is not True:
+            return {"error": validation_result}, 400
+        
+        params = {field: data[field] for field in JOB_FIELDS if field in data}
+        params['document_type'] = params['document_type'].lower()
+        
+        try:
+            job = job_manager.submit(params, data.get('priority', 0), data.get('callback_url'))
+        except JobQueueFullError as e:
+            return {"error": str(e)}, 503, {'Retry-After': '5'}
+        
+        return job.to_dict(), 202, {'Location': f'/api/v1/jobs/{job.id}'}
+
+@job_ns.route('/<string:job_id>')
+class JobStatus(Resource):
+    @job_ns.response(200, 'Success - Returns the job')
+    @job_ns.response(404, 'Job not found or expired')
+    def get(self, job_id):
+        """Get the state of a job"""
+        job = job_manager.get(job_id)
+        if job is None:
+            return {"error": f"Job not found: {job_id}"}, 404
+        return job.to_dict()
+    
+    @job_ns.response(200, 'Success - Returns the cancelled job')
+    @job_ns.response(404, 'Job not found or expired')
+    def delete(self, job_id):
+        """Cancel a job"""
+        job = job_manager.cancel(job_id)
+        if job is None:
+            return {"error": f"Job not found: {job_id}"}, 404
+        return job.to_dict()
+
+@job_ns.route('/<string:job_id>/result')
+class JobResult(Resource):
+    @job_ns.response(200, 'Success - Returns document file')
+    @job_ns.response(404, 'Job not found or expired')
+    @job_ns.response(409, 'Job has not succeeded')
+    def get(self, job_id):
+        """Download the document produced by a job"""
+        job = job_manager.get(job_id)
+        if job is None:
+            return {"error": f"Job not found: {job_id}"}, 404
+        if job.status != SUCCEEDED:
+            return {"error": f"Job is {job.status}", "status": job.status}, 409
+        
+        document_type = job.params['document_type']
+        return send_file(
+            job.result_path,
+            mimetype=MIMETYPES[document_type],
+            as_attachment=True,
+            download_name=f'document.{document_type}',
+            max_age=0
+        )
@@ -0,0 +1,64 @@
+from flask import request
+from flask_restx import Namespace, Resource, fields
+from app.services.template_registry import template_registry, TemplateError, TemplateRegistryFullError
+from app.validators.input_validator import validate_template_request
+
+# Create namespace
+template_ns = Namespace('api/v1/templates', description='Reusable document templates')
+
+# Define request models for documentation
+template_model = template_ns.model('Template', {
+    'template_id': fields.String(required=False, description='Id to register under (derived from the content if omitted)'),
+    'content_html': fields.String(required=True, description='Jinja2 template for the body HTML'),
+    'header_html': fields.String(required=False, description='HTML (or Jinja2 template) for the header'),
+    'footer_html': fields.String(required=False, description='HTML (or Jinja2 template) for the footer'),
+    'watermark': fields.String(required=False, description='Watermark text (or Jinja2 template)'),
+    'document_type': fields.String(required=False, description='Default document type (pdf or docx)', enum=['pdf', 'docx']),
+    'docx_template': fields.String(required=False, description='Name of a registered DOCX base template')
+})
+
+@template_ns.route('')
+class TemplateList(Resource):
+    @template_ns.expect(template_model)
+    @template_ns.response(201, 'Created - Returns the template')
+    @template_ns.response(400, 'Validation Error or template does not compile')
+    @template_ns.response(507, 'Template limit reached')
+    def post(self):
+        """Register a template, compiling it once for later generate requests"""
+        data = request.json
+
+        validation_result = validate_template_request(data)
+        if validation_result is not True:
+            return {"error": validation_result}, 400
+
+        try:
+            template = template_registry.register(data, data.get('template_id'))
+        except TemplateError as e:
+            return {"error": str(e)}, 400
+        except TemplateRegistryFullError as e:
+            return {"error": str(e)}, 507
+
+        return template.to_dict(), 201, {'Location': f'/api/v1/templates/{template.id}'}
+
+    def get(self):
+        """List registered templates"""
+        return {"templates": [template.to_dict() for template in template_registry.list()]}
+
+@template_ns.route('/<string:template_id>')
+class TemplateItem(Resource):
+    @template_ns.response(200, 'Success - Returns the template')
+    @template_ns.response(404, 'Template not found')
+    def get(self, template_id):
+        """Get a registered template, including its source fields"""
+        template = template_registry.get(template_id)
+        if template is None:
+            return {"error": f"Template not found: {template_id}"}, 404
+        return dict(template.to_dict(), **template.fields)
+
+    @template_ns.response(204, 'Deleted')
+    @template_ns.response(404, 'Template not found')
+    def delete(self, template_id):
+        """Delete a template"""
+        if template_registry.delete(template_id) is None:
+            return {"error": f"Template not found: {template_id}"}, 404
+        return '', 204
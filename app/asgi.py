@@ -0,0 +1,277 @@
+"""
+ASGI entry point for the document generation service
+
+    uvicorn app.asgi:app --workers 1
+
+Requests are accepted on the event loop and the Flask app runs on executor
+threads. Render requests (the generate endpoints) share a pool capped at
+DOCGEN_ASYNC_RENDER_WORKERS and hold their render slot until the response body
+is sent, since streamed bodies (batch archives) render while they are iterated;
+everything else uses a separate I/O pool. Requests
+waiting for a render slot cost a coroutine, not a thread. Admission control
+answers 503 once DOCGEN_ASYNC_MAX_INFLIGHT requests are in flight, or when a
+request has waited DOCGEN_ASYNC_QUEUE_TIMEOUT seconds for a render slot.
+"""
+import os
+import sys
+import asyncio
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from app.main import create_app
+from app.utils.metrics import metrics
+from app.utils.request_limits import MAX_REQUEST_BYTES, RequestTooLargeError, REJECTED as LIMIT_REJECTED
+
+# Requests accepted at once, across all paths; more are turned away with 503
+MAX_INFLIGHT = int(os.environ.get('DOCGEN_ASYNC_MAX_INFLIGHT', 512))
+
+# Concurrent render requests; the rest wait on the event loop
+RENDER_WORKERS = int(os.environ.get('DOCGEN_ASYNC_RENDER_WORKERS', os.cpu_count() or 2))
+
+# Threads for cheap requests (health, metrics, job status) and for streaming response bodies
+IO_WORKERS = int(os.environ.get('DOCGEN_ASYNC_IO_WORKERS', 32))
+
+# Seconds a request may wait for a render slot before it is turned away
+QUEUE_TIMEOUT = float(os.environ.get('DOCGEN_ASYNC_QUEUE_TIMEOUT', 30))
+
+# POST requests under this prefix render documents
+RENDER_PREFIX = '/api/v1/generate'
+
+REJECTED = metrics.counter('docgen_async_rejected_total', 'Requests turned away by admission control', ['reason'])
+
+_BUSY_BODY = b'{"error": "Server is busy, retry later"}\n'
+_TOO_LARGE_BODY = f'{{"error": "Request body exceeds the limit of {MAX_REQUEST_BYTES} bytes"}}\n'.encode()
+
+
+class _WsgiResponse:
+    """
+    Status, headers and body of a WSGI call, captured on an executor thread
+    """
+
+    def __init__(self):
+        self.status = None
+        self.headers = None
+        self.written = []
+        self.body = None
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info and self.status is not None:
+            raise exc_info[1].with_traceback(exc_info[2])
+        self.status = int(status.split(' ', 1)[0])
+        self.headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        return self.written.append
+
+
+class AsyncDocumentServer:
+    """
+    ASGI application running a WSGI app with bounded render concurrency
+    """
+
+    def __init__(self, wsgi_app, max_inflight=MAX_INFLIGHT, render_workers=RENDER_WORKERS,
+                 io_workers=IO_WORKERS, queue_timeout=QUEUE_TIMEOUT):
+        self.wsgi_app = wsgi_app
+        self.max_inflight = max_inflight
+        self.render_workers = render_workers
+        self.queue_timeout = queue_timeout
+        self.render_executor = ThreadPoolExecutor(max_workers=render_workers, thread_name_prefix='docgen-render')
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix='docgen-io')
+        self.render_slots = None
+        self.inflight = 0
+        self.waiting = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.render_executor.shutdown(wait=False)
+                self.io_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        # Admission is checked before the body is read so an overloaded server sheds load cheaply
+        if self.inflight >= self.max_inflight:
+            REJECTED.inc('capacity')
+            await self._send_busy(send)
+            return
+
+        self.inflight += 1
+        try:
+            try:
+                body = await self._read_body(scope, receive)
+            except RequestTooLargeError as e:
+                # The raw body is over the limit before any decoding; don't buffer the rest
+                LIMIT_REJECTED.inc(e.reason)
+                await self._send_json(send, 413, _TOO_LARGE_BODY, [(b'connection', b'close')])
+                return
+            if body is None:
+                return  # Client went away
+            environ = self._environ(scope, body)
+            if scope['method'] == 'POST' and scope['path'].startswith(RENDER_PREFIX):
+                await self._run_render(environ, send)
+            else:
+                response = await self._run(self.io_executor, environ)
+                await self._send_response(response, send, self.io_executor)
+        finally:
+            self.inflight -= 1
+
+    async def _read_body(self, scope, receive):
+        """
+        Buffer the request body, failing fast once it passes MAX_REQUEST_BYTES
+
+        The limits on the decoded body and its fields are applied by the app's
+        RequestLimitMiddleware; this only keeps oversized uploads out of memory.
+
+        Returns:
+            bytes|None: The body, or None if the client disconnected
+        """
+        for name, value in scope.get('headers', []):
+            if name == b'content-length' and value.isdigit() and int(value) > MAX_REQUEST_BYTES:
+                raise RequestTooLargeError("Request body too large", 'content_length')
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_REQUEST_BYTES:
+                raise RequestTooLargeError("Request body too large", 'body')
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def _run_render(self, environ, send):
+        """
+        Run a render request once a render slot is free and send its response
+
+        The slot is held until the response body is exhausted or closed, and the
+        body is iterated on the render pool, so renders that run while a streamed
+        body is pulled (batch archives) count against the cap too. Answers 503 if
+        no slot frees up within the queue timeout.
+        """
+        if self.render_slots is None:
+            # Created here so it belongs to the serving event loop
+            self.render_slots = asyncio.Semaphore(self.render_workers)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.render_slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            REJECTED.inc('queue_timeout')
+            await self._send_busy(send)
+            return
+        finally:
+            self.waiting -= 1
+        try:
+            response = await self._run(self.render_executor, environ)
+            await self._send_response(response, send, self.render_executor)
+        finally:
+            self.render_slots.release()
+
+    async def _run(self, executor, environ):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self._call_wsgi, environ)
+
+    def _call_wsgi(self, environ):
+        response = _WsgiResponse()
+        # The view runs here; a streamed body is iterated later by _send_response
+        response.body = self.wsgi_app(environ, response.start_response)
+        return response
+
+    async def _send_response(self, response, send, executor):
+        """
+        Send a captured response, pulling its body on the given executor
+        """
+        loop = asyncio.get_running_loop()
+        await send({'type': 'http.response.start', 'status': response.status, 'headers': response.headers})
+        try:
+            for chunk in response.written:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if response.body is not None:
+                iterator = iter(response.body)
+                while True:
+                    chunk = await loop.run_in_executor(executor, next, iterator, None)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Closing the body releases its spooled buffers and cancels a batch's pending renders
+            if hasattr(response.body, 'close'):
+                await loop.run_in_executor(executor, response.body.close)
+
+    async def _send_busy(self, send):
+        await self._send_json(send, 503, _BUSY_BODY, [(b'retry-after', b'1')])
+
+    async def _send_json(self, send, status, body, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+                       + list(headers)
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _environ(self, scope, body):
+        """
+        Build a PEP 3333 environ for an ASGI http scope
+        """
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client')
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        if client:
+            environ['REMOTE_ADDR'] = client[0]
+            environ['REMOTE_PORT'] = str(client[1])
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+                continue
+            if name == 'CONTENT_LENGTH':
+                continue
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    def stats(self):
+        """
+        Current admission state for diagnostics
+        """
+        return {'inflight': self.inflight, 'waiting': self.waiting}
+
+
+app = AsyncDocumentServer(create_app())
+
+metrics.gauge('docgen_async_inflight', 'Requests accepted by the ASGI server and not yet finished',
+              lambda: app.stats()['inflight'])
+metrics.gauge('docgen_async_render_waiting', 'Render requests waiting for a render slot',
+              lambda: app.stats()['waiting'])
@@ -2,15 +2,23 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, Response
 from flask_cors import CORS
 from flask_restx import Api
 from app.api.document_api import document_ns
+from app.api.job_api import job_ns
+from app.api.template_api import template_ns
+from app.services.job_service import job_manager
+from app.utils.metrics import metrics
+from app.utils.request_limits import RequestLimitMiddleware
 
 def create_app():
     app = Flask(__name__)
     CORS(app)  # Enable CORS for all routes
     
+    # Enforce request size limits and decode compressed bodies before any view parses them
+    app.wsgi_app = RequestLimitMiddleware(app.wsgi_app)
+    
     # Configure API documentation
     api = Api(
         app, 
@@ -23,11 +31,21 @@ def create_app():
     
     # Add namespaces
     api.add_namespace(document_ns)
+    api.add_namespace(job_ns)
+    api.add_namespace(template_ns)
+    
+    # Start the job threads now so expired and leftover job results are purged even while idle
+    job_manager.start()
     
     @app.route('/', methods=['GET'])
     def health_check():
         return jsonify({"status": "healthy", "service": "Document Generation Service"})
     
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        # Prometheus text exposition format
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    
     return app
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from app.utils.metrics import metrics
+
+# Number of prepared decoration assets kept across requests
+ASSET_CACHE_SIZE = int(os.environ.get('DOCGEN_ASSET_CACHE_SIZE', 256))
+
+
+class AssetCache:
+    """
+    LRU cache of prepared header, footer and watermark assets keyed by content hash
+
+    Each asset kind (e.g. a PDF header file or a DOCX footer paragraph) has its own
+    builder; the builder runs only the first time a given content is seen.
+    """
+
+    def __init__(self, max_entries=ASSET_CACHE_SIZE):
+        self.max_entries = max_entries
+        # (kind, digest) -> (value, cleanup)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, content, build, cleanup=None):
+        """
+        Get a prepared asset, building it on a miss
+
+        Args:
+            kind (str): Asset kind, so equal content can map to different assets
+            content (str): Source content (HTML or text) the asset is built from
+            build (callable): Called with content to build the asset
+            cleanup (callable, optional): Called with the asset when it is evicted
+
+        Returns:
+            The prepared asset
+        """
+        key = (kind, hashlib.sha256(content.encode('utf-8')).hexdigest())
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = build(content)
+
+        evicted = []
+        with self.lock:
+            if key in self.entries:
+                # Another thread built the same asset first; keep theirs
+                evicted.append((value, cleanup))
+                value = self.entries[key][0]
+            else:
+                self.entries[key] = (value, cleanup)
+                while len(self.entries) > self.max_entries:
+                    evicted.append(self.entries.popitem(last=False)[1])
+
+        for old_value, old_cleanup in evicted:
+            if old_cleanup is not None:
+                try:
+                    old_cleanup(old_value)
+                except Exception:
+                    pass
+        return value
+
+    def stats(self):
+        """
+        Hit/miss counters and current size
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
+
+
+# Singleton instance
+asset_cache = AssetCache()
+
+metrics.gauge('docgen_asset_cache_entries', 'Prepared header, footer and watermark assets kept',
+              lambda: asset_cache.stats()['entries'])
@@ -0,0 +1,190 @@
+import os
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.services.document_service import generate_document
+from app.services.render_cache import render_cache, make_cache_key
+from app.services.template_registry import template_registry, TemplateError
+from app.validators.input_validator import validate_document_request
+
+# Number of documents rendered concurrently within one batch
+BATCH_WORKERS = int(os.environ.get('DOCGEN_BATCH_WORKERS', os.cpu_count() or 2))
+
+# Maximum number of documents accepted in one batch request
+MAX_BATCH_DOCUMENTS = int(os.environ.get('DOCGEN_BATCH_MAX_DOCUMENTS', 1000))
+
+# Size of the chunks copied from each rendered document into the archive
+CHUNK_SIZE = 64 * 1024
+
+
+class _StreamSink:
+    """
+    Write-only, non-seekable file object that collects ZIP output for streaming
+
+    zipfile falls back to data descriptors when the target cannot tell(), so
+    entries can be written without buffering the whole archive.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _render_item(item):
+    """
+    Render a single batch item into a buffer (or serve it from the render cache)
+    """
+    document_type = item['document_type'].lower()
+    cache_key = make_cache_key(item.get('content_html', ''), item.get('header_html', ''),
+                               item.get('footer_html', ''), document_type, item.get('watermark'),
+                               item.get('docx_template'))
+    cached = render_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    buffer = generate_document(
+        content_html=item.get('content_html', ''),
+        header_html=item.get('header_html', ''),
+        footer_html=item.get('footer_html', ''),
+        document_type=document_type,
+        watermark=item.get('watermark', None),
+        docx_template=item.get('docx_template', None)
+    )
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    if render_cache.accepts(size):
+        data = buffer.read()
+        buffer.close()
+        render_cache.put(cache_key, data)
+        return data
+    return buffer
+
+
+def _write_entry(archive, sink, filename, result):
+    """
+    Add a rendered document (bytes or a readable buffer, closed afterwards) to the
+    archive, yielding the archive bytes as they are produced
+    """
+    with archive.open(filename, 'w') as entry:
+        if isinstance(result, bytes):
+            entry.write(result)
+        else:
+            with result:
+                for chunk in iter(lambda: result.read(CHUNK_SIZE), b''):
+                    entry.write(chunk)
+                    yield sink.drain()
+    yield sink.drain()
+
+
+def stream_archive(files):
+    """
+    Stream already rendered documents back as a ZIP archive
+
+    Args:
+        files (list): (filename, bytes or readable buffer) pairs; buffers are closed once copied
+
+    Yields:
+        bytes: Successive chunks of the ZIP archive
+    """
+    sink = _StreamSink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    started = 0
+    try:
+        for filename, result in files:
+            started += 1
+            yield from _write_entry(archive, sink, filename, result)
+        archive.close()
+        yield sink.drain()
+    finally:
+        # Close the buffers not reached yet if the client goes away mid-stream
+        for _, result in files[started:]:
+            if not isinstance(result, bytes):
+                result.close()
+
+
+def generate_batch(documents):
+    """
+    Render a list of documents concurrently and stream them back as a ZIP archive
+
+    Items are written to the archive as soon as they finish rendering. At most
+    twice as many items as there are workers are rendered ahead of the archive,
+    and more are submitted only as entries are written, so memory follows the
+    pace of the consumer. Items that fail validation or rendering are skipped
+    and reported in manifest.json, which is written last.
+
+    Args:
+        documents (list): Document specs in the same shape as a generate request
+
+    Yields:
+        bytes: Successive chunks of the ZIP archive
+    """
+    sink = _StreamSink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    manifest = [None] * len(documents)
+
+    # Expand template items and validate everything up front so bad items never reach a renderer
+    documents = list(documents)
+    valid = []
+    for index, item in enumerate(documents):
+        if isinstance(item, dict) and 'template_id' in item:
+            try:
+                documents[index] = item = template_registry.expand(item)
+            except TemplateError as e:
+                manifest[index] = {"index": index, "status": "error", "error": str(e)}
+                continue
+        validation_result = validate_document_request(item)
+        if validation_result is not True:
+            manifest[index] = {"index": index, "status": "error", "error": validation_result}
+        else:
+            valid.append(index)
+
+    workers = max(1, min(BATCH_WORKERS, len(valid)))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    queued = iter(valid)
+    pending = {}  # future -> index, rendering or rendered and not yet written
+
+    def submit_more():
+        while len(pending) < workers * 2:
+            index = next(queued, None)
+            if index is None:
+                return
+            pending[executor.submit(_render_item, documents[index])] = index
+
+    try:
+        submit_more()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    manifest[index] = {"index": index, "status": "error", "error": str(e)}
+                else:
+                    filename = f"document_{index:04d}.{documents[index]['document_type'].lower()}"
+                    yield from _write_entry(archive, sink, filename, result)
+                    manifest[index] = {"index": index, "status": "ok", "filename": filename}
+                submit_more()
+
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+        archive.close()
+        yield sink.drain()
+    finally:
+        # Stop pending renders if the client goes away mid-stream, and release finished ones never written
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in pending:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                result = future.result()
+                if not isinstance(result, bytes):
+                    result.close()
@@ -1,24 +1,119 @@
-from app.services.pdf_service import generate_pdf
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from app.services.pdf_backends import render_pdf
 from app.services.docx_service import generate_docx
+from app.services.html_preprocess import prepare_document
+from app.utils.metrics import metrics, stage_timer, SIZE_BUCKETS
 
-def generate_document(content_html, header_html, footer_html, document_type, output_path, watermark=None):
+# Documents up to this size stay in memory; larger ones spill to a temporary file
+SPOOL_MAX_SIZE = int(float(os.environ.get('DOCGEN_SPOOL_MAX_MB', 16)) * 1024 * 1024)
+
+INPUT_BYTES = metrics.histogram('docgen_input_bytes', 'Size of the HTML given for a document',
+                                ['document_type'], SIZE_BUCKETS)
+OUTPUT_BYTES = metrics.histogram('docgen_output_bytes', 'Size of the generated document',
+                                 ['document_type'], SIZE_BUCKETS)
+
+def generate_document(content_html, header_html, footer_html, document_type, output_path=None, watermark=None,
+                      docx_template=None, prepared=None):
     """
     Generate a document based on the specified type
-    
+
     Args:
         content_html (str): HTML content for the body
         header_html (str): HTML content for the header
         footer_html (str): HTML content for the footer
         document_type (str): "pdf" or "docx"
-        output_path (str): Path where the document should be saved
+        output_path (str|file, optional): Path or writable binary file object where the
+            document should be saved. When omitted the document is written to a spooled
+            in-memory buffer.
         watermark (str, optional): HTML content for watermark
-        
+        docx_template (str, optional): Name of a registered DOCX base template (DOCX only)
+        prepared (PreparedDocument, optional): The inputs already prepared by prepare_document
+
     Returns:
-        str: Path to the generated document
+        str|file: Path to the generated document, or the output buffer rewound to the start
+    """
+    buffer = None
+    if output_path is None:
+        buffer = output_path = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+    document_type = document_type.lower()
+    input_size = sum(len(html or '') for html in (content_html, header_html, footer_html, watermark))
+    try:
+        if document_type not in ('pdf', 'docx'):
+            raise ValueError(f"Unsupported document type: {document_type}")
+        INPUT_BYTES.observe(input_size, document_type)
+        # Inputs are parsed at most once, and shared with other documents (in either format) with the same HTML
+        if prepared is None:
+            prepared = prepare_document(content_html, header_html, footer_html, watermark)
+        if document_type == 'pdf':
+            with stage_timer('generate_pdf'):
+                result = render_pdf(content_html, header_html, footer_html, output_path, watermark, prepared)
+        else:
+            with stage_timer('generate_docx'):
+                result = generate_docx(content_html, header_html, footer_html, output_path, watermark,
+                                       docx_template, prepared)
+    except Exception:
+        if buffer is not None:
+            buffer.close()
+        raise
+
+    OUTPUT_BYTES.observe(_output_size(output_path), document_type)
+    if buffer is not None:
+        buffer.seek(0)
+    return result
+
+def generate_documents(content_html, header_html, footer_html, document_types, watermark=None, docx_template=None):
+    """
+    Generate the same document in several formats at once
+
+    The formats render concurrently from one set of prepared inputs, so the
+    HTML is parsed once and header, footer and watermark assets are shared.
+
+    Args:
+        content_html (str): HTML content for the body
+        header_html (str): HTML content for the header
+        footer_html (str): HTML content for the footer
+        document_types (list): Formats to generate ("pdf" and/or "docx"); duplicates are ignored
+        watermark (str, optional): HTML content for watermark
+        docx_template (str, optional): Name of a registered DOCX base template (DOCX only)
+
+    Returns:
+        dict: Output buffer, rewound to the start, by document type (in the order requested)
+
+    Raises:
+        Exception: The first render failure; buffers already generated are closed
+    """
+    document_types = list(dict.fromkeys(document_type.lower() for document_type in document_types))
+    prepared = prepare_document(content_html, header_html, footer_html, watermark)
+
+    with ThreadPoolExecutor(max_workers=len(document_types)) as executor:
+        futures = {
+            document_type: executor.submit(generate_document, content_html, header_html, footer_html, document_type,
+                                           watermark=watermark, docx_template=docx_template, prepared=prepared)
+            for document_type in document_types
+        }
+    buffers = {}
+    error = None
+    for document_type, future in futures.items():
+        try:
+            buffers[document_type] = future.result()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        for buffer in buffers.values():
+            buffer.close()
+        raise error
+    return buffers
+
+def _output_size(output_path):
+    """
+    Size of a written document, from its path or the end position of its stream
     """
-    if document_type.lower() == 'pdf':
-        return generate_pdf(content_html, header_html, footer_html, output_path, watermark)
-    elif document_type.lower() == 'docx':
-        return generate_docx(content_html, header_html, footer_html, output_path, watermark)
-    else:
-        raise ValueError(f"Unsupported document type: {document_type}")
\ No newline at end of file
+    try:
+        if isinstance(output_path, str):
+            return os.path.getsize(output_path)
+        return output_path.tell()
+    except (OSError, ValueError, AttributeError):
+        return 0
@@ -1,14 +1,21 @@
-from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.section import WD_SECTION
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
-from bs4 import BeautifulSoup
+from docx.text.paragraph import Paragraph
 import os
+import copy
 from app.services.docx_watermark import add_proper_watermark
+from app.services.html_to_docx import add_blocks
+from app.services.html_preprocess import prepare_document
+from app.services.asset_cache import asset_cache
+from app.services.docx_templates import new_document
+from app.services.docx_stream import STREAM_THRESHOLD, add_body_marker, write_streamed_docx
+from app.utils.metrics import stage_timer
 
-def generate_docx(content_html, header_html, footer_html, output_path, watermark=None):
+def generate_docx(content_html, header_html, footer_html, output_path, watermark=None, docx_template=None,
+                  prepared=None):
     """
     Generate a DOCX document from HTML content with proper watermark and footer on last page only
     
@@ -16,88 +23,73 @@ def generate_docx(content_html, header_html, footer_html, output_path, watermark
         content_html (str): HTML content for the body
         header_html (str): HTML content for the header
         footer_html (str): HTML content for the footer (last page only)
-        output_path (str): Path to save the generated DOCX
+        output_path (str|file): Path or writable binary file object for the generated DOCX
         watermark (str, optional): HTML content for watermark
+        docx_template (str, optional): Name of a registered base template
+        prepared (PreparedDocument, optional): The inputs already prepared by prepare_document
         
     Returns:
-        str: Path to the generated document
+        str|file: The output_path that was written
     """
-    # Create a new Document
-    doc = Document()
-    
-    # Set document properties for better formatting
-    style = doc.styles['Normal']
-    style.font.name = 'Arial'
-    style.font.size = Pt(11)
-    
-    # Parse the content HTML
-    soup = BeautifulSoup(content_html, 'html.parser')
-    
-    # Process each HTML element and add to document
-    for element in soup.find_all(['h1', 'h2', 'h3', 'p', 'ul', 'ol', 'table']):
-        if element.name == 'h1':
-            heading = doc.add_heading(element.get_text().strip(), level=1)
-            heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        elif element.name == 'h2':
-            heading = doc.add_heading(element.get_text().strip(), level=2)
-        elif element.name == 'h3':
-            heading = doc.add_heading(element.get_text().strip(), level=3)
-        elif element.name == 'p':
-            # Check for page break
-            if 'page-break-before: always' in element.get('style', ''):
-                doc.add_page_break()
-            else:
-                para = doc.add_paragraph(element.get_text().strip())
-        elif element.name in ['ul', 'ol']:
-            for li in element.find_all('li'):
-                para = doc.add_paragraph(li.get_text().strip())
-                para.style = 'List Bullet' if element.name == 'ul' else 'List Number'
-        elif element.name == 'table':
-            # Create a table with the right number of rows and columns
-            rows = element.find_all('tr')
-            if rows:
-                cols = max(len(row.find_all(['td', 'th'])) for row in rows)
-                table = doc.add_table(rows=len(rows), cols=cols)
-                table.style = 'Table Grid'
-                
-                # Fill the table with data
-                for i, row in enumerate(rows):
-                    cells = row.find_all(['td', 'th'])
-                    for j, cell in enumerate(cells):
-                        if j < cols:  # Safety check
-                            table.cell(i, j).text = cell.get_text().strip()
+    if prepared is None:
+        prepared = prepare_document(content_html, header_html, footer_html, watermark)
     
+    # Very large bodies are streamed into the package instead of built as one tree
+    if len(content_html or '') >= STREAM_THRESHOLD:
+        with stage_timer('docx_layout'):
+            shell = new_document(docx_template)
+            body_marker = add_body_marker(shell)
+            apply_page_layout(shell, prepared)
+        with stage_timer('docx_stream'):
+            return write_streamed_docx(shell, body_marker, content_html, output_path, docx_template)
+    
+    # Clone the preloaded base template (styles and formatting are already set up)
+    with stage_timer('docx_clone'):
+        doc = new_document(docx_template)
+    
+    # Add the blocks of the prepared content (parsed once, shared with PDF renders)
+    with stage_timer('docx_content'):
+        add_blocks(doc, prepared.content.blocks)
+    
+    with stage_timer('docx_layout'):
+        apply_page_layout(doc, prepared)
+    
+    # Save the document with everything complete
+    with stage_timer('docx_save'):
+        doc.save(output_path)
+    return output_path
+
+def apply_page_layout(doc, prepared):
+    """
+    Add the last-page section, headers, watermark and last-page footer after the body content
+    
+    Args:
+        doc: The python-docx document object holding the body content
+        prepared (PreparedDocument): The prepared header, footer and watermark
+    """
+    header_html, footer_html, watermark = prepared.header.html, prepared.footer.html, prepared.watermark.html
     # Ensure we have a last section for the footer
     # Force creation of a new section for the last page
     doc.add_section(WD_SECTION.NEW_PAGE)
     # Add a small paragraph to the last page to ensure it exists
     doc.add_paragraph("").alignment = WD_ALIGN_PARAGRAPH.CENTER
     
-    # Add header if provided
+    # Add header if provided (the header run is prepared once per distinct header)
     if header_html:
-        header_soup = BeautifulSoup(header_html, 'html.parser')
-        header_text = header_soup.get_text().strip()
+        header_run = asset_cache.get('docx_header_run', header_html,
+                                     lambda _: _build_header_run(prepared.header.text))
         
         for section in doc.sections:
             header = section.header
             header_para = header.paragraphs[0] if header.paragraphs else header.add_paragraph()
-            header_para.text = header_text
+            header_para.clear()
+            header_para._p.append(copy.deepcopy(header_run))
             header_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            
-            # Apply formatting
-            for run in header_para.runs:
-                run.font.size = Pt(10)
-                run.font.color.rgb = RGBColor(119, 119, 119)  # #777
     
     # Add watermark to all pages
     if watermark:
-        watermark_text = watermark
-        if watermark.startswith('<'):
-            watermark_soup = BeautifulSoup(watermark, 'html.parser')
-            watermark_text = watermark_soup.get_text().strip()
-        
         # Use the proper watermark implementation
-        add_proper_watermark(doc, watermark_text)
+        add_proper_watermark(doc, prepared.watermark.text)
     
     # Disconnect all footers
     for i, section in enumerate(doc.sections):
@@ -110,30 +102,54 @@ def generate_docx(content_html, header_html, footer_html, output_path, watermark
             p._p = None
             p._element = None
     
-    # Add footer to last page only
+    # Add footer to last page only (the footer paragraph is prepared once per distinct footer)
     if footer_html and len(doc.sections) > 0:
-        footer_soup = BeautifulSoup(footer_html, 'html.parser')
-        footer_text = footer_soup.get_text().strip()
+        footer_p = asset_cache.get('docx_footer_paragraph', footer_html,
+                                   lambda _: _build_footer_paragraph(prepared.footer.text))
         
         # Get the last section
         last_section = doc.sections[-1]
+        last_section.footer._element.append(copy.deepcopy(footer_p))
+
+def _build_header_run(header_text):
+    """
+    Build the formatted header run for some header text
+    
+    Args:
+        header_text (str): Plain text of the header
         
-        # Create new footer paragraph
-        footer_para = last_section.footer.add_paragraph()
-        footer_para.text = footer_text
-        footer_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # Style the footer
-        for run in footer_para.runs:
-            run.font.size = Pt(10)
-            run.font.color.rgb = RGBColor(119, 119, 119)  # #777
+    Returns:
+        The w:r element, to be deep-copied into each header paragraph
+    """
+    header_para = Paragraph(OxmlElement('w:p'), None)
+    run = header_para.add_run(header_text)
+    run.font.size = Pt(10)
+    run.font.color.rgb = RGBColor(119, 119, 119)  # #777
+    return run._r
+
+def _build_footer_paragraph(footer_text):
+    """
+    Build the formatted footer paragraph for some footer text
+    
+    Args:
+        footer_text (str): Plain text of the footer
         
-        # Add a top border to the paragraph
-        set_paragraph_border(footer_para)
+    Returns:
+        The w:p element, to be deep-copied into the last section footer
+    """
+    # Create new footer paragraph
+    footer_para = Paragraph(OxmlElement('w:p'), None)
+    footer_para.text = footer_text
+    footer_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
     
-    # Save the document with everything complete
-    doc.save(output_path)
-    return output_path
+    # Style the footer
+    for run in footer_para.runs:
+        run.font.size = Pt(10)
+        run.font.color.rgb = RGBColor(119, 119, 119)  # #777
+    
+    # Add a top border to the paragraph
+    set_paragraph_border(footer_para)
+    return footer_para._p
 
 def set_paragraph_border(paragraph):
     """
@@ -0,0 +1,118 @@
+import os
+import zipfile
+from io import BytesIO
+import lxml.html
+from lxml import etree
+from app.services.html_to_docx import parse_html, iter_blocks, add_blocks
+from app.services.docx_templates import new_document
+
+# Bodies at least this large (characters of HTML) are streamed into the package
+STREAM_THRESHOLD = int(float(os.environ.get('DOCGEN_DOCX_STREAM_THRESHOLD_KB', 1024)) * 1024)
+
+# Blocks converted before each chunk is serialized and released
+STREAM_CHUNK_BLOCKS = int(os.environ.get('DOCGEN_DOCX_STREAM_CHUNK_BLOCKS', 200))
+
+BODY_MARKER = 'docgen-streamed-body'
+DOCUMENT_PART = 'word/document.xml'
+
+
+def add_body_marker(doc):
+    """
+    Add a placeholder paragraph where the streamed body content will go
+
+    Returns:
+        bytes: The serialized placeholder, as it appears in word/document.xml
+    """
+    doc.add_paragraph(BODY_MARKER)
+    return ('<w:p><w:r><w:t>%s</w:t></w:r></w:p>' % BODY_MARKER).encode('utf-8')
+
+
+def _release_blocks(root):
+    """
+    Yield the blocks of a parsed tree, detaching each top-level element once it is converted
+    """
+    while True:
+        # len() walks every child in lxml, so probe the first one instead
+        try:
+            element = root[0]
+        except IndexError:
+            return
+        holder = lxml.html.Element('div')
+        holder.append(element)  # Moves the element out of the input tree
+        yield from iter_blocks(holder)
+
+
+def _body_chunks(content_html, docx_template):
+    """
+    Convert body HTML and yield its serialized XML in chunks
+
+    Blocks are added to a scratch document cloned from the same base template,
+    so style ids and table geometry match a document built in one piece. After
+    every STREAM_CHUNK_BLOCKS blocks the scratch body is serialized and emptied.
+    """
+    scratch = new_document(docx_template)
+    body = scratch.element.body
+    root = parse_html(content_html)
+    del content_html
+
+    pending = []
+    for block in _release_blocks(root):
+        pending.append(block)
+        if len(pending) >= STREAM_CHUNK_BLOCKS:
+            yield _flush(scratch, body, pending)
+            pending = []
+    if pending:
+        yield _flush(scratch, body, pending)
+
+
+def _flush(scratch, body, blocks):
+    add_blocks(scratch, blocks)
+    # Serializing the body keeps namespace declarations on w:body only, so the
+    # children come out exactly as they would inside the full document
+    xml = etree.tostring(body, encoding='UTF-8')
+    start = xml.index(b'>') + 1
+    end = xml.rindex(b'<w:sectPr')
+    for child in list(body)[:-1]:
+        body.remove(child)
+    return xml[start:end]
+
+
+def write_streamed_docx(shell, body_marker, content_html, output_path, docx_template=None):
+    """
+    Write a DOCX package whose body is converted and compressed chunk by chunk
+
+    The shell document carries everything except the body content (sections,
+    headers, watermark and footer), with a placeholder from add_body_marker
+    where the content belongs. The package is copied from the shell and the
+    body is streamed into word/document.xml in place of the placeholder, so the
+    full body tree and the zipped output are never held in memory at once.
+
+    Args:
+        shell: python-docx document with the page layout applied
+        body_marker (bytes): Placeholder returned by add_body_marker
+        content_html (str): HTML content for the body
+        output_path (str|file): Path or writable binary file object for the generated DOCX
+        docx_template (str, optional): Name of the base template the shell was cloned from
+
+    Returns:
+        str|file: The output_path that was written
+    """
+    shell_buffer = BytesIO()
+    shell.save(shell_buffer)
+    document_xml = shell.part.blob
+    prefix, suffix = document_xml.split(body_marker, 1)
+
+    with zipfile.ZipFile(shell_buffer) as source, \
+            zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as package:
+        for info in source.infolist():
+            if info.filename != DOCUMENT_PART:
+                package.writestr(info, source.read(info))
+                continue
+            entry_info = zipfile.ZipInfo(DOCUMENT_PART, info.date_time)
+            entry_info.compress_type = zipfile.ZIP_DEFLATED
+            with package.open(entry_info, 'w') as entry:
+                entry.write(prefix)
+                for chunk in _body_chunks(content_html, docx_template):
+                    entry.write(chunk)
+                entry.write(suffix)
+    return output_path
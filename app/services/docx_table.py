@@ -0,0 +1,163 @@
+import re
+from xml.sax.saxutils import escape
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+# EMU per twip (python-docx lengths are EMU, table XML widths are twips)
+EMU_PER_TWIP = 635
+
+_WIDTH_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(%|px)?\s*$')
+
+
+def _layout(rows):
+    """
+    Place cells on the table grid, resolving colspan and rowspan
+
+    Returns:
+        tuple: (layout, column count) where layout holds, per row, a list of
+            (cell, grid_span, merge) entries in column order. cell is None for
+            padding and for the continuation of a vertical merge; merge is None,
+            'restart' or 'continue'.
+    """
+    layout = []
+    pending = {}  # column -> [rows still covered, grid span] for active rowspans
+    cols = 0
+    for row in rows:
+        entries = []
+        col = 0
+        cells = iter(row)
+        cell = next(cells, None)
+        while cell is not None or any(c >= col for c in pending):
+            if col in pending:
+                remaining, span = pending[col]
+                entries.append((None, span, 'continue'))
+                if remaining <= 1:
+                    del pending[col]
+                else:
+                    pending[col][0] = remaining - 1
+                col += span
+                continue
+            if cell is None:
+                # Gap before a rowspan that continues further right
+                entries.append((None, 1, None))
+                col += 1
+                continue
+            span, rowspan = cell[2], cell[3]
+            if rowspan > 1:
+                pending[col] = [rowspan - 1, span]
+            entries.append((cell, span, 'restart' if rowspan > 1 else None))
+            col += span
+            cell = next(cells, None)
+        cols = max(cols, col)
+        layout.append((entries, col))
+    return layout, cols
+
+
+def _column_widths(rows, cols, total_width):
+    """
+    Column widths in twips from the width attributes of the first row
+
+    Percent and pixel widths are honoured; columns without a width share
+    whatever is left equally.
+    """
+    widths = [None] * cols
+    col = 0
+    for cell in rows[0] if rows else []:
+        match = _WIDTH_RE.match(cell[4] or '') if len(cell) > 4 else None
+        if match and cell[2] == 1 and col < cols:
+            value, unit = float(match.group(1)), match.group(2)
+            # 96 px per inch, 1440 twips per inch
+            widths[col] = int(total_width * value / 100) if unit == '%' else int(value * 15)
+        col += cell[2]
+
+    fixed = sum(w for w in widths if w is not None)
+    free = [i for i, w in enumerate(widths) if w is None]
+    if free:
+        share = max(total_width - fixed, 0) // len(free) or total_width // cols
+        for i in free:
+            widths[i] = share
+    return widths
+
+
+def _run_xml(text):
+    """
+    Run XML for cell text, turning newlines into breaks like python-docx does
+    """
+    if not text:
+        return ''
+    parts = [('<w:t xml:space="preserve">%s</w:t>' if line != line.strip() else '<w:t>%s</w:t>') % escape(line)
+             for line in text.split('\n')]
+    return '<w:r>%s</w:r>' % '<w:br/>'.join(parts)
+
+
+def build_table(rows, total_width, style_id='TableGrid'):
+    """
+    Build the w:tbl element for a whole table in one go
+
+    The XML is assembled as text and parsed once, so the cost is linear in the
+    number of cells instead of python-docx's per-cell lookups.
+
+    Args:
+        rows (list): Rows of (text, is_header, colspan, rowspan, width) cells
+        total_width (int): Available text width in twips
+        style_id (str): Style id of the table style
+
+    Returns:
+        CT_Tbl: The table element, ready to be inserted in a document body
+    """
+    layout, cols = _layout(rows)
+    widths = _column_widths(rows, cols, total_width)
+
+    out = [
+        '<w:tbl %s>' % nsdecls('w'),
+        '<w:tblPr><w:tblStyle w:val="%s"/><w:tblW w:type="auto" w:w="0"/>' % escape(style_id),
+        '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+        'w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr>',
+        '<w:tblGrid>',
+    ]
+    out.extend('<w:gridCol w:w="%d"/>' % w for w in widths)
+    out.append('</w:tblGrid>')
+
+    # Leading rows made only of th cells repeat at the top of every page
+    header_rows = True
+    for row, (entries, used) in zip(rows, layout):
+        header_rows = header_rows and bool(row) and all(cell[1] for cell in row)
+        out.append('<w:tr><w:trPr><w:tblHeader/></w:trPr>' if header_rows else '<w:tr>')
+        col = 0
+        for cell, span, merge in entries:
+            out.append(_cell_xml(cell, sum(widths[col:col + span]), span, merge))
+            col += span
+        # Pad short rows so every row covers the full grid
+        for i in range(used, cols):
+            out.append(_cell_xml(None, widths[i], 1, None))
+        out.append('</w:tr>')
+    out.append('</w:tbl>')
+    return parse_xml(''.join(out))
+
+
+def _cell_xml(cell, width, span, merge):
+    props = ['<w:tcW w:type="dxa" w:w="%d"/>' % width]
+    if span > 1:
+        props.append('<w:gridSpan w:val="%d"/>' % span)
+    if merge == 'restart':
+        props.append('<w:vMerge w:val="restart"/>')
+    elif merge == 'continue':
+        props.append('<w:vMerge/>')
+    text = cell[0] if cell is not None else ''
+    return '<w:tc><w:tcPr>%s</w:tcPr><w:p>%s</w:p></w:tc>' % (''.join(props), _run_xml(text))
+
+
+def add_table(doc, rows, style='Table Grid'):
+    """
+    Append a table built with build_table to the end of a document body
+
+    Args:
+        doc: The python-docx document object
+        rows (list): Rows of (text, is_header, colspan, rowspan, width) cells
+        style (str): Name of the table style
+    """
+    section = doc.sections[-1]
+    total_width = (section.page_width - section.left_margin - section.right_margin) // EMU_PER_TWIP
+    tbl = build_table(rows, total_width, doc.styles[style].style_id)
+    doc.element.body._insert_tbl(tbl)
+    return tbl
@@ -0,0 +1,160 @@
+import os
+import copy
+import logging
+import threading
+from docx import Document
+from docx.shared import Pt
+
+logger = logging.getLogger(__name__)
+
+# Optional directory of corporate .docx base templates, registered by file name
+TEMPLATES_DIR = os.environ.get('DOCGEN_DOCX_TEMPLATES_DIR')
+
+DEFAULT_TEMPLATE = 'default'
+
+# Styles generate_docx relies on; custom templates must define them
+REQUIRED_STYLES = ['Normal', 'Heading 1', 'Heading 2', 'Heading 3', 'List Bullet', 'List Number', 'Table Grid']
+
+# Parts that are rewritten per document and therefore copied for every clone.
+# Everything else (styles, numbering, theme, fonts...) is only read and is shared.
+MUTABLE_PARTS = ('/word/document.xml', '/word/settings.xml', '/docProps/core.xml', '/docProps/app.xml')
+MUTABLE_PART_PREFIXES = ('/word/header', '/word/footer')
+
+
+class BaseTemplate:
+    """
+    A parsed base document that can be cloned cheaply for each generated document
+    """
+
+    def __init__(self, document):
+        self.document = document
+        package = document.part.package
+        self.shared_parts = [
+            part for part in package.iter_parts()
+            if part.partname not in MUTABLE_PARTS and not part.partname.startswith(MUTABLE_PART_PREFIXES)
+        ]
+
+    def clone(self):
+        """
+        Copy the document, sharing its read-only parts with the template
+
+        Returns:
+            Document: A new python-docx document
+        """
+        memo = {id(part): part for part in self.shared_parts}
+        return copy.deepcopy(self.document, memo)
+
+
+def _build_default_template():
+    """
+    python-docx's default template with the service's base formatting applied
+    """
+    document = Document()
+
+    # Set document properties for better formatting
+    style = document.styles['Normal']
+    style.font.name = 'Arial'
+    style.font.size = Pt(11)
+
+    # Resolve the styles used by the converter once, so missing ones fail here
+    for name in REQUIRED_STYLES:
+        document.styles[name]
+    return BaseTemplate(document)
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def _prepare_custom_template(name, source):
+    """
+    Load and check a custom base template
+    """
+    document = Document(source)
+    missing = []
+    for style_name in REQUIRED_STYLES:
+        try:
+            document.styles[style_name]
+        except KeyError:
+            missing.append(style_name)
+    if missing:
+        raise ValueError(f"Base template {name} is missing styles: {', '.join(missing)}")
+
+    # Keep only the final section properties
+    body = document.element.body
+    for child in list(body):
+        if child is not body.sectPr:
+            body.remove(child)
+    return BaseTemplate(document)
+
+
+def _ensure_loaded():
+    """
+    Build the default template and register those in TEMPLATES_DIR on first use
+    """
+    with _templates_lock:
+        if DEFAULT_TEMPLATE in _templates:
+            return
+        loaded = {}
+        if TEMPLATES_DIR and os.path.isdir(TEMPLATES_DIR):
+            for filename in sorted(os.listdir(TEMPLATES_DIR)):
+                name, ext = os.path.splitext(filename)
+                if ext.lower() != '.docx' or name == DEFAULT_TEMPLATE:
+                    continue
+                # One unreadable or incomplete file must not take the others down with it
+                try:
+                    loaded[name] = _prepare_custom_template(name, os.path.join(TEMPLATES_DIR, filename))
+                except Exception as e:
+                    logger.warning("Skipping base template %s: %s", filename, e)
+        _templates.update(loaded)
+        # The default template marks loading as done, so it is stored last
+        _templates[DEFAULT_TEMPLATE] = _build_default_template()
+
+
+def register_base_template(name, source):
+    """
+    Register a custom base template (e.g. a corporate letterhead) by name
+
+    The template's body is emptied; its styles, numbering, page setup, headers
+    and footers are kept.
+
+    Args:
+        name (str): Name used to select the template
+        source (str|file): Path or binary stream of a .docx file
+
+    Raises:
+        ValueError: If the template lacks a style the generator needs
+    """
+    base = _prepare_custom_template(name, source)
+    _ensure_loaded()
+    with _templates_lock:
+        _templates[name] = base
+
+
+def has_base_template(name):
+    """
+    Whether a base template with this name is registered
+    """
+    _ensure_loaded()
+    return name in _templates
+
+
+def new_document(template=None):
+    """
+    Create a document from a base template
+
+    Args:
+        template (str, optional): Registered template name (default template if omitted)
+
+    Returns:
+        Document: A new python-docx document
+
+    Raises:
+        ValueError: If the template is not registered
+    """
+    _ensure_loaded()
+    name = template or DEFAULT_TEMPLATE
+    base = _templates.get(name)
+    if base is None:
+        raise ValueError(f"Unknown base template: {name}")
+    return base.clone()
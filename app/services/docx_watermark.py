@@ -1,8 +1,53 @@
+import copy
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
+from docx.text.paragraph import Paragraph
+from app.services.asset_cache import asset_cache
+
+def build_watermark_paragraph(text):
+    """
+    Build the watermark paragraph for a watermark text
+    
+    Args:
+        text: The text for the watermark
+        
+    Returns:
+        The w:p element, to be deep-copied into each header
+    """
+    paragraph = Paragraph(OxmlElement('w:p'), None)
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    # Add a run with the watermark text
+    run = paragraph.add_run(text.upper())
+    font = run.font
+    font.size = Pt(72)  # Large size
+    font.bold = True
+    font.color.rgb = RGBColor(200, 200, 200)  # Light gray
+    
+    # Position in the center and rotate
+    paragraph.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    # Set the paragraph properties for rotation and positioning
+    r = run._r
+    rPr = r.get_or_add_rPr()
+    
+    # Create the vanish effect (text appears in layout but not in printed doc)
+    vanish = OxmlElement('w:vanish')
+    rPr.append(vanish)
+    
+    # Create the position effect (centers watermark)
+    position = OxmlElement('w:position')
+    position.set(qn('w:val'), '-40')  # Negative value moves text up
+    rPr.append(position)
+    
+    # Create watermark effect (positioned in the background)
+    webHidden = OxmlElement('w:webHidden')
+    rPr.append(webHidden)
+    
+    return paragraph._p
 
 def add_proper_watermark(document, text):
     """
@@ -15,6 +60,9 @@ def add_proper_watermark(document, text):
     Returns:
         document: The modified document object
     """
+    # The watermark paragraph is built once per distinct text and copied into each header
+    watermark_p = asset_cache.get('docx_watermark', text, build_watermark_paragraph)
+    
     # For each section in the document
     for section in document.sections:
         # Get the header
@@ -27,35 +75,7 @@ def add_proper_watermark(document, text):
                 if p.getparent() is not None:
                     p.getparent().remove(p)
         
-        # Add a paragraph for the watermark
-        paragraph = header.add_paragraph()
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # Add a run with the watermark text
-        run = paragraph.add_run(text.upper())
-        font = run.font
-        font.size = Pt(72)  # Large size
-        font.bold = True
-        font.color.rgb = RGBColor(200, 200, 200)  # Light gray
-        
-        # Position in the center and rotate
-        paragraph.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # Set the paragraph properties for rotation and positioning
-        r = run._r
-        rPr = r.get_or_add_rPr()
-        
-        # Create the vanish effect (text appears in layout but not in printed doc)
-        vanish = OxmlElement('w:vanish')
-        rPr.append(vanish)
-        
-        # Create the position effect (centers watermark)
-        position = OxmlElement('w:position')
-        position.set(qn('w:val'), '-40')  # Negative value moves text up
-        rPr.append(position)
-        
-        # Create watermark effect (positioned in the background)
-        webHidden = OxmlElement('w:webHidden')
-        rPr.append(webHidden)
+        # Add the watermark paragraph
+        header._element.append(copy.deepcopy(watermark_p))
         
-    return document
\ No newline at end of file
+    return document
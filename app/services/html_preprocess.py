@@ -0,0 +1,203 @@
+import os
+import re
+import threading
+from collections import namedtuple
+from lxml import etree
+from app.services.asset_cache import AssetCache
+from app.services.html_to_docx import parse_html, iter_blocks, HEADING_LEVELS, LIST_TAGS
+from app.utils.metrics import metrics, stage_timer
+
+# Number of prepared HTML inputs kept across requests
+PREPARED_CACHE_SIZE = int(os.environ.get('DOCGEN_PREPARED_CACHE_SIZE', 128))
+
+# Inputs larger than this are prepared per request instead of cached
+PREPARED_CACHE_MAX_BYTES = int(float(os.environ.get('DOCGEN_PREPARED_CACHE_MAX_KB', 1024)) * 1024)
+
+# Elements whose content is never document text; dropped before text and blocks are extracted
+STRIPPED_TAGS = ('script', 'style', 'noscript', 'template')
+
+# Tags whose subtree converts to blocks without losing anything
+BLOCK_TAGS = set(HEADING_LEVELS) | set(LIST_TAGS) | {'p', 'li', 'div', 'table', 'thead', 'tbody', 'tfoot', 'tr',
+                                                     'td', 'th'}
+# Elements holding text directly
+TEXT_TAGS = set(HEADING_LEVELS) | {'p', 'li', 'td', 'th'}
+# Elements allowed in plain header, footer and watermark HTML
+PLAIN_TAGS = {'div', 'p', 'span'}
+
+PARSES = metrics.counter('docgen_html_parses_total', 'HTML inputs parsed by the preprocessing stage')
+
+_PAGE_BREAK_STYLE = 'page-break-before:always'
+
+# First tag outside BLOCK_TAGS, found without parsing
+_FOREIGN_TAG_RE = re.compile(
+    r'<(?!/?(?:%s)[\s/>])/?[a-zA-Z]' % '|'.join(sorted(BLOCK_TAGS, key=len, reverse=True)), re.IGNORECASE)
+
+
+def _blank(text):
+    return not text or not text.strip()
+
+
+def _is_lossless(root):
+    """
+    Whether a parsed tree only uses what iter_blocks represents exactly
+
+    That is headings, paragraphs, nested lists, span-free tables and page
+    breaks, with no attributes other than a page-break style and no inline markup.
+    """
+    if not _blank(root.text):
+        return False
+    for element in root.iterdescendants():
+        tag = element.tag
+        if not isinstance(tag, str):
+            if not _blank(element.tail):
+                return False
+            continue  # Comments
+        if tag not in BLOCK_TAGS:
+            return False
+        attributes = dict(element.attrib)
+        if tag == 'p' and _PAGE_BREAK_STYLE == attributes.get('style', '').replace(' ', '').rstrip(';').lower():
+            del attributes['style']
+            if not _blank(element.text_content()):
+                return False
+        if attributes:
+            return False
+        parent_tag = element.getparent().tag
+        # Text outside text elements is dropped by iter_blocks, so it must be blank
+        if not _blank(element.tail) and parent_tag != 'li':
+            return False
+        if tag not in TEXT_TAGS and not _blank(element.text):
+            return False
+        if tag in TEXT_TAGS and tag != 'li' and len(element):
+            return False
+        if tag == 'li' and parent_tag not in LIST_TAGS:
+            return False
+        if parent_tag == 'li' and tag not in LIST_TAGS:
+            return False
+    return True
+
+
+def _is_plain(root):
+    """
+    Whether a parsed fragment is text in attribute-free div/p/span wrappers
+    """
+    for element in root.iterdescendants():
+        if isinstance(element.tag, str) and (element.tag not in PLAIN_TAGS or element.attrib):
+            return False
+    return True
+
+
+def _sanitize(root):
+    """
+    Drop scripts, styles, comments and processing instructions, keeping the text around them
+    """
+    etree.strip_elements(root, *STRIPPED_TAGS, etree.Comment, etree.ProcessingInstruction, with_tail=False)
+
+
+class PreparedHtml:
+    """
+    One HTML input parsed once and reduced to what the renderers consume
+
+    The input is parsed on first use of blocks, text or plain, and the tree is
+    dropped once those are extracted. lossless is answered without parsing when
+    the source has a tag iter_blocks cannot represent, so documents headed for
+    wkhtmltopdf are never parsed for it.
+
+    Attributes:
+        html (str): The source HTML, as given
+        blocks (tuple): Blocks from iter_blocks over the sanitized tree
+        text (str): Sanitized text with whitespace collapsed
+        plain (bool): The source is only text in div/p/span wrappers
+        lossless (bool): blocks represent the source exactly
+    """
+
+    def __init__(self, html):
+        self.html = html or ''
+        self.lock = threading.Lock()
+        self.analysed = False
+        self._blocks = ()
+        self._text = ''
+        self._plain = True
+        self._lossless = None
+
+    def _analyse(self):
+        with self.lock:
+            if self.analysed:
+                return
+            if self.html:
+                PARSES.inc()
+                with stage_timer('html_preprocess'):
+                    root = parse_html(self.html)
+                    self._plain = _is_plain(root)
+                    if self._lossless is None:
+                        self._lossless = _is_lossless(root)
+                    _sanitize(root)
+                    self._text = ' '.join(root.text_content().split())
+                    self._blocks = tuple(iter_blocks(root))
+            else:
+                self._lossless = False
+            self.analysed = True
+
+    @property
+    def blocks(self):
+        self._analyse()
+        return self._blocks
+
+    @property
+    def text(self):
+        self._analyse()
+        return self._text
+
+    @property
+    def plain(self):
+        self._analyse()
+        return self._plain
+
+    @property
+    def lossless(self):
+        if self._lossless is None and not self.analysed:
+            if not self.html or _FOREIGN_TAG_RE.search(self.html):
+                self._lossless = False
+        if self._lossless is None:
+            self._analyse()
+        return self._lossless
+
+
+# The four inputs of a document, prepared
+PreparedDocument = namedtuple('PreparedDocument', ['content', 'header', 'footer', 'watermark'])
+
+_EMPTY = PreparedHtml('')
+
+
+def prepare_html(html):
+    """
+    Prepared form of an HTML input, shared by every request with the same input
+
+    Args:
+        html (str|None): HTML content (plain text is accepted too)
+
+    Returns:
+        PreparedHtml: Cached by content hash unless the input is over PREPARED_CACHE_MAX_BYTES
+    """
+    if not html:
+        return _EMPTY
+    if len(html) > PREPARED_CACHE_MAX_BYTES:
+        return PreparedHtml(html)
+    return prepared_cache.get('html', html, PreparedHtml)
+
+
+def prepare_document(content_html, header_html, footer_html, watermark=None):
+    """
+    Prepare all inputs of a document for the PDF and DOCX services
+
+    Returns:
+        PreparedDocument: The prepared content, header, footer and watermark
+    """
+    return PreparedDocument(prepare_html(content_html), prepare_html(header_html), prepare_html(footer_html),
+                            prepare_html(watermark))
+
+
+# Singleton instance
+prepared_cache = AssetCache(PREPARED_CACHE_SIZE)
+
+metrics.gauge('docgen_prepared_html_entries', 'Prepared HTML inputs kept',
+              lambda: prepared_cache.stats()['entries'])
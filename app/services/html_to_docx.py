@@ -0,0 +1,180 @@
+import lxml.html
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from app.services.docx_table import add_table
+
+HEADING_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3}
+LIST_TAGS = ('ul', 'ol')
+
+# python-docx's default template has list styles for three nesting levels
+LIST_STYLES = {
+    'ul': ['List Bullet', 'List Bullet 2', 'List Bullet 3'],
+    'ol': ['List Number', 'List Number 2', 'List Number 3']
+}
+
+
+def parse_html(html):
+    """
+    Parse an HTML fragment into an lxml tree
+
+    Args:
+        html (str): HTML fragment (a full document is accepted too)
+
+    Returns:
+        lxml.html.HtmlElement: A wrapper div holding the parsed content
+    """
+    return lxml.html.fragment_fromstring(html or '', create_parent='div')
+
+
+def is_page_break(element):
+    """
+    Whether an element forces a page break before itself
+    """
+    style = element.get('style', '').replace(' ', '').lower()
+    return 'page-break-before:always' in style
+
+
+def _item_text(element, nested_lists):
+    """
+    Text content of a list item, leaving out nested lists
+
+    Nested lists are appended to nested_lists (in document order) instead, so the
+    item subtree is only walked once.
+    """
+    parts = [element.text or '']
+    for child in element:
+        if isinstance(child.tag, str):
+            if child.tag in LIST_TAGS:
+                nested_lists.append(child)
+            else:
+                parts.append(_item_text(child, nested_lists))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def _table_rows(table):
+    """
+    Rows of a table as lists of (text, is_header, colspan, rowspan, width) cells
+
+    Only rows belonging to this table are returned; nested tables end up as cell text.
+    """
+    rows = []
+    for row in table.xpath('./tr | ./thead/tr | ./tbody/tr | ./tfoot/tr'):
+        cells = []
+        for cell in row:
+            if cell.tag not in ('td', 'th'):
+                continue
+            cells.append((
+                cell.text_content().strip(),
+                cell.tag == 'th',
+                _span(cell.get('colspan')),
+                _span(cell.get('rowspan')),
+                cell.get('width') or _style_width(cell.get('style'))
+            ))
+        rows.append(cells)
+    return rows
+
+
+def _style_width(style):
+    """
+    Width declared in an inline style attribute, if any
+    """
+    for declaration in (style or '').split(';'):
+        name, _, value = declaration.partition(':')
+        if name.strip().lower() == 'width':
+            return value.strip()
+    return None
+
+
+def _span(value):
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+def iter_blocks(root):
+    """
+    Walk a parsed HTML tree once, in document order, yielding the blocks the DOCX
+    generator understands
+
+    Each element is visited once: a matched block consumes its subtree, except that
+    nested lists inside a list item are walked as blocks of their own.
+
+    Args:
+        root: Parsed tree from parse_html
+
+    Yields:
+        tuple: One of
+            ('heading', level, text)
+            ('paragraph', text)
+            ('page_break',)
+            ('list_item', list_tag, depth, text)
+            ('table', rows)
+    """
+    # Stack of (element, list_tag, depth) still to visit, in reverse document order
+    stack = [(child, None, 0) for child in reversed(root)]
+    while stack:
+        element, list_tag, depth = stack.pop()
+        tag = element.tag
+        if not isinstance(tag, str):
+            continue  # Comments and processing instructions
+
+        if tag in HEADING_LEVELS:
+            yield ('heading', HEADING_LEVELS[tag], element.text_content().strip())
+        elif tag == 'p':
+            if is_page_break(element):
+                yield ('page_break',)
+            else:
+                yield ('paragraph', element.text_content().strip())
+        elif tag in LIST_TAGS:
+            children = [(child, tag, depth + 1) for child in element]
+            stack.extend(reversed(children))
+        elif tag == 'li' and list_tag:
+            nested_lists = []
+            yield ('list_item', list_tag, depth, _item_text(element, nested_lists).strip())
+            # Nested lists follow their parent item
+            stack.extend((child, None, depth) for child in reversed(nested_lists))
+        elif tag == 'table':
+            rows = _table_rows(element)
+            if any(rows):
+                yield ('table', rows)
+        else:
+            # Containers (div, section, span...) are transparent
+            stack.extend((child, list_tag, depth) for child in reversed(element))
+
+
+def add_blocks(doc, blocks):
+    """
+    Append converted blocks to a python-docx document
+
+    Args:
+        doc: The python-docx document object
+        blocks: Iterable of blocks from iter_blocks
+    """
+    for block in blocks:
+        kind = block[0]
+        if kind == 'heading':
+            heading = doc.add_heading(block[2], level=block[1])
+            if block[1] == 1:
+                heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        elif kind == 'paragraph':
+            doc.add_paragraph(block[1])
+        elif kind == 'page_break':
+            doc.add_page_break()
+        elif kind == 'list_item':
+            _, list_tag, depth, text = block
+            styles = LIST_STYLES[list_tag]
+            doc.add_paragraph(text, style=styles[min(depth, len(styles)) - 1])
+        elif kind == 'table':
+            add_table(doc, block[1])
+
+
+def add_html_content(doc, content_html):
+    """
+    Convert body HTML into python-docx paragraphs, lists and tables in document order
+
+    Args:
+        doc: The python-docx document object
+        content_html (str): HTML content for the body
+    """
+    add_blocks(doc, iter_blocks(parse_html(content_html)))
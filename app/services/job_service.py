@@ -0,0 +1,295 @@
+import os
+import heapq
+import uuid
+import time
+import queue
+import logging
+import tempfile
+import itertools
+import threading
+import requests
+from app.services.document_service import generate_document
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Job execution tuning, overridable through the environment
+JOB_WORKERS = int(os.environ.get('DOCGEN_JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.environ.get('DOCGEN_JOB_QUEUE_SIZE', 100))
+JOB_RESULT_TTL = float(os.environ.get('DOCGEN_JOB_RESULT_TTL', 3600))
+JOB_RESULT_DIR = os.environ.get('DOCGEN_JOB_RESULT_DIR', os.path.join(tempfile.gettempdir(), 'docgen-jobs'))
+CALLBACK_TIMEOUT = float(os.environ.get('DOCGEN_JOB_CALLBACK_TIMEOUT', 5))
+JOB_PURGE_INTERVAL = float(os.environ.get('DOCGEN_JOB_PURGE_INTERVAL', 60))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are waiting to run"""
+
+
+class Job:
+    def __init__(self, params, priority=0, callback_url=None):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.priority = priority
+        self.callback_url = callback_url
+        self.status = QUEUED
+        self.error = None
+        self.result_path = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.expires_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'document_type': self.params['document_type'],
+            'priority': self.priority,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'expires_at': self.expires_at
+        }
+
+
+class JobManager:
+    """
+    Runs document generation jobs on a bounded pool of background threads
+
+    Jobs are picked by priority (highest first, then submission order). Finished
+    jobs and their result files are retained until their expiry time. They are
+    purged as the manager is used and every purge_interval seconds by a
+    background thread, which also deletes result files no known job owns (left
+    by an earlier process, or by another one sharing result_dir) once they are
+    older than the retention period.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE,
+                 result_ttl=JOB_RESULT_TTL, result_dir=JOB_RESULT_DIR, purge_interval=JOB_PURGE_INTERVAL):
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.result_ttl = result_ttl
+        self.result_dir = result_dir
+        self.purge_interval = purge_interval
+        self.jobs = {}
+        self.pending = queue.PriorityQueue()
+        self.queued_count = 0
+        self.sequence = itertools.count()
+        # Heap of (expires_at, job_id) for finished jobs
+        self.expiry_heap = []
+        self.lock = threading.Lock()
+        self.workers = []
+
+    def start(self):
+        """
+        Start the worker and purge threads, sweeping leftover result files first
+
+        Called when the app is created; submit() starts the threads too if it was not.
+        """
+        with self.lock:
+            self._start()
+
+    def _start(self):
+        """
+        Start the threads on first use (lock must be held)
+        """
+        if self.workers:
+            return
+        os.makedirs(self.result_dir, exist_ok=True)
+        self._sweep_orphans()
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        purger = threading.Thread(target=self._purge_loop, name='job-purge', daemon=True)
+        purger.start()
+        self.workers.append(purger)
+
+    def submit(self, params, priority=0, callback_url=None):
+        """
+        Queue a document generation job
+
+        Args:
+            params (dict): Validated generate request fields
+            priority (int): Higher priorities run first
+            callback_url (str, optional): URL notified with the job state when it finishes
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            JobQueueFullError: If the queue is at capacity
+        """
+        job = Job(params, priority, callback_url)
+        with self.lock:
+            self._purge_expired()
+            if self.queued_count >= self.queue_size:
+                raise JobQueueFullError("Job queue is full, try again later")
+            self._start()
+            self.jobs[job.id] = job
+            self.queued_count += 1
+            self.pending.put((-priority, next(self.sequence), job.id))
+        return job
+
+    def get(self, job_id):
+        """
+        Look up a job that has not expired yet
+
+        Returns:
+            Job|None: The job, or None if it is unknown or expired
+        """
+        with self.lock:
+            self._purge_expired()
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs never run; running jobs have their result discarded.
+
+        Returns:
+            Job|None: The job, or None if it is unknown or expired
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return job
+            if job.status == QUEUED:
+                self.queued_count -= 1
+            job.status = CANCELLED
+            self._finish(job)
+        self._notify(job)
+        return job
+
+    def _worker_loop(self):
+        while True:
+            _, _, job_id = self.pending.get()
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None or job.status != QUEUED:
+                    continue
+                self.queued_count -= 1
+                job.status = RUNNING
+                job.started_at = time.time()
+
+            result_path = os.path.join(self.result_dir, f"{job.id}.{job.params['document_type']}")
+            error = None
+            try:
+                generate_document(
+                    content_html=job.params.get('content_html', ''),
+                    header_html=job.params.get('header_html', ''),
+                    footer_html=job.params.get('footer_html', ''),
+                    document_type=job.params['document_type'],
+                    output_path=result_path,
+                    watermark=job.params.get('watermark', None),
+                    docx_template=job.params.get('docx_template', None)
+                )
+            except Exception as e:
+                error = str(e)
+
+            with self.lock:
+                if job.status == CANCELLED:
+                    # Cancelled while running - drop whatever was produced
+                    self._remove_result(result_path)
+                    continue
+                if error is None:
+                    job.status = SUCCEEDED
+                    job.result_path = result_path
+                else:
+                    job.status = FAILED
+                    job.error = error
+                    self._remove_result(result_path)
+                self._finish(job)
+            self._notify(job)
+
+    def _finish(self, job):
+        """
+        Record completion and schedule the job for expiry (lock must be held)
+        """
+        job.finished_at = time.time()
+        job.expires_at = job.finished_at + self.result_ttl
+        heapq.heappush(self.expiry_heap, (job.expires_at, job.id))
+
+    def _purge_expired(self):
+        """
+        Drop finished jobs whose retention period has passed (lock must be held)
+        """
+        now = time.time()
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            _, job_id = heapq.heappop(self.expiry_heap)
+            job = self.jobs.pop(job_id, None)
+            if job is not None and job.result_path:
+                self._remove_result(job.result_path)
+
+    def _purge_loop(self):
+        """
+        Background thread that purges expired jobs while the service is idle
+        """
+        while True:
+            time.sleep(self.purge_interval)
+            with self.lock:
+                self._purge_expired()
+                self._sweep_orphans()
+
+    def _sweep_orphans(self):
+        """
+        Delete result files that belong to no known job and are past the
+        retention period (lock must be held)
+        """
+        cutoff = time.time() - self.result_ttl
+        try:
+            names = os.listdir(self.result_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.split('.', 1)[0] in self.jobs:
+                continue
+            path = os.path.join(self.result_dir, name)
+            try:
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _remove_result(path):
+        try:
+            if os.path.exists(path):
+                os.unlink(path)
+        except OSError:
+            pass
+
+    def _notify(self, job):
+        """
+        POST the final job state to its callback URL, if any
+        """
+        if not job.callback_url:
+            return
+        try:
+            requests.post(job.callback_url, json=job.to_dict(), timeout=CALLBACK_TIMEOUT)
+        except requests.RequestException as e:
+            logger.warning("Callback for job %s failed: %s", job.id, e)
+
+    def stats(self):
+        """
+        Current queue state for diagnostics
+        """
+        with self.lock:
+            return {'queued': self.queued_count, 'retained': len(self.jobs)}
+
+
+# Singleton instance
+job_manager = JobManager()
+
+metrics.gauge('docgen_jobs_queued', 'Background jobs waiting to run', lambda: job_manager.stats()['queued'])
+metrics.gauge('docgen_jobs_retained', 'Background jobs known to the manager, including finished ones',
+              lambda: job_manager.stats()['retained'])
@@ -0,0 +1,157 @@
+import os
+import logging
+from abc import ABC, abstractmethod
+from app.services.pdf_service import generate_pdf
+from app.services.html_preprocess import prepare_document
+from app.services.pdf_native import page_geometry, render_native_pdf
+from app.services.pdf_watermark import can_encode, stamp_watermark
+from app.services.renderer_pool import find_wkhtmltopdf
+from app.utils.metrics import metrics, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# Backend for PDF documents: 'auto' routes each document by complexity,
+# 'wkhtmltopdf' or 'native' force one backend
+PDF_BACKEND = os.environ.get('DOCGEN_PDF_BACKEND', 'auto').lower()
+
+DOCUMENTS = metrics.counter('docgen_pdf_backend_documents_total', 'PDF documents rendered by each backend',
+                            ['backend'])
+
+
+class PdfBackend(ABC):
+    """
+    A way of turning HTML into a PDF
+
+    Backends are registered with register_backend and tried in registration
+    order when PDF_BACKEND is 'auto'; the first that is available and accepts
+    the document renders it.
+    """
+
+    name = None
+
+    def available(self):
+        """
+        Whether the backend can run in this process (e.g. its binary is installed)
+        """
+        return True
+
+    def accepts(self, document):
+        """
+        Whether the backend renders this PreparedDocument faithfully
+        """
+        return True
+
+    @abstractmethod
+    def render(self, document, output_path):
+        """
+        Render a PreparedDocument, with the header on every page and the footer on the last
+
+        Returns:
+            str|file: The output_path that was written
+        """
+
+
+class NativeBackend(PdfBackend):
+    """
+    In-process layout of plain headings, paragraphs, lists and tables with the
+    standard PDF fonts; no subprocess and no temporary files
+    """
+
+    name = 'native'
+
+    def available(self):
+        return page_geometry() is not None
+
+    def accepts(self, document):
+        content, header, footer = document.content, document.header, document.footer
+        # Everything, watermark included, must be drawable with the standard fonts
+        return (content.lossless and header.plain and footer.plain
+                and all(can_encode(prepared.text) for prepared in document))
+
+    def render(self, document, output_path):
+        with stage_timer('pdf_native_layout'):
+            writer = render_native_pdf(document.content.blocks, document.header.text, document.footer.text)
+        with stage_timer('pdf_stamp'):
+            if document.watermark.html:
+                stamp_watermark(writer, document.watermark.html)
+            writer.write(output_path)
+        return output_path
+
+
+class WkhtmltopdfBackend(PdfBackend):
+    """
+    Full HTML and CSS rendering through the pooled wkhtmltopdf workers
+    """
+
+    name = 'wkhtmltopdf'
+
+    def available(self):
+        return find_wkhtmltopdf() is not None
+
+    def render(self, document, output_path):
+        return generate_pdf(document.content.html, document.header.html, document.footer.html, output_path,
+                            document.watermark.html or None)
+
+
+_backends = {}
+
+
+def register_backend(backend):
+    """
+    Add a backend, or replace the one registered under the same name
+    """
+    _backends[backend.name] = backend
+
+
+def select_backend(document):
+    """
+    Pick the backend for a PreparedDocument
+
+    Returns:
+        PdfBackend: The configured backend, or with 'auto' the first available one
+        that accepts the document. wkhtmltopdf is the catch-all, also for documents
+        a forced backend does not accept, so content is never silently dropped
+        and a missing binary is reported as before.
+
+    Raises:
+        ValueError: If DOCGEN_PDF_BACKEND names an unknown backend
+    """
+    if PDF_BACKEND != 'auto':
+        backend = _backends.get(PDF_BACKEND)
+        if backend is None:
+            raise ValueError(f"Unknown PDF backend: {PDF_BACKEND}")
+        if backend.accepts(document):
+            return backend
+        logger.info("PDF backend %s does not accept the document; using wkhtmltopdf", backend.name)
+        return _backends[WkhtmltopdfBackend.name]
+    for backend in _backends.values():
+        if backend.available() and backend.accepts(document):
+            return backend
+    return _backends[WkhtmltopdfBackend.name]
+
+
+def render_pdf(content_html, header_html, footer_html, output_path, watermark=None, prepared=None):
+    """
+    Generate a PDF with the backend suited to the document
+
+    Args:
+        content_html (str): HTML content for the body
+        header_html (str): HTML content for the header
+        footer_html (str): HTML content for the footer (last page only)
+        output_path (str|file): Path or writable binary file object for the generated PDF
+        watermark (str, optional): HTML content for watermark
+        prepared (PreparedDocument, optional): The inputs already prepared by prepare_document
+
+    Returns:
+        str|file: The output_path that was written
+    """
+    if prepared is None:
+        prepared = prepare_document(content_html, header_html, footer_html, watermark)
+    with stage_timer('pdf_backend_select'):
+        backend = select_backend(prepared)
+    DOCUMENTS.inc(backend.name)
+    return backend.render(prepared, output_path)
+
+
+register_backend(NativeBackend())
+register_backend(WkhtmltopdfBackend())
@@ -0,0 +1,331 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from io import BytesIO
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+import lxml.html
+from PyPDF2 import PdfReader, PdfWriter
+from app.services.renderer_pool import renderer_pool
+from app.services.render_cache import RenderCache, CACHE_DIR, CACHE_TTL
+from app.services.html_to_docx import is_page_break
+from app.services.pdf_overlay import page_to_form_xobject, stamp_xobject
+from app.services.pdf_templates import render_main, header_file
+from app.utils.scratch import ScratchSpace
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bodies at least this large (characters of HTML) are split and rendered in parallel.
+# 0 disables chunked rendering.
+CHUNK_THRESHOLD = int(float(os.environ.get('DOCGEN_PDF_CHUNK_THRESHOLD_KB', 0)) * 1024)
+
+# Target chunk size; chunks end at the next page break past this size, or at any
+# top-level block once they reach twice this size
+CHUNK_SIZE = int(float(os.environ.get('DOCGEN_PDF_CHUNK_SIZE_KB', 256)) * 1024)
+
+# Chunks of one document rendered concurrently
+CHUNK_WORKERS = int(os.environ.get('DOCGEN_PDF_CHUNK_WORKERS', os.cpu_count() or 2))
+
+# Incremental mode: bodies with page breaks are rendered per page-break segment and
+# the rendered pages of unchanged segments are reused from the segment cache
+INCREMENTAL = os.environ.get('DOCGEN_PDF_INCREMENTAL', '').lower() in ('1', 'true', 'yes')
+SEGMENT_CACHE_MEMORY = int(float(os.environ.get('DOCGEN_PDF_SEGMENT_CACHE_MB', 128)) * 1024 * 1024)
+SEGMENT_CACHE_DISK = int(float(os.environ.get('DOCGEN_PDF_SEGMENT_CACHE_DISK_MB', 512)) * 1024 * 1024)
+
+# Top-level elements that style the whole body and are repeated in every chunk
+SHARED_TAGS = ('style', 'link', 'meta')
+
+# Full documents are rendered in one piece
+_DOCUMENT_RE = re.compile(r'<\s*(html|head|body)[\s>]', re.IGNORECASE)
+
+# Headers read wkhtmltopdf's page variables (page, topage...) from a script
+_SCRIPT_RE = re.compile(r'<\s*script[\s>]', re.IGNORECASE)
+
+# The page-numbered header pass renders the header on transparent pages
+HEADER_PASS_OPTIONS = {'header-spacing': '5', 'no-background': None}
+
+
+def _top_level_pieces(content_html):
+    """
+    Serialize the top-level elements of a body fragment
+
+    Returns:
+        tuple: (leading text, shared style pieces, [(piece, is_page_break), ...])
+    """
+    root = lxml.html.fragment_fromstring(content_html, create_parent='div')
+    shared = []
+    pieces = []
+    for element in root:
+        piece = lxml.html.tostring(element, encoding='unicode')
+        if isinstance(element.tag, str) and element.tag in SHARED_TAGS:
+            shared.append(piece)
+        else:
+            pieces.append((piece, is_page_break(element)))
+    return root.text or '', shared, pieces
+
+
+def _with_shared(chunks, shared):
+    if shared:
+        prefix = ''.join(shared)
+        chunks = [prefix + chunk for chunk in chunks]
+    return chunks
+
+
+def split_content(content_html, chunk_size=CHUNK_SIZE):
+    """
+    Split body HTML into chunks that can be rendered independently
+
+    Chunks are cut between top-level elements: preferably before an element with
+    page-break-before, which keeps the layout identical to a single render, and
+    otherwise at the first block boundary once a chunk reaches twice chunk_size
+    (the next chunk then starts on a new page).
+
+    Args:
+        content_html (str): HTML content for the body
+        chunk_size (int): Target chunk size in characters
+
+    Returns:
+        list: HTML chunks, or a single chunk when the content cannot be split
+    """
+    if not content_html or _DOCUMENT_RE.search(content_html):
+        return [content_html]
+
+    text, shared, pieces = _top_level_pieces(content_html)
+    chunks = []
+    current = [text]
+    size = len(text)
+    for piece, page_break in pieces:
+        if size >= chunk_size and (page_break or size >= 2 * chunk_size):
+            chunks.append(''.join(current))
+            current = []
+            size = 0
+        current.append(piece)
+        size += len(piece)
+    chunks.append(''.join(current))
+    return _with_shared(chunks, shared)
+
+
+def split_segments(content_html):
+    """
+    Split body HTML before every top-level page break
+
+    Each segment starts on a new page, so rendering segments separately and
+    concatenating their pages gives the same pages as one render.
+
+    Args:
+        content_html (str): HTML content for the body
+
+    Returns:
+        list: HTML segments, or a single segment when the content has no top-level page break
+    """
+    if not content_html or _DOCUMENT_RE.search(content_html):
+        return [content_html]
+
+    text, shared, pieces = _top_level_pieces(content_html)
+    segments = []
+    current = [text]
+    for piece, page_break in pieces:
+        if page_break and ''.join(current).strip():
+            segments.append(''.join(current))
+            current = []
+        current.append(piece)
+    segments.append(''.join(current))
+    return _with_shared(segments, shared)
+
+
+def uses_page_variables(header_html):
+    """
+    Whether a header may print wkhtmltopdf page variables, which are only
+    correct when the header sees the whole document
+    """
+    return bool(header_html) and bool(_SCRIPT_RE.search(header_html))
+
+
+def _render_chunk(scratch, name, html, options):
+    """
+    Render one wrapped chunk to a PDF in the scratch directory
+
+    Returns:
+        str: Path of the PDF
+    """
+    html_path = scratch.write_text(f'{name}.html', html)
+    pdf_path = scratch.path(f'{name}.pdf')
+    renderer_pool.render(html_path, pdf_path, options)
+    os.unlink(html_path)
+    scratch.measure()
+    return pdf_path
+
+
+def render_chunks(chunks, options, header_html=None):
+    """
+    Render body chunks in parallel and merge them into one PDF
+
+    Chunks are merged in order as soon as each one is ready, while later chunks
+    are still rendering. A plain header is rendered with each chunk; a header
+    that prints page numbers is rendered afterwards in one pass over the merged
+    page count and stamped onto each page, so page and topage are those of the
+    whole document.
+
+    Args:
+        chunks (list): HTML chunks from split_content
+        options (dict): wkhtmltopdf options without header options
+        header_html (str, optional): HTML content for the header
+
+    Returns:
+        PdfWriter: The merged document, ready for the watermark and footer to be stamped
+    """
+    numbered_header = uses_page_variables(header_html)
+    chunk_options = dict(options)
+    writer = PdfWriter()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(CHUNK_WORKERS, len(chunks))))
+    # Chunk files of a failed render go away with the scratch directory
+    with ScratchSpace() as scratch, ExitStack() as leases:
+        if header_html and not numbered_header:
+            chunk_options['header-html'] = leases.enter_context(header_file(header_html))
+            chunk_options['header-spacing'] = '5'
+        futures = [
+            executor.submit(_render_chunk, scratch, f'chunk-{index:04d}', render_main(chunk), chunk_options)
+            for index, chunk in enumerate(chunks)
+        ]
+        try:
+            for future in futures:
+                pdf_path = future.result()
+                # PdfReader loads the file into memory, so it can go right away
+                reader = PdfReader(pdf_path)
+                os.unlink(pdf_path)
+                for page in reader.pages:
+                    writer.add_page(page)
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+        if numbered_header and writer.pages:
+            stamp_numbered_header(writer, scratch, header_html, options)
+    return writer
+
+
+def stamp_numbered_header(writer, scratch, header_html, options):
+    """
+    Render the header over as many blank pages as the merged document has and
+    stamp each rendered header onto the matching page
+
+    Args:
+        writer (PdfWriter): The merged document
+        scratch (ScratchSpace): Working directory for the header pass
+        header_html (str): HTML content for the header
+        options (dict): wkhtmltopdf options the body was rendered with
+    """
+    page_count = len(writer.pages)
+    blank_pages = '<div style="page-break-after: always">&nbsp;</div>' * (page_count - 1) + '<div>&nbsp;</div>'
+    header_options = dict(options, **HEADER_PASS_OPTIONS)
+    with header_file(header_html) as header_path:
+        header_options['header-html'] = header_path
+        header_reader = PdfReader(_render_chunk(scratch, 'header-pass', render_main(blank_pages), header_options))
+
+    if len(header_reader.pages) != page_count:
+        logger.warning("Header pass produced %d pages for a %d page document",
+                       len(header_reader.pages), page_count)
+    for page, header_page in zip(writer.pages, header_reader.pages):
+        header_form = page_to_form_xobject(writer, header_page)
+        stamp_xobject(writer, page, header_form, '/DocgenHeader')
+
+
+def segment_digest(segment, header_html, options):
+    """
+    Fingerprint of everything that determines a segment's rendered pages
+
+    Args:
+        segment (str): Segment HTML, including shared styles
+        header_html (str): Header rendered with the segment ('' when the header is stamped afterwards)
+        options (dict): wkhtmltopdf page options without header options
+
+    Returns:
+        str: Hex digest used as the segment cache key
+    """
+    normalized = json.dumps([segment, header_html or '', sorted(options.items())],
+                            ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def render_incremental(segments, options, header_html=None):
+    """
+    Render page-break segments, reusing cached pages for unchanged segments
+
+    Segments missing from the segment cache are rendered in parallel and stored;
+    the rest are read from the cache. Pages are merged in segment order. The
+    watermark and footer are stamped onto the merged document afterwards, so
+    they do not invalidate cached pages; a header with page numbers is stamped
+    in one pass over the merged document, as in render_chunks.
+
+    Args:
+        segments (list): HTML segments from split_segments
+        options (dict): wkhtmltopdf options without header options
+        header_html (str, optional): HTML content for the header
+
+    Returns:
+        PdfWriter: The merged document, ready for the watermark and footer to be stamped
+    """
+    numbered_header = uses_page_variables(header_html)
+    segment_options = dict(options)
+    segment_header = ''
+    if header_html and not numbered_header:
+        segment_options['header-spacing'] = '5'
+        segment_header = header_html
+
+    digests = [segment_digest(segment, segment_header, options) for segment in segments]
+    rendered = {}
+    missing = {}
+    for digest, segment in zip(digests, segments):
+        if digest in rendered or digest in missing:
+            continue
+        data = segment_cache.get(digest)
+        if data is None:
+            missing[digest] = segment
+        else:
+            rendered[digest] = data
+
+    writer = PdfWriter()
+    with ScratchSpace() as scratch, ExitStack() as leases:
+        if missing and segment_header:
+            segment_options['header-html'] = leases.enter_context(header_file(header_html))
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, min(CHUNK_WORKERS, len(missing)))) as executor:
+                futures = {
+                    digest: executor.submit(_render_chunk, scratch, f'segment-{digest[:16]}',
+                                            render_main(segment), segment_options)
+                    for digest, segment in missing.items()
+                }
+                try:
+                    for digest, future in futures.items():
+                        pdf_path = future.result()
+                        with open(pdf_path, 'rb') as f:
+                            data = f.read()
+                        os.unlink(pdf_path)
+                        rendered[digest] = data
+                        segment_cache.put(digest, data)
+                finally:
+                    for future in futures.values():
+                        future.cancel()
+
+        for digest in digests:
+            for page in PdfReader(BytesIO(rendered[digest])).pages:
+                writer.add_page(page)
+
+        if numbered_header and writer.pages:
+            stamp_numbered_header(writer, scratch, header_html, options)
+    return writer
+
+
+# Rendered segment PDFs keyed by segment_digest
+segment_cache = RenderCache(memory_budget=SEGMENT_CACHE_MEMORY, disk_budget=SEGMENT_CACHE_DISK,
+                            cache_dir=os.path.join(CACHE_DIR, 'segments'), ttl=CACHE_TTL)
+
+metrics.gauge('docgen_pdf_segment_cache_hits_total', 'PDF segments served from the segment cache',
+              lambda: {('memory',): segment_cache.stats()['memory_hits'], ('disk',): segment_cache.stats()['disk_hits']},
+              labels=['tier'], kind='counter')
+metrics.gauge('docgen_pdf_segment_cache_misses_total', 'PDF segments that had to be rendered',
+              lambda: segment_cache.stats()['misses'], kind='counter')
@@ -0,0 +1,59 @@
+from io import BytesIO
+from PyPDF2 import PdfReader
+from app.services.renderer_pool import renderer_pool
+from app.services.asset_cache import asset_cache
+from app.services.pdf_overlay import page_to_form_xobject, stamp_xobject
+from app.services.pdf_templates import page_options, render_footer
+from app.utils.scratch import ScratchSpace
+
+# The footer is rendered on an otherwise empty, transparent page and sits in the bottom margin
+FOOTER_OPTIONS = page_options(**{
+    'margin-top': '0mm',
+    'margin-bottom': '8mm',
+    'no-background': None
+})
+
+
+def _render_footer_pdf(footer_html):
+    """
+    Render footer HTML on its own page with wkhtmltopdf
+
+    Returns:
+        bytes: One-page PDF with the footer at the bottom of the page
+    """
+    with ScratchSpace() as scratch:
+        html_path = scratch.write_text('footer.html', render_footer(footer_html))
+        pdf_path = scratch.path('footer.pdf')
+        renderer_pool.render(html_path, pdf_path, FOOTER_OPTIONS)
+        scratch.measure()
+        with open(pdf_path, 'rb') as f:
+            return f.read()
+
+
+def get_footer_pdf(footer_html):
+    """
+    Get the rendered footer page for some footer HTML, rendering it only once
+
+    Args:
+        footer_html (str): HTML content for the footer
+
+    Returns:
+        bytes: One-page PDF with the footer
+    """
+    return asset_cache.get('pdf_footer', footer_html, _render_footer_pdf)
+
+
+def stamp_footer(writer, page, footer_html):
+    """
+    Overlay the footer onto a page as a form XObject
+
+    Args:
+        writer (PdfWriter): The PDF the page belongs to
+        page (PageObject): Page already added to the writer (normally the last one)
+        footer_html (str): HTML content for the footer
+    """
+    footer_reader = PdfReader(BytesIO(get_footer_pdf(footer_html)))
+    if not footer_reader.pages:
+        return
+    footer_form = page_to_form_xobject(writer, footer_reader.pages[0])
+    stamp_xobject(writer, page, footer_form, '/DocgenFooter')
@@ -0,0 +1,251 @@
+import re
+from PyPDF2 import PdfWriter, PageObject
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+from app.services.pdf_templates import PAGE_SIZE, MARGIN_TOP, MARGIN_RIGHT, MARGIN_BOTTOM, MARGIN_LEFT
+from app.services.pdf_watermark import text_width, pdf_string
+
+# Page sizes in points (portrait)
+PAGE_SIZES = {
+    'a3': (841.89, 1190.55),
+    'a4': (595.28, 841.89),
+    'a5': (419.53, 595.28),
+    'letter': (612, 792),
+    'legal': (612, 1008)
+}
+
+# Points per unit for the margin units wkhtmltopdf accepts
+UNITS = {'mm': 72 / 25.4, 'cm': 72 / 2.54, 'in': 72, 'pt': 1, 'px': 0.75}
+
+# Type settings, close to the stylesheet wkhtmltopdf renders with
+BODY_FONT = 'Helvetica'
+BOLD_FONT = 'Helvetica-Bold'
+BODY_SIZE = 11
+HEADING_SIZES = {1: 22, 2: 16.5, 3: 13}
+DECORATION_SIZE = 7.5
+DECORATION_GRAY = 0.47
+LINE_HEIGHT = 1.2
+LIST_INDENT = 30
+CELL_PADDING = 2
+HEADER_SPACING = 5 * UNITS['mm']
+FOOTER_OFFSET = 8 * UNITS['mm']
+
+_LENGTH_RE = re.compile(r'^\s*([\d.]+)\s*(mm|cm|in|pt|px)\s*$', re.IGNORECASE)
+
+_FONT_NAMES = {BODY_FONT: '/F1', BOLD_FONT: '/F2'}
+
+
+def _length(value):
+    match = _LENGTH_RE.match(value or '')
+    if not match:
+        return None
+    return float(match.group(1)) * UNITS[match.group(2).lower()]
+
+
+def page_geometry():
+    """
+    Page size and margins in points for the configured page setup
+
+    Returns:
+        tuple|None: (width, height, top, right, bottom, left), or None if the
+        page size or a margin is in a form the native renderer does not know
+    """
+    size = PAGE_SIZES.get(PAGE_SIZE.lower())
+    margins = [_length(m) for m in (MARGIN_TOP, MARGIN_RIGHT, MARGIN_BOTTOM, MARGIN_LEFT)]
+    if size is None or None in margins:
+        return None
+    return size + tuple(margins)
+
+
+def _wrap(text, font, size, width):
+    """
+    Break text into lines no wider than width (long words get a line of their own)
+    """
+    lines = []
+    current = ''
+    for word in text.split():
+        candidate = f'{current} {word}' if current else word
+        if current and text_width(candidate, font, size) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines
+
+
+class _Layout:
+    """
+    Flows blocks onto pages, collecting one content stream per page
+    """
+
+    def __init__(self, geometry):
+        self.width, self.height, self.top, self.right, self.bottom, self.left = geometry
+        self.content_width = self.width - self.left - self.right
+        self.pages = []
+        self.out = None
+        self.y = 0
+        self.list_counters = []
+        self.new_page()
+
+    def new_page(self):
+        self.out = []
+        self.pages.append(self.out)
+        self.y = self.height - self.top
+
+    def page_is_empty(self):
+        return not self.out
+
+    def ensure_room(self, height):
+        if self.y - height < self.bottom and not self.page_is_empty():
+            self.new_page()
+
+    def space(self, amount):
+        # Vertical space collapses at the top of a page
+        if not self.page_is_empty():
+            self.y -= amount
+
+    def text_line(self, text, x, y, font, size):
+        self.out.append(b'BT %s %.2f Tf 0 g %.2f %.2f Td %s Tj ET' % (
+            _FONT_NAMES[font].encode(), size, x, y, pdf_string(text)))
+
+    def lines(self, lines, font, size, indent=0, marker=None):
+        line_height = size * LINE_HEIGHT
+        for index, line in enumerate(lines):
+            self.ensure_room(line_height)
+            self.y -= size
+            x = self.left + indent
+            if marker and index == 0:
+                self.text_line(marker, x - text_width(marker + ' ', font, size), self.y, font, size)
+            self.text_line(line, x, self.y, font, size)
+            self.y -= line_height - size
+
+    def heading(self, level, text):
+        size = HEADING_SIZES[level]
+        self.space(size * 0.67)
+        lines = _wrap(text, BOLD_FONT, size, self.content_width)
+        # Keep a heading with at least one line of what follows
+        self.ensure_room(len(lines) * size * LINE_HEIGHT + BODY_SIZE * LINE_HEIGHT)
+        self.lines(lines, BOLD_FONT, size)
+        self.space(size * 0.67)
+
+    def paragraph(self, text):
+        self.space(BODY_SIZE)
+        self.lines(_wrap(text, BODY_FONT, BODY_SIZE, self.content_width), BODY_FONT, BODY_SIZE)
+        self.space(BODY_SIZE)
+
+    def list_item(self, list_tag, depth, text):
+        del self.list_counters[depth:]
+        while len(self.list_counters) < depth:
+            self.list_counters.append(0)
+        self.list_counters[depth - 1] += 1
+        marker = '•' if list_tag == 'ul' else f'{self.list_counters[depth - 1]}.'
+        indent = LIST_INDENT * depth
+        lines = _wrap(text, BODY_FONT, BODY_SIZE, self.content_width - indent)
+        self.lines(lines or [''], BODY_FONT, BODY_SIZE, indent, marker=marker)
+
+    def end_list(self):
+        if self.list_counters:
+            self.list_counters = []
+            self.space(BODY_SIZE)
+
+    def table(self, rows):
+        columns = max(len(row) for row in rows)
+        column_width = self.content_width / columns
+        text_width_limit = column_width - 2 * CELL_PADDING
+        line_height = BODY_SIZE * LINE_HEIGHT
+        self.space(CELL_PADDING)
+        for row in rows:
+            cells = []
+            for text, is_header, _, _, _ in row:
+                font = BOLD_FONT if is_header else BODY_FONT
+                cells.append((_wrap(text, font, BODY_SIZE, text_width_limit), font, is_header))
+            row_height = max([len(lines) for lines, _, _ in cells] + [1]) * line_height + 2 * CELL_PADDING
+            # Rows are not split; a row taller than a page runs into the bottom margin
+            self.ensure_room(row_height)
+            top = self.y - CELL_PADDING
+            for column, (lines, font, is_header) in enumerate(cells):
+                x0 = self.left + column * column_width + CELL_PADDING
+                y = top
+                for line in lines:
+                    y -= BODY_SIZE
+                    x = x0
+                    if is_header:
+                        x = x0 + (text_width_limit - text_width(line, font, BODY_SIZE)) / 2
+                    self.text_line(line, x, y, font, BODY_SIZE)
+                    y -= line_height - BODY_SIZE
+            self.y -= row_height
+        self.space(CELL_PADDING)
+
+    def page_break(self):
+        if not self.page_is_empty():
+            self.new_page()
+
+
+def _font(base_font):
+    return DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/' + base_font),
+        NameObject('/Encoding'): NameObject('/WinAnsiEncoding')
+    })
+
+
+def _decoration(layout, text, baseline):
+    """
+    Content stream drawing a centred header or footer line
+    """
+    x = layout.left + (layout.content_width - text_width(text, BODY_FONT, DECORATION_SIZE)) / 2
+    return b'BT /F1 %.2f Tf %.3f g %.2f %.2f Td %s Tj ET' % (
+        DECORATION_SIZE, DECORATION_GRAY, x, baseline, pdf_string(text))
+
+
+def render_native_pdf(blocks, header_text='', footer_text=''):
+    """
+    Lay out body blocks in-process and build a PDF without wkhtmltopdf
+
+    Args:
+        blocks: Blocks of a lossless prepared body (see html_preprocess)
+        header_text (str): Plain header text drawn on every page
+        footer_text (str): Plain footer text drawn on the last page
+
+    Returns:
+        PdfWriter: The document, ready for the watermark to be stamped
+    """
+    layout = _Layout(page_geometry())
+    for block in blocks:
+        kind = block[0]
+        if kind != 'list_item':
+            layout.end_list()
+        if kind == 'heading':
+            layout.heading(block[1], block[2])
+        elif kind == 'paragraph':
+            layout.paragraph(block[1])
+        elif kind == 'page_break':
+            layout.page_break()
+        elif kind == 'list_item':
+            layout.list_item(*block[1:])
+        elif kind == 'table':
+            layout.table(block[1])
+
+    writer = PdfWriter()
+    fonts = DictionaryObject({
+        NameObject('/F1'): writer._add_object(_font(BODY_FONT)),
+        NameObject('/F2'): writer._add_object(_font(BOLD_FONT))
+    })
+    fonts = writer._add_object(fonts)
+    for index, out in enumerate(layout.pages):
+        if header_text:
+            out.append(_decoration(layout, header_text, layout.height - layout.top + HEADER_SPACING))
+        if footer_text and index == len(layout.pages) - 1:
+            rule_y = FOOTER_OFFSET + DECORATION_SIZE * LINE_HEIGHT + 4
+            out.append(b'0.8 G 0.75 w %.2f %.2f m %.2f %.2f l S' % (
+                layout.left, rule_y, layout.width - layout.right, rule_y))
+            out.append(_decoration(layout, footer_text, FOOTER_OFFSET))
+        stream = DecodedStreamObject()
+        stream.set_data(b'\n'.join(out))
+        page = PageObject.create_blank_page(None, layout.width, layout.height)
+        page[NameObject('/Resources')] = DictionaryObject({NameObject('/Font'): fonts})
+        page[NameObject('/Contents')] = writer._add_object(stream)
+        writer.add_page(page)
+    return writer
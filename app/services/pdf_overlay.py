@@ -0,0 +1,92 @@
+from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject, NameObject
+
+
+def make_form_xobject(writer, content, resources, bbox):
+    """
+    Add a form XObject to a PDF being written
+
+    Args:
+        writer (PdfWriter): The PDF the XObject belongs to
+        content (bytes): Content stream drawing the form
+        resources (DictionaryObject): Resources (fonts, images...) used by the content
+        bbox (list): Bounding box [llx, lly, urx, ury] of the form
+
+    Returns:
+        IndirectObject: Reference to the XObject
+    """
+    form = DecodedStreamObject()
+    form.set_data(content)
+    form.update({
+        NameObject('/Type'): NameObject('/XObject'),
+        NameObject('/Subtype'): NameObject('/Form'),
+        NameObject('/BBox'): ArrayObject([FloatObject(v) for v in bbox]),
+        NameObject('/Resources'): resources
+    })
+    return writer._add_object(form)
+
+
+def page_to_form_xobject(writer, page):
+    """
+    Turn a page (usually from another PDF) into a form XObject of the writer
+
+    Args:
+        writer (PdfWriter): The PDF the XObject belongs to
+        page (PageObject): The page to convert
+
+    Returns:
+        IndirectObject: Reference to the XObject
+    """
+    contents = page.get_contents()
+    content = contents.get_data() if contents is not None else b''
+    if '/Resources' in page:
+        resources = page['/Resources'].get_object().clone(writer)
+    else:
+        resources = DictionaryObject()
+    return make_form_xobject(writer, content, resources, page.mediabox)
+
+
+def _add_stream(writer, data):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+
+def stamp_xobject(writer, page, xobject, name, under=False):
+    """
+    Draw a form XObject over (or under) the existing content of a page
+
+    Args:
+        writer (PdfWriter): The PDF the page belongs to
+        page (PageObject): Page already added to the writer
+        xobject (IndirectObject): Form XObject to draw
+        name (str): Resource name for the XObject, e.g. '/Footer'
+        under (bool): Draw beneath the page content instead of on top
+    """
+    # Register the XObject in the page resources
+    if '/Resources' in page:
+        resources = page['/Resources'].get_object()
+    else:
+        resources = DictionaryObject()
+        page[NameObject('/Resources')] = resources
+    if '/XObject' in resources:
+        xobjects = resources['/XObject'].get_object()
+    else:
+        xobjects = DictionaryObject()
+        resources[NameObject('/XObject')] = xobjects
+    xobjects[NameObject(name)] = xobject
+
+    # Existing content is wrapped in q/Q so its graphics state cannot leak into the stamp
+    existing = page.get('/Contents')
+    if existing is None:
+        streams = []
+    elif isinstance(existing.get_object(), ArrayObject):
+        streams = list(existing.get_object())
+    else:
+        streams = [existing]
+
+    draw = _add_stream(writer, f'q {name} Do Q\n'.encode('latin-1'))
+    if under:
+        streams = [draw, _add_stream(writer, b'q\n')] + streams + [_add_stream(writer, b'\nQ\n')]
+    else:
+        streams = [_add_stream(writer, b'q\n')] + streams + [_add_stream(writer, b'\nQ\n'), draw]
+    page[NameObject('/Contents')] = ArrayObject(streams)
@@ -0,0 +1,296 @@
+import os
+import re
+import html
+import hashlib
+import pathlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from app.services.asset_cache import asset_cache
+
+# Page geometry shared by the stylesheet and the wkhtmltopdf options
+PAGE_SIZE = os.environ.get('DOCGEN_PAGE_SIZE', 'A4')
+MARGIN_TOP = os.environ.get('DOCGEN_MARGIN_TOP', '25mm')
+MARGIN_RIGHT = os.environ.get('DOCGEN_MARGIN_RIGHT', '15mm')
+MARGIN_BOTTOM = os.environ.get('DOCGEN_MARGIN_BOTTOM', '25mm')
+MARGIN_LEFT = os.environ.get('DOCGEN_MARGIN_LEFT', '15mm')
+
+ASSET_DIR = os.environ.get('DOCGEN_ASSET_DIR', os.path.join(tempfile.gettempdir(), 'docgen-assets'))
+
+STYLESHEET = f"""
+@page {{
+    size: {PAGE_SIZE};
+    margin: {MARGIN_TOP} {MARGIN_RIGHT} {MARGIN_BOTTOM} {MARGIN_LEFT};
+}}
+
+body {{
+    font-family: Arial, sans-serif;
+    margin: 0;
+    padding: 0;
+    position: relative;
+}}
+
+/* HTML watermark page, used for text outside the standard PDF fonts */
+body.watermark .watermark {{
+    position: fixed;
+    top: 50%;
+    left: 50%;
+    color: rgba(200, 200, 200, 0.3);
+    font-size: 100px;
+    font-weight: bold;
+    white-space: nowrap;
+    -webkit-transform: translate(-50%, -50%) rotate(-45deg);
+    transform: translate(-50%, -50%) rotate(-45deg);
+}}
+
+body.header {{
+    text-align: center;
+    font-size: 10px;
+    color: #777;
+}}
+
+/* Scoped to the footer document, so body content with class="footer" is unaffected */
+body.footer .footer {{
+    position: fixed;
+    bottom: 0;
+    left: 0;
+    width: 100%;
+    text-align: center;
+    border-top: 1px solid #ccc;
+    padding-top: 5px;
+    font-size: 10px;
+    color: #777;
+}}
+"""
+
+
+class WrapperTemplate:
+    """
+    HTML skeleton split once into static parts around named {{slot}} markers
+    """
+
+    _SLOT_RE = re.compile(r'\{\{(\w+)\}\}')
+
+    def __init__(self, skeleton):
+        parts = self._SLOT_RE.split(skeleton.strip())
+        # Even indexes are static text, odd indexes are slot names
+        self.static = parts[0::2]
+        self.slots = parts[1::2]
+
+    def render(self, **values):
+        """
+        Fill the slots and return the complete document
+        """
+        out = [self.static[0]]
+        for slot, static in zip(self.slots, self.static[1:]):
+            out.append(values.get(slot, ''))
+            out.append(static)
+        return ''.join(out)
+
+
+MAIN_TEMPLATE = WrapperTemplate("""
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<title>Generated Document</title>
+<link rel="stylesheet" href="{{stylesheet}}">
+</head>
+<body>
+<div class="content">
+{{content}}
+</div>
+</body>
+</html>
+""")
+
+HEADER_TEMPLATE = WrapperTemplate("""
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<link rel="stylesheet" href="{{stylesheet}}">
+</head>
+<body class="header">
+{{header}}
+</body>
+</html>
+""")
+
+FOOTER_TEMPLATE = WrapperTemplate("""
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<link rel="stylesheet" href="{{stylesheet}}">
+</head>
+<body class="footer">
+<div class="footer">
+{{footer}}
+</div>
+</body>
+</html>
+""")
+
+WATERMARK_TEMPLATE = WrapperTemplate("""
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<link rel="stylesheet" href="{{stylesheet}}">
+</head>
+<body class="watermark">
+<div class="watermark">{{watermark}}</div>
+</body>
+</html>
+""")
+
+_stylesheet_uri = None
+_stylesheet_lock = threading.Lock()
+
+
+def stylesheet_uri():
+    """
+    Write the shared stylesheet to disk once and return its file:// URI
+
+    The file name includes a hash of the CSS so a changed configuration never
+    picks up a stale file from a previous process.
+    """
+    global _stylesheet_uri
+    if _stylesheet_uri is None:
+        with _stylesheet_lock:
+            if _stylesheet_uri is None:
+                os.makedirs(ASSET_DIR, exist_ok=True)
+                digest = hashlib.sha256(STYLESHEET.encode('utf-8')).hexdigest()[:16]
+                path = os.path.join(ASSET_DIR, f'docgen-{digest}.css')
+                if not os.path.exists(path):
+                    fd, tmp_path = tempfile.mkstemp(dir=ASSET_DIR, suffix='.tmp')
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        f.write(STYLESHEET)
+                    os.replace(tmp_path, path)
+                _stylesheet_uri = pathlib.Path(path).as_uri()
+    return _stylesheet_uri
+
+
+def page_options(**overrides):
+    """
+    Base wkhtmltopdf options for the configured page geometry
+
+    Args:
+        **overrides: Options to add or replace
+
+    Returns:
+        dict: wkhtmltopdf options in pdfkit format
+    """
+    options = {
+        'page-size': PAGE_SIZE,
+        'margin-top': MARGIN_TOP,
+        'margin-right': MARGIN_RIGHT,
+        'margin-bottom': MARGIN_BOTTOM,
+        'margin-left': MARGIN_LEFT,
+        'encoding': 'UTF-8',
+        'enable-local-file-access': None
+    }
+    options.update(overrides)
+    return options
+
+
+def render_main(content_html):
+    """
+    Wrap body content in the main document skeleton
+    """
+    return MAIN_TEMPLATE.render(stylesheet=stylesheet_uri(), content=content_html)
+
+
+def render_header(header_html):
+    """
+    Wrap header content in the header skeleton
+    """
+    return HEADER_TEMPLATE.render(stylesheet=stylesheet_uri(), header=header_html)
+
+
+def render_footer(footer_html):
+    """
+    Wrap footer content in the footer skeleton
+    """
+    return FOOTER_TEMPLATE.render(stylesheet=stylesheet_uri(), footer=footer_html)
+
+
+def render_watermark(watermark_text):
+    """
+    Wrap plain watermark text in the watermark page skeleton
+    """
+    return WATERMARK_TEMPLATE.render(stylesheet=stylesheet_uri(), watermark=html.escape(watermark_text))
+
+
+def _write_asset(content, prefix, suffix):
+    """
+    Write a generated asset to a new file in the asset directory
+    """
+    os.makedirs(ASSET_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=ASSET_DIR, prefix=prefix, suffix=suffix)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+
+def _remove_asset(path):
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+# Header files in use by renders, and evicted ones waiting for their last render to finish
+_header_leases = {}
+_retired_headers = set()
+_lease_lock = threading.Lock()
+
+
+def _retire_header(path):
+    """
+    Asset cache cleanup for header files: delete now, or once no render holds the file
+    """
+    with _lease_lock:
+        if _header_leases.get(path):
+            _retired_headers.add(path)
+        else:
+            _remove_asset(path)
+
+
+@contextmanager
+def header_file(header_html):
+    """
+    Lease the wrapped header HTML file for wkhtmltopdf, written once per distinct header
+
+    The file is owned by the asset cache and must not be deleted by the caller.
+    It stays on disk until the with block ends, even if the cache evicts it
+    meanwhile, so hold the lease for as long as a render may read the file.
+
+        with header_file(header_html) as path:
+            options['header-html'] = path
+            renderer_pool.render(...)
+
+    Yields:
+        str: Path of the header file
+    """
+    while True:
+        path = asset_cache.get(
+            'pdf_header_file',
+            header_html,
+            lambda h: _write_asset(render_header(h), 'header-', '.html'),
+            cleanup=_retire_header
+        )
+        with _lease_lock:
+            # An entry evicted between the lookup and the lease is gone; look it up again
+            if os.path.exists(path):
+                _header_leases[path] = _header_leases.get(path, 0) + 1
+                break
+    try:
+        yield path
+    finally:
+        with _lease_lock:
+            _header_leases[path] -= 1
+            if not _header_leases[path]:
+                del _header_leases[path]
+                if path in _retired_headers:
+                    _retired_headers.discard(path)
+                    _remove_asset(path)
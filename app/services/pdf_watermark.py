@@ -0,0 +1,238 @@
+import os
+import math
+from io import BytesIO
+from collections import namedtuple
+from PyPDF2 import PdfReader
+from PyPDF2.generic import DictionaryObject, FloatObject, NameObject
+from app.services.asset_cache import asset_cache
+from app.services.pdf_overlay import make_form_xobject, page_to_form_xobject, stamp_xobject
+from app.services.pdf_templates import page_options, render_watermark
+from app.services.renderer_pool import renderer_pool
+from app.utils.scratch import ScratchSpace
+from app.services.html_preprocess import prepare_html
+
+# Default appearance, overridable through the environment
+WATERMARK_FONT = os.environ.get('DOCGEN_WATERMARK_FONT', 'Helvetica-Bold')
+WATERMARK_FONT_SIZE = float(os.environ.get('DOCGEN_WATERMARK_FONT_SIZE', 75))
+WATERMARK_ANGLE = float(os.environ.get('DOCGEN_WATERMARK_ANGLE', 45))
+WATERMARK_OPACITY = float(os.environ.get('DOCGEN_WATERMARK_OPACITY', 0.3))
+WATERMARK_GRAY = float(os.environ.get('DOCGEN_WATERMARK_GRAY', 0.78))
+WATERMARK_TILE = os.environ.get('DOCGEN_WATERMARK_TILE', '').lower() in ('1', 'true', 'yes')
+WATERMARK_TILE_GAP = float(os.environ.get('DOCGEN_WATERMARK_TILE_GAP', 72))
+# wkhtmltopdf paints an opaque white page background, so a watermark drawn under the
+# content only shows on transparent pages; drawn over, the opacity keeps text readable
+WATERMARK_LAYER = os.environ.get('DOCGEN_WATERMARK_LAYER', 'over')
+
+# Text outside the standard fonts is rendered as HTML on a full-bleed, transparent page
+WATERMARK_PAGE_OPTIONS = page_options(**{
+    'margin-top': '0mm',
+    'margin-right': '0mm',
+    'margin-bottom': '0mm',
+    'margin-left': '0mm',
+    'no-background': None
+})
+
+WatermarkStyle = namedtuple('WatermarkStyle', ['font', 'font_size', 'angle', 'opacity', 'gray', 'tile', 'tile_gap'])
+
+DEFAULT_STYLE = WatermarkStyle(WATERMARK_FONT, WATERMARK_FONT_SIZE, WATERMARK_ANGLE, WATERMARK_OPACITY,
+                               WATERMARK_GRAY, WATERMARK_TILE, WATERMARK_TILE_GAP)
+
+# Glyph widths (1/1000 em) of the standard fonts for the printable ASCII range, from their AFM metrics
+_ASCII_WIDTHS = {
+    'Helvetica': [
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+        1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+        333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+        556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584
+    ],
+    'Helvetica-Bold': [
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+        975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+        333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+        611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584
+    ]
+}
+
+# Average width used for other fonts and characters outside the table
+_DEFAULT_WIDTH = 556
+
+# Cap height as a fraction of the font size, used to centre text vertically
+_CAP_HEIGHT = 0.72
+
+
+def text_width(text, font, font_size):
+    """
+    Width of a line of text in points for one of the standard PDF fonts
+    """
+    if font.startswith('Courier'):
+        return len(text) * 600 * font_size / 1000
+    widths = _ASCII_WIDTHS.get(font)
+    total = 0
+    for char in text:
+        code = ord(char)
+        total += widths[code - 32] if widths and 32 <= code <= 126 else _DEFAULT_WIDTH
+    return total * font_size / 1000
+
+
+def can_encode(text):
+    """
+    Whether text is in the WinAnsi range of the standard PDF fonts
+    """
+    try:
+        text.encode('cp1252')
+        return True
+    except UnicodeEncodeError:
+        return False
+
+
+def pdf_string(text):
+    """
+    Literal PDF string in the font's WinAnsi encoding
+
+    Raises:
+        UnicodeEncodeError: If the text is not in that encoding (see can_encode)
+    """
+    data = text.encode('cp1252')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _placements(width, height, text_w, style):
+    """
+    Centre points of every copy of the text on a page
+    """
+    if not style.tile:
+        return [(width / 2, height / 2)]
+    # Step along the rotated text direction and across it, covering the whole page
+    step_x = text_w + style.tile_gap
+    step_y = style.font_size + style.tile_gap
+    radius = math.hypot(width, height) / 2
+    angle = math.radians(style.angle)
+    cos, sin = math.cos(angle), math.sin(angle)
+    points = []
+    rows = int(radius // step_y) + 1
+    cols = int(radius // step_x) + 1
+    for row in range(-rows, rows + 1):
+        for col in range(-cols, cols + 1):
+            # Offset rows by half a step so copies form a brick pattern
+            u = (col + (row % 2) / 2) * step_x
+            v = row * step_y
+            x = width / 2 + u * cos - v * sin
+            y = height / 2 + u * sin + v * cos
+            if -text_w <= x <= width + text_w and -text_w <= y <= height + text_w:
+                points.append((x, y))
+    return points
+
+
+def build_watermark_content(text, style, width, height):
+    """
+    Content stream drawing the watermark text on a page of the given size
+
+    Returns:
+        bytes: Content stream for a form XObject using /WmFont and /WmGS resources
+    """
+    text_w = text_width(text, style.font, style.font_size)
+    angle = math.radians(style.angle)
+    cos, sin = math.cos(angle), math.sin(angle)
+    # Offset from the centre of the text to its baseline start, in page space
+    half_w, half_h = text_w / 2, style.font_size * _CAP_HEIGHT / 2
+    dx = half_w * cos - half_h * sin
+    dy = half_w * sin + half_h * cos
+
+    out = [b'q /WmGS gs %.3f g BT /WmFont %.2f Tf' % (style.gray, style.font_size)]
+    string = pdf_string(text)
+    for x, y in _placements(width, height, text_w, style):
+        out.append(b'%.4f %.4f %.4f %.4f %.2f %.2f Tm %s Tj' % (cos, sin, -sin, cos, x - dx, y - dy, string))
+    out.append(b'ET Q')
+    return b'\n'.join(out)
+
+
+def _resources(style):
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/' + style.font),
+        NameObject('/Encoding'): NameObject('/WinAnsiEncoding')
+    })
+    state = DictionaryObject({
+        NameObject('/Type'): NameObject('/ExtGState'),
+        NameObject('/ca'): FloatObject(style.opacity),
+        NameObject('/CA'): FloatObject(style.opacity)
+    })
+    return DictionaryObject({
+        NameObject('/Font'): DictionaryObject({NameObject('/WmFont'): font}),
+        NameObject('/ExtGState'): DictionaryObject({NameObject('/WmGS'): state})
+    })
+
+
+def _render_watermark_pdf(text):
+    """
+    Render watermark text on its own page with wkhtmltopdf
+
+    Returns:
+        bytes: One-page PDF with the watermark centred on a transparent page
+    """
+    with ScratchSpace() as scratch:
+        html_path = scratch.write_text('watermark.html', render_watermark(text))
+        pdf_path = scratch.path('watermark.pdf')
+        renderer_pool.render(html_path, pdf_path, WATERMARK_PAGE_OPTIONS)
+        scratch.measure()
+        with open(pdf_path, 'rb') as f:
+            return f.read()
+
+
+def _stamp_html_watermark(writer, text, under):
+    """
+    Stamp a watermark the standard fonts cannot draw, rendered once per text by wkhtmltopdf
+    """
+    reader = PdfReader(BytesIO(asset_cache.get('pdf_watermark_page', text, _render_watermark_pdf)))
+    if not reader.pages:
+        return
+    form = page_to_form_xobject(writer, reader.pages[0])
+    for page in writer.pages:
+        stamp_xobject(writer, page, form, '/DocgenWatermark', under=under)
+
+
+def stamp_watermark(writer, watermark, style=DEFAULT_STYLE, under=None):
+    """
+    Stamp a vector text watermark onto every page of a PDF
+
+    One form XObject is added per distinct page size and shared by all pages of
+    that size; the content streams are cached across documents by text, style and
+    page size, so the HTML renderer is not involved. Text the standard fonts
+    cannot encode (e.g. Cyrillic or CJK) is rendered through wkhtmltopdf
+    instead, once per distinct text, with the HTML watermark styling (centred,
+    not tiled).
+
+    Args:
+        writer (PdfWriter): The PDF with all its pages added
+        watermark (str): HTML content for watermark
+        style (WatermarkStyle): Font, rotation, opacity and tiling settings
+        under (bool, optional): Draw beneath the page content (default from DOCGEN_WATERMARK_LAYER)
+    """
+    text = prepare_html(watermark).text
+    if not text:
+        return
+    if under is None:
+        under = WATERMARK_LAYER == 'under'
+    if not can_encode(text):
+        _stamp_html_watermark(writer, text, under)
+        return
+
+    forms = {}
+    for page in writer.pages:
+        box = page.mediabox
+        size = (float(box.width), float(box.height))
+        form = forms.get(size)
+        if form is None:
+            content = asset_cache.get(
+                'pdf_watermark',
+                repr((text, tuple(style), size)),
+                lambda _: build_watermark_content(text, style, *size)
+            )
+            form = make_form_xobject(writer, content, _resources(style), [0, 0, size[0], size[1]])
+            forms[size] = form
+        stamp_xobject(writer, page, form, '/DocgenWatermark', under=under)
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from app.utils.metrics import metrics
+
+# Cache tuning, overridable through the environment
+CACHE_TTL = float(os.environ.get('DOCGEN_CACHE_TTL', 3600))
+MEMORY_BUDGET = int(float(os.environ.get('DOCGEN_CACHE_MEMORY_MB', 64)) * 1024 * 1024)
+DISK_BUDGET = int(float(os.environ.get('DOCGEN_CACHE_DISK_MB', 512)) * 1024 * 1024)
+CACHE_DIR = os.environ.get('DOCGEN_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'docgen-cache'))
+
+
+def make_cache_key(content_html, header_html, footer_html, document_type, watermark=None, docx_template=None):
+    """
+    Build a content-addressed key for a generate request
+
+    Args:
+        content_html (str): HTML content for the body
+        header_html (str): HTML content for the header
+        footer_html (str): HTML content for the footer
+        document_type (str): "pdf" or "docx"
+        watermark (str, optional): HTML content for watermark
+        docx_template (str, optional): Name of the DOCX base template
+
+    Returns:
+        str: Hex digest identifying the rendered output
+    """
+    fields = [
+        content_html or '',
+        header_html or '',
+        footer_html or '',
+        (document_type or '').lower(),
+        watermark or ''
+    ]
+    # Optional fields are only appended when set, so existing keys stay stable
+    if docx_template:
+        fields.append(docx_template)
+    normalized = json.dumps(fields, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    Two-tier (memory + disk) LRU cache of rendered documents keyed by request hash
+    """
+
+    def __init__(self, memory_budget=MEMORY_BUDGET, disk_budget=DISK_BUDGET,
+                 cache_dir=CACHE_DIR, ttl=CACHE_TTL):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # key -> (data, expires_at), ordered from least to most recently used
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        # key -> (size, expires_at), ordered from least to most recently used
+        self.disk = OrderedDict()
+        self.disk_bytes = 0
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._load_disk_index()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _load_disk_index(self):
+        """
+        Rebuild the disk tier index from files left by a previous process
+        """
+        if self.disk_budget <= 0:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = self._disk_path(name)
+            if len(name) != 64 or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_atime, name, stat.st_size, stat.st_mtime + self.ttl))
+        for _, name, size, expires_at in sorted(entries):
+            self.disk[name] = (size, expires_at)
+            self.disk_bytes += size
+
+    def get(self, key):
+        """
+        Look up a rendered document
+
+        Args:
+            key (str): Cache key from make_cache_key
+
+        Returns:
+            bytes|None: The cached document, or None on a miss
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                data, expires_at = entry
+                if expires_at > now:
+                    self.memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return data
+                self._drop_memory(key)
+
+            entry = self.disk.get(key)
+            if entry is not None:
+                size, expires_at = entry
+                if expires_at > now:
+                    try:
+                        with open(self._disk_path(key), 'rb') as f:
+                            data = f.read()
+                    except OSError:
+                        data = None
+                    if data is not None:
+                        self.disk.move_to_end(key)
+                        self.counters['disk_hits'] += 1
+                        # Promote to the memory tier for the next hit
+                        self._put_memory(key, data, expires_at)
+                        return data
+                self._drop_disk(key)
+
+            self.counters['misses'] += 1
+            return None
+
+    def accepts(self, size):
+        """
+        Whether a document of the given size would be stored by put()
+        """
+        return 0 < size <= max(self.memory_budget // 4, self.disk_budget)
+
+    def put(self, key, data):
+        """
+        Store a rendered document in both tiers
+
+        Args:
+            key (str): Cache key from make_cache_key
+            data (bytes): The rendered document
+        """
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self._put_memory(key, data, expires_at)
+            self._put_disk(key, data, expires_at)
+
+    def _put_memory(self, key, data, expires_at):
+        # Items that would take over the memory tier only live on disk
+        if len(data) > self.memory_budget // 4:
+            return
+        if key in self.memory:
+            self._drop_memory(key)
+        self.memory[key] = (data, expires_at)
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.memory_budget:
+            oldest = next(iter(self.memory))
+            self._drop_memory(oldest)
+            self.counters['evictions'] += 1
+
+    def _put_disk(self, key, data, expires_at):
+        if len(data) > self.disk_budget:
+            return
+        if key in self.disk:
+            self._drop_disk(key)
+        # Write atomically so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        self.disk[key] = (len(data), expires_at)
+        self.disk_bytes += len(data)
+        while self.disk_bytes > self.disk_budget:
+            oldest = next(iter(self.disk))
+            self._drop_disk(oldest)
+            self.counters['evictions'] += 1
+
+    def _drop_memory(self, key):
+        data, _ = self.memory.pop(key)
+        self.memory_bytes -= len(data)
+
+    def _drop_disk(self, key):
+        size, _ = self.disk.pop(key)
+        self.disk_bytes -= size
+        try:
+            os.unlink(self._disk_path(key))
+        except OSError:
+            pass
+
+    def stats(self):
+        """
+        Hit/miss counters and tier usage
+        """
+        with self.lock:
+            return dict(self.counters,
+                        memory_items=len(self.memory), memory_bytes=self.memory_bytes,
+                        disk_items=len(self.disk), disk_bytes=self.disk_bytes)
+
+
+# Singleton instance
+render_cache = RenderCache()
+
+metrics.gauge('docgen_render_cache_hits_total', 'Rendered documents served from the cache',
+              lambda: {('memory',): render_cache.stats()['memory_hits'], ('disk',): render_cache.stats()['disk_hits']},
+              labels=['tier'], kind='counter')
+metrics.gauge('docgen_render_cache_misses_total', 'Cache lookups that had to render',
+              lambda: render_cache.stats()['misses'], kind='counter')
+metrics.gauge('docgen_render_cache_bytes', 'Bytes held by the rendered document cache',
+              lambda: {('memory',): render_cache.stats()['memory_bytes'], ('disk',): render_cache.stats()['disk_bytes']},
+              labels=['tier'])
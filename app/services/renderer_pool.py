@@ -0,0 +1,290 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import pdfkit
+from app.utils.metrics import metrics
+
+# Locations probed for the wkhtmltopdf binary, in order of preference
+WKHTMLTOPDF_PATHS = [
+    r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe',
+    r'C:\Program Files (x86)\wkhtmltopdf\bin\wkhtmltopdf.exe',
+    r'wkhtmltopdf'  # If it's in PATH
+]
+
+# Pool tuning, overridable through the environment
+POOL_SIZE = int(os.environ.get('DOCGEN_RENDER_WORKERS', os.cpu_count() or 2))
+QUEUE_SIZE = int(os.environ.get('DOCGEN_RENDER_QUEUE_SIZE', 32))
+JOB_TIMEOUT = float(os.environ.get('DOCGEN_RENDER_TIMEOUT', 60))
+MAX_JOBS_PER_WORKER = int(os.environ.get('DOCGEN_RENDER_MAX_JOBS', 200))
+MAX_WORKER_RSS_MB = int(os.environ.get('DOCGEN_RENDER_MAX_RSS_MB', 512))
+
+
+class RendererBusyError(Exception):
+    """Raised when the render queue is full and the job cannot be accepted"""
+
+
+class RenderError(Exception):
+    """Raised when wkhtmltopdf fails to produce a document"""
+
+
+_binary = None
+_binary_resolved = False
+_binary_lock = threading.Lock()
+
+
+def find_wkhtmltopdf(refresh=False):
+    """
+    Locate the wkhtmltopdf executable
+
+    The probe runs once per process and its result (including "not found") is
+    cached, since it touches the filesystem for every candidate path.
+
+    Args:
+        refresh (bool): Probe again instead of using the cached result
+
+    Returns:
+        str|None: Path to the binary, or None if it cannot be found
+    """
+    global _binary, _binary_resolved
+    with _binary_lock:
+        if refresh or not _binary_resolved:
+            _binary = next((path for path in WKHTMLTOPDF_PATHS if os.path.exists(path)), None)
+            if _binary is None:
+                _binary = shutil.which('wkhtmltopdf')
+            _binary_resolved = True
+        return _binary
+
+
+def _quote_arg(arg):
+    """
+    Quote a single argument for wkhtmltopdf's --read-args-from-stdin parser
+    """
+    if arg and not any(c in arg for c in ' \t"\'\\'):
+        return arg
+    return '"' + arg.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class _RenderJob:
+    def __init__(self, args, output_path):
+        self.args = args
+        self.output_path = output_path
+        self.done = threading.Event()
+        self.error = None
+
+
+class _RendererProcess:
+    """
+    A long-lived wkhtmltopdf process that converts one document per stdin line
+    """
+
+    def __init__(self, binary):
+        self.jobs_done = 0
+        self.process = subprocess.Popen(
+            [binary, '--read-args-from-stdin'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+        # wkhtmltopdf reports progress on stderr; a reader thread turns it into lines
+        self.lines = queue.Queue()
+        self.reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self.reader.start()
+
+    def _read_stderr(self):
+        for line in self.process.stderr:
+            self.lines.put(line.strip())
+        self.lines.put(None)  # EOF - the process has exited
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def rss_mb(self):
+        """
+        Resident set size of the process in MB, or 0 when it cannot be read
+        """
+        try:
+            with open(f'/proc/{self.process.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
+
+    def run(self, job, timeout):
+        """
+        Run a single conversion and wait for wkhtmltopdf to report completion
+        """
+        self.process.stdin.write(' '.join(_quote_arg(a) for a in job.args) + '\n')
+        self.process.stdin.flush()
+
+        deadline = time.monotonic() + timeout
+        messages = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Render timed out after {timeout} seconds")
+            try:
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if line is None:
+                raise RenderError("wkhtmltopdf exited unexpectedly: " + '\n'.join(messages[-5:]))
+            if line == 'Done':
+                break
+            if line and not line.startswith('['):
+                messages.append(line)
+
+        self.jobs_done += 1
+        if not os.path.exists(job.output_path) or os.path.getsize(job.output_path) == 0:
+            raise RenderError("wkhtmltopdf produced no output: " + '\n'.join(messages[-5:]))
+
+    def stop(self):
+        try:
+            self.process.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class RendererPool:
+    """
+    Pool of persistent wkhtmltopdf workers fed from a bounded job queue
+    """
+
+    def __init__(self, size=POOL_SIZE, queue_size=QUEUE_SIZE, job_timeout=JOB_TIMEOUT,
+                 max_jobs=MAX_JOBS_PER_WORKER, max_rss_mb=MAX_WORKER_RSS_MB):
+        self.size = size
+        self.job_timeout = job_timeout
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.binary = None
+        self.config = None
+        self.workers = []
+        self.processes = {}  # Worker thread index -> its current _RendererProcess, if any
+        self.recycled = 0
+        self.start_lock = threading.Lock()
+
+    def _resolve(self):
+        """
+        Resolve the binary and its pdfkit configuration once
+        """
+        if self.config is None:
+            binary = find_wkhtmltopdf()
+            if not binary:
+                raise RenderError("No wkhtmltopdf executable found")
+            self.binary = binary
+            self.config = pdfkit.configuration(wkhtmltopdf=binary)
+
+    def _start(self):
+        """
+        Resolve the binary and start the worker threads on first use
+        """
+        with self.start_lock:
+            if self.workers:
+                return
+            self._resolve()
+            for i in range(self.size):
+                worker = threading.Thread(target=self._worker_loop, args=(i,), name=f'renderer-{i}', daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def _worker_loop(self, index):
+        process = None
+        while True:
+            job = self.jobs.get()
+            try:
+                if process is None or not process.alive():
+                    process = self.processes[index] = _RendererProcess(self.binary)
+                process.run(job, self.job_timeout)
+            except Exception as e:
+                job.error = e
+                # A failed or timed out worker is in an unknown state; replace it
+                if process is not None:
+                    process.process.kill()
+                    process = self.processes[index] = None
+            finally:
+                job.done.set()
+                self.jobs.task_done()
+
+            # Recycle workers that have done too much work or grown too large
+            if process is not None and (process.jobs_done >= self.max_jobs
+                                        or process.rss_mb() > self.max_rss_mb):
+                process.stop()
+                process = self.processes[index] = None
+                self.recycled += 1
+
+    def render(self, input_path, output_path, options):
+        """
+        Render an HTML file to PDF using a pooled wkhtmltopdf worker
+
+        Args:
+            input_path (str): Path of the HTML file to render
+            output_path (str): Path where the PDF should be written
+            options (dict): wkhtmltopdf options in pdfkit format
+
+        Returns:
+            str: Path to the generated PDF
+
+        Raises:
+            RendererBusyError: If the job queue is full
+            RenderError: If the conversion fails
+        """
+        if self.size <= 0:
+            # Pool disabled - spawn a one-off process per render
+            with self.start_lock:
+                self._resolve()
+            pdfkit.from_file(input_path, output_path, options=options, configuration=self.config)
+            return output_path
+
+        self._start()
+        command = pdfkit.PDFKit(input_path, 'file', options=options, configuration=self.config,
+                                verbose=True).command(output_path)
+        job = _RenderJob(command[1:], output_path)
+
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            raise RendererBusyError("Render queue is full, try again later")
+
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return output_path
+
+    def stats(self):
+        """
+        Current pool state for diagnostics
+        """
+        return {
+            'workers': len(self.workers),
+            'processes': sum(1 for process in list(self.processes.values())
+                             if process is not None and process.alive()),
+            'queue_depth': self.jobs.qsize(),
+            'queue_capacity': self.jobs.maxsize,
+            'recycled': self.recycled
+        }
+
+
+# Singleton instance
+renderer_pool = RendererPool()
+
+metrics.gauge('docgen_renderer_workers', 'Running wkhtmltopdf worker processes',
+              lambda: renderer_pool.stats()['processes'])
+metrics.gauge('docgen_renderer_queue_depth', 'Render jobs waiting for a worker',
+              lambda: renderer_pool.stats()['queue_depth'])
+metrics.gauge('docgen_renderer_queue_capacity', 'Render jobs that can wait before requests are rejected',
+              lambda: renderer_pool.stats()['queue_capacity'])
+metrics.gauge('docgen_renderer_recycled_total', 'wkhtmltopdf workers replaced after a job limit, memory limit or crash',
+              lambda: renderer_pool.stats()['recycled'], kind='counter')
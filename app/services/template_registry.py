@@ -0,0 +1,268 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from jinja2 import TemplateError as JinjaTemplateError
+from jinja2.sandbox import SandboxedEnvironment
+from app.utils.metrics import metrics, stage_timer
+from app.utils.request_limits import FIELD_LIMITS
+
+logger = logging.getLogger(__name__)
+
+# Optional directory where registered templates are persisted as JSON, and reloaded from on startup
+TEMPLATE_DIR = os.environ.get('DOCGEN_TEMPLATE_DIR')
+
+# Maximum number of registered templates
+MAX_TEMPLATES = int(os.environ.get('DOCGEN_MAX_TEMPLATES', 1000))
+
+# Fields a template stores; the HTML ones may use Jinja2 syntax
+TEMPLATE_FIELDS = ('content_html', 'header_html', 'footer_html', 'watermark', 'document_type', 'docx_template')
+HTML_FIELDS = ('content_html', 'header_html', 'footer_html', 'watermark')
+
+TEMPLATE_ID_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# Any of these marks a fragment as dynamic; others are passed through as-is
+_JINJA_MARKERS = ('{{', '{%', '{#')
+
+
+class TemplateError(ValueError):
+    """Raised when a template is unknown, does not compile or fails to render"""
+
+
+class TemplateTooLargeError(TemplateError):
+    """Raised when a rendered field exceeds the request size limit for that field"""
+
+
+class TemplateRegistryFullError(Exception):
+    """Raised when MAX_TEMPLATES templates are already registered"""
+
+
+class DocumentTemplate:
+    """
+    A registered template with its fragments compiled once
+
+    Fragments without Jinja2 syntax are kept as plain strings, so each render
+    passes the same header, footer and watermark text through and the prepared
+    assets in asset_cache are reused.
+    """
+
+    def __init__(self, template_id, fields, environment):
+        self.id = template_id
+        self.fields = fields
+        self.created_at = time.time()
+        self.compiled = {}
+        for name in HTML_FIELDS:
+            source = fields.get(name)
+            if source and any(marker in source for marker in _JINJA_MARKERS):
+                try:
+                    self.compiled[name] = environment.from_string(source)
+                except JinjaTemplateError as e:
+                    raise TemplateError(f"Field {name} does not compile: {e}")
+
+    def render(self, data, field_limits=FIELD_LIMITS):
+        """
+        Render the template's document fields for one data dict
+
+        Rendered fields are held to the same byte limits as fields sent in a
+        request body; rendering stops as soon as a field goes over its limit.
+
+        Returns:
+            dict: Document fields in the shape of a generate request
+
+        Raises:
+            TemplateError: If a field fails to render
+            TemplateTooLargeError: If a rendered field exceeds its limit
+        """
+        document = {}
+        for name in TEMPLATE_FIELDS:
+            if name in self.compiled:
+                document[name] = self._render_field(name, data, field_limits.get(name))
+            elif self.fields.get(name) is not None:
+                document[name] = self.fields[name]
+        return document
+
+    def _render_field(self, name, data, limit):
+        parts = []
+        size = 0
+        try:
+            for part in self.compiled[name].generate(data):
+                size += len(part.encode('utf-8'))
+                if limit is not None and size > limit:
+                    raise TemplateTooLargeError(f"Template {self.id} renders {name} over the limit of {limit} bytes")
+                parts.append(part)
+        except TemplateTooLargeError:
+            raise
+        except Exception as e:
+            raise TemplateError(f"Template {self.id} failed to render {name}: {e}")
+        return ''.join(parts)
+
+    def to_dict(self):
+        return {
+            'template_id': self.id,
+            'document_type': self.fields.get('document_type'),
+            'docx_template': self.fields.get('docx_template'),
+            'dynamic_fields': sorted(self.compiled),
+            'created_at': self.created_at
+        }
+
+
+class TemplateRegistry:
+    """
+    Registry of compiled document templates, shared across requests
+
+    Templates are compiled once in a sandboxed Jinja2 environment with HTML
+    autoescaping, so data values cannot inject markup or reach Python internals.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR, max_templates=MAX_TEMPLATES):
+        self.template_dir = template_dir
+        self.max_templates = max_templates
+        self.environment = SandboxedEnvironment(autoescape=True)
+        self.templates = {}
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def _ensure_loaded(self):
+        """
+        Load the templates persisted in template_dir on first use
+        """
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            if not self.template_dir or not os.path.isdir(self.template_dir):
+                return
+            for filename in sorted(os.listdir(self.template_dir)):
+                template_id, ext = os.path.splitext(filename)
+                if ext != '.json' or not TEMPLATE_ID_RE.match(template_id):
+                    continue
+                try:
+                    with open(os.path.join(self.template_dir, filename), encoding='utf-8') as f:
+                        fields = json.load(f)
+                    self.templates[template_id] = DocumentTemplate(template_id, fields, self.environment)
+                except (OSError, ValueError) as e:
+                    logger.warning("Skipping template %s: %s", filename, e)
+
+    def register(self, fields, template_id=None):
+        """
+        Compile and store a template, replacing any template with the same id
+
+        Args:
+            fields (dict): Template fields (content_html required; header_html,
+                footer_html, watermark, document_type and docx_template optional)
+            template_id (str, optional): Id to register under; derived from the
+                content when omitted, so registering the same template twice is idempotent
+
+        Returns:
+            DocumentTemplate: The registered template
+
+        Raises:
+            TemplateError: If a fragment does not compile
+            TemplateRegistryFullError: If the registry is full
+        """
+        fields = {name: fields[name] for name in TEMPLATE_FIELDS if fields.get(name) is not None}
+        if template_id is None:
+            canonical = json.dumps(fields, sort_keys=True).encode('utf-8')
+            template_id = hashlib.sha256(canonical).hexdigest()[:32]
+        template = DocumentTemplate(template_id, fields, self.environment)
+
+        self._ensure_loaded()
+        with self.lock:
+            if template_id not in self.templates and len(self.templates) >= self.max_templates:
+                raise TemplateRegistryFullError(f"Template limit reached ({self.max_templates})")
+            self.templates[template_id] = template
+        if self.template_dir:
+            self._persist(template)
+        return template
+
+    def _persist(self, template):
+        os.makedirs(self.template_dir, exist_ok=True)
+        path = os.path.join(self.template_dir, f'{template.id}.json')
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(template.fields, f)
+        os.replace(temp_path, path)
+
+    def get(self, template_id):
+        self._ensure_loaded()
+        with self.lock:
+            return self.templates.get(template_id)
+
+    def list(self):
+        self._ensure_loaded()
+        with self.lock:
+            return list(self.templates.values())
+
+    def delete(self, template_id):
+        """
+        Remove a template
+
+        Returns:
+            DocumentTemplate|None: The removed template, or None if it was not registered
+        """
+        self._ensure_loaded()
+        with self.lock:
+            template = self.templates.pop(template_id, None)
+        if template is not None and self.template_dir:
+            try:
+                os.remove(os.path.join(self.template_dir, f'{template_id}.json'))
+            except FileNotFoundError:
+                pass
+        return template
+
+    def expand(self, request_data):
+        """
+        Turn a template + data request into a plain generate request
+
+        The template's rendered fields fill in whatever the request does not set
+        itself, so a request may still override e.g. the watermark. Other request
+        fields (priority, callback_url...) are kept.
+
+        Args:
+            request_data (dict): Request with template_id and an optional data object
+
+        Returns:
+            dict: The request with content_html and the other template fields filled in
+
+        Raises:
+            TemplateError: If the template is unknown, the data is invalid or rendering fails
+            TemplateTooLargeError: If a rendered field exceeds its request size limit
+        """
+        template_id = request_data.get('template_id')
+        if not isinstance(template_id, str):
+            raise TemplateError("Field template_id must be a string")
+        if 'content_html' in request_data:
+            raise TemplateError("Send either content_html or template_id, not both")
+        data = request_data.get('data')
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            raise TemplateError("Field data must be an object")
+
+        template = self.get(template_id)
+        if template is None:
+            raise TemplateError(f"Unknown template_id: {template_id}")
+
+        with stage_timer('template_render'):
+            document = template.render(data)
+        expanded = {key: value for key, value in request_data.items() if key not in ('template_id', 'data')}
+        for name, value in document.items():
+            expanded.setdefault(name, value)
+        return expanded
+
+    def stats(self):
+        """
+        Current registry state for diagnostics
+        """
+        with self.lock:
+            return {'templates': len(self.templates)}
+
+
+# Singleton instance
+template_registry = TemplateRegistry()
+
+metrics.gauge('docgen_templates_registered', 'Document templates in the template registry',
+              lambda: template_registry.stats()['templates'])
@@ -1,69 +1,322 @@
 import os
+import heapq
+import shutil
+import logging
 import tempfile
 import threading
 import time
 import atexit
+import itertools
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cleanup tuning, overridable through the environment
+CLEANUP_DELAY = float(os.environ.get('DOCGEN_CLEANUP_DELAY', 10))
+CLEANUP_RETRY_DELAY = float(os.environ.get('DOCGEN_CLEANUP_RETRY_DELAY', 5))
+CLEANUP_MAX_PENDING_MB = float(os.environ.get('DOCGEN_CLEANUP_MAX_PENDING_MB', 1024))
+SCRATCH_ROOT = os.environ.get('DOCGEN_SCRATCH_ROOT', os.path.join(tempfile.gettempdir(), 'docgen-scratch'))
+
+
+def _disk_usage(path):
+    """
+    Bytes used by a file, or by everything under a directory
+    """
+    try:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    except OSError:
+        return 0
+
+
+class _Entry:
+    __slots__ = ('path', 'deadline', 'size', 'cancelled', 'evictable')
+
+    def __init__(self, path, deadline, size, evictable=True):
+        self.path = path
+        self.deadline = deadline
+        self.size = size
+        self.cancelled = False
+        self.evictable = evictable
+
 
 class FileCleanupManager:
-    def __init__(self):
-        self.files_to_cleanup = []
+    """
+    Deletes temporary files and directories at their deadline
+
+    Entries sit in a heap ordered by deadline, so scheduling is O(log n) and
+    cancellation is O(1) (cancelled entries are skipped when they surface). A
+    single thread sleeps until the earliest deadline instead of polling. The
+    bytes waiting for deletion are capped: each time the cap is crossed an alarm
+    is logged, and evictable entries closest to their deadline are deleted early.
+    Scratch directories count towards the cap as they fill up (see remeasure),
+    but are never deleted early: a request is still working in them, and they
+    are deleted as soon as their ScratchSpace closes. While only scratch
+    directories are pending, which is the service's normal state, the cap is an
+    alarm and deletes nothing.
+    """
+
+    def __init__(self, delay=CLEANUP_DELAY, retry_delay=CLEANUP_RETRY_DELAY,
+                 max_pending_bytes=CLEANUP_MAX_PENDING_MB * 1024 * 1024, scratch_root=SCRATCH_ROOT):
+        self.delay = delay
+        self.retry_delay = retry_delay
+        self.max_pending_bytes = max_pending_bytes
+        self.scratch_root = scratch_root
+        self.heap = []
+        self.entries = {}  # path -> pending entry
+        self.sequence = itertools.count()
+        self.pending_bytes = 0
+        self.evictable_count = 0  # Pending entries the cap may delete early
+        self.over_cap = False
+        self.deleted = 0
+        self.failed = 0
+        self.alarms = 0
         self.cleanup_lock = threading.Lock()
-        # Start a background thread to clean up files
-        self.cleanup_thread = threading.Thread(target=self._cleanup_thread, daemon=True)
-        self.cleanup_thread.start()
+        self.wakeup = threading.Condition(self.cleanup_lock)
+        self.cleanup_thread = None
         # Register cleanup on exit
         atexit.register(self.cleanup_all)
-    
-    def mark_for_cleanup(self, filepath):
+
+    def _start(self):
         """
-        Mark a file for deferred cleanup
+        Start the cleanup thread on first use (lock must be held)
         """
-        if filepath and os.path.exists(filepath):
-            with self.cleanup_lock:
-                self.files_to_cleanup.append((filepath, time.time()))
-    
+        if self.cleanup_thread is None:
+            self.cleanup_thread = threading.Thread(target=self._cleanup_thread, name='file-cleanup', daemon=True)
+            self.cleanup_thread.start()
+
+    def mark_for_cleanup(self, filepath, delay=None, evictable=True):
+        """
+        Mark a file or directory for deferred cleanup
+
+        Marking a path again moves its deadline.
+
+        Args:
+            filepath (str): File or directory to delete
+            delay (float, optional): Seconds until deletion (default: DOCGEN_CLEANUP_DELAY)
+            evictable (bool): Whether the disk cap may delete the path before its deadline
+
+        Returns:
+            str|None: The path, usable with cancel(), or None if it does not exist
+        """
+        if not filepath or not os.path.exists(filepath):
+            return None
+        size = _disk_usage(filepath)
+        deadline = time.time() + (self.delay if delay is None else delay)
+        overflow = []
+        with self.cleanup_lock:
+            self._discard(filepath)
+            entry = _Entry(filepath, deadline, size, evictable)
+            self.entries[filepath] = entry
+            self.pending_bytes += size
+            self.evictable_count += evictable
+            heapq.heappush(self.heap, (deadline, next(self.sequence), entry))
+            overflow = self._check_cap()
+            self._start()
+            self.wakeup.notify()
+        for entry in overflow:
+            self._delete(entry)
+        return filepath
+
+    def cancel(self, filepath):
+        """
+        Keep a path that was marked for cleanup
+
+        Returns:
+            bool: Whether the path was pending
+        """
+        with self.cleanup_lock:
+            return self._discard(filepath)
+
+    def remeasure(self, filepath):
+        """
+        Update the disk usage of a pending path that has grown or shrunk (e.g. a
+        scratch directory after a render), and apply the cap
+        """
+        size = _disk_usage(filepath)
+        overflow = []
+        with self.cleanup_lock:
+            entry = self.entries.get(filepath)
+            if entry is None:
+                return
+            self.pending_bytes += size - entry.size
+            entry.size = size
+            overflow = self._check_cap()
+        for entry in overflow:
+            self._delete(entry)
+
+    def delete_now(self, filepath):
+        """
+        Delete a path immediately, dropping any pending cleanup for it
+        """
+        with self.cleanup_lock:
+            self._discard(filepath)
+        self._delete(_Entry(filepath, 0, 0))
+
+    def scratch_dir(self, delay=None, root=None):
+        """
+        Create a private working directory, marked for cleanup as a whole
+
+        The directory and everything written into it are removed with a single
+        rmtree at the deadline, or earlier through delete_now().
+
+        Args:
+            delay (float, optional): Seconds until deletion (default: DOCGEN_CLEANUP_DELAY)
+            root (str, optional): Parent directory (default: DOCGEN_SCRATCH_ROOT)
+
+        Returns:
+            str: Path of the new directory
+        """
+        root = root or self.scratch_root
+        os.makedirs(root, exist_ok=True)
+        path = tempfile.mkdtemp(prefix='req-', dir=root)
+        self.mark_for_cleanup(path, delay, evictable=False)
+        return path
+
+    def _discard(self, filepath):
+        """
+        Cancel the pending entry for a path, if any (lock must be held)
+        """
+        entry = self.entries.pop(filepath, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        self.pending_bytes -= entry.size
+        self.evictable_count -= entry.evictable
+        # Rebuild the heap once cancelled entries make up most of it
+        if len(self.heap) > 64 and len(self.heap) > 2 * len(self.entries):
+            self.heap = [item for item in self.heap if not item[2].cancelled]
+            heapq.heapify(self.heap)
+        return True
+
+    def _check_cap(self):
+        """
+        Raise the alarm when the pending bytes cross the cap, and take the
+        entries to delete early (lock must be held)
+
+        Returns:
+            list: Evicted entries, to delete once the lock is released
+        """
+        if self.pending_bytes <= self.max_pending_bytes:
+            self.over_cap = False
+            return []
+        if not self.over_cap:
+            # Once per crossing; the flag resets when a later check finds the bytes under the cap
+            self.over_cap = True
+            self.alarms += 1
+            logger.warning("Temporary files pending cleanup use %d bytes, over the %d byte cap",
+                           self.pending_bytes, self.max_pending_bytes)
+        if not self.evictable_count:
+            return []
+        return self._evict_overflow()
+
+    def _evict_overflow(self):
+        """
+        Take evictable entries, earliest deadline first, until the pending
+        bytes fit under the cap again (lock must be held)
+        """
+        evicted = []
+        for _, _, entry in sorted(self.heap):
+            if self.pending_bytes <= self.max_pending_bytes:
+                break
+            if entry.evictable and not entry.cancelled:
+                self._discard(entry.path)
+                evicted.append(entry)
+        return evicted
+
     def _cleanup_thread(self):
         """
-        Background thread that periodically cleans up files
+        Background thread that deletes entries as their deadlines pass
         """
         while True:
-            time.sleep(5)  # Check every 5 seconds
-            self._attempt_cleanup()
-    
-    def _attempt_cleanup(self):
+            with self.cleanup_lock:
+                due = self._pop_due()
+                while not due:
+                    timeout = self.heap[0][0] - time.time() if self.heap else None
+                    self.wakeup.wait(timeout)
+                    due = self._pop_due()
+            for entry in due:
+                if not self._delete(entry):
+                    # File still in use, try again later
+                    self.mark_for_cleanup(entry.path, self.retry_delay)
+
+    def _pop_due(self):
+        """
+        Remove and return entries whose deadline has passed (lock must be held)
+        """
+        now = time.time()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, _, entry = heapq.heappop(self.heap)
+            if not entry.cancelled:
+                self._discard(entry.path)
+                due.append(entry)
+        return due
+
+    def _delete(self, entry):
+        """
+        Delete an entry's file or directory tree
+
+        Returns:
+            bool: False if the path still exists because it could not be removed
         """
-        Try to clean up files marked for deletion
+        try:
+            if os.path.isdir(entry.path):
+                shutil.rmtree(entry.path)
+            elif os.path.exists(entry.path):
+                os.unlink(entry.path)
+        except (PermissionError, OSError):
+            with self.cleanup_lock:
+                self.failed += 1
+            return not os.path.exists(entry.path)
+        with self.cleanup_lock:
+            self.deleted += 1
+        return True
+
+    def stats(self):
+        """
+        Gauges and counters for monitoring
         """
         with self.cleanup_lock:
-            current_time = time.time()
-            remaining_files = []
-            
-            for filepath, timestamp in self.files_to_cleanup:
-                # Only try to delete files older than 10 seconds
-                if current_time - timestamp > 10:
-                    try:
-                        if os.path.exists(filepath):
-                            os.unlink(filepath)
-                    except (PermissionError, OSError):
-                        # File still in use, keep it in the list
-                        remaining_files.append((filepath, timestamp))
-                else:
-                    # File not old enough yet
-                    remaining_files.append((filepath, timestamp))
-            
-            self.files_to_cleanup = remaining_files
-    
+            return {
+                'pending_files': len(self.entries),
+                'pending_bytes': self.pending_bytes,
+                'deleted': self.deleted,
+                'failed': self.failed,
+                'alarms': self.alarms
+            }
+
     def cleanup_all(self):
         """
         Final cleanup attempt when the application exits
         """
         with self.cleanup_lock:
-            for filepath, _ in self.files_to_cleanup:
-                try:
-                    if os.path.exists(filepath):
-                        os.unlink(filepath)
-                except:
-                    pass
+            entries = list(self.entries.values())
+            for entry in entries:
+                self._discard(entry.path)
+            self.heap = []
+        for entry in entries:
+            try:
+                self._delete(entry)
+            except Exception:
+                pass
 
 # Singleton instance
-file_cleanup = FileCleanupManager()
\ No newline at end of file
+file_cleanup = FileCleanupManager()
+
+metrics.gauge('docgen_cleanup_pending_files', 'Temporary files and directories waiting for deletion',
+              lambda: file_cleanup.stats()['pending_files'])
+metrics.gauge('docgen_cleanup_pending_bytes', 'Disk space used by paths waiting for deletion',
+              lambda: file_cleanup.stats()['pending_bytes'])
+metrics.gauge('docgen_cleanup_deleted_total', 'Temporary paths deleted',
+              lambda: file_cleanup.stats()['deleted'], kind='counter')
+metrics.gauge('docgen_cleanup_alarms_total', 'Times the pending cleanup disk cap was crossed',
+              lambda: file_cleanup.stats()['alarms'], kind='counter')
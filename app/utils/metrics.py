@@ -0,0 +1,181 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Default buckets for durations in seconds and for sizes in bytes
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by label values
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        return [(self.name, _labels(self.label_names, key), value) for key, value in items]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, optionally split by label values
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(state)) for key, state in self.values.items()]
+        samples = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                samples.append((f'{self.name}_bucket',
+                                _labels(self.label_names, key, f'le="{_number(float(bound))}"'), cumulative))
+            samples.append((f'{self.name}_bucket', _labels(self.label_names, key, 'le="+Inf"'), state[-1]))
+            samples.append((f'{self.name}_sum', _labels(self.label_names, key), state[-2]))
+            samples.append((f'{self.name}_count', _labels(self.label_names, key), state[-1]))
+        return samples
+
+
+class Gauge:
+    """
+    Value read from a callback at scrape time
+
+    The callback returns a number, or a dict mapping label value tuples to numbers.
+    """
+
+    def __init__(self, name, help, callback, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.label_names = tuple(labels)
+        self.kind = kind
+
+    def samples(self):
+        value = self.callback()
+        if isinstance(value, dict):
+            return [(self.name, _labels(self.label_names, key), v) for key, v in value.items()]
+        return [(self.name, '', value)]
+
+
+class MetricsRegistry:
+    """
+    Holds the process metrics and renders them in the Prometheus text format
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, callback, labels=(), kind='gauge'):
+        """
+        Register a metric read from a callback (kind='counter' for running totals kept elsewhere)
+        """
+        return self._register(Gauge(name, help, callback, labels, kind))
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format
+
+        Returns:
+            str: The exposition text
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A failing callback must not break the whole scrape
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in samples:
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Singleton instance
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram('docgen_stage_seconds', 'Time spent in each generation stage', ['stage'])
+
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Record how long a block takes under docgen_stage_seconds{stage=...}
+
+        with stage_timer('pdf_render'):
+            renderer_pool.render(...)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage)
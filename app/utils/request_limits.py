@@ -0,0 +1,325 @@
+import os
+import re
+import zlib
+import json
+from io import BytesIO
+from app.utils.metrics import metrics
+
+# Byte limits, overridable through the environment. Limits apply to the decoded body,
+# so a compressed request cannot expand past them.
+MAX_REQUEST_BYTES = int(float(os.environ.get('DOCGEN_MAX_REQUEST_MB', 64)) * 1024 * 1024)
+MAX_CONTENT_HTML_BYTES = int(float(os.environ.get('DOCGEN_MAX_CONTENT_HTML_MB', 32)) * 1024 * 1024)
+MAX_FRAGMENT_BYTES = int(float(os.environ.get('DOCGEN_MAX_FRAGMENT_KB', 512)) * 1024)
+
+# Per-field limits for JSON string values, by the name of the member holding them. They
+# apply to members of the top-level object and of the objects in its BATCH_MEMBER array;
+# the same names nested deeper (e.g. inside template data) and strings under any other
+# name are only bounded by MAX_REQUEST_BYTES.
+FIELD_LIMITS = {
+    'content_html': MAX_CONTENT_HTML_BYTES,
+    'header_html': MAX_FRAGMENT_BYTES,
+    'footer_html': MAX_FRAGMENT_BYTES,
+    'watermark': MAX_FRAGMENT_BYTES
+}
+
+# Top-level member holding the array of batch items whose members get field limits too
+BATCH_MEMBER = 'documents'
+
+# Size of the reads from the request stream, and of each decompressed piece
+READ_CHUNK_SIZE = 64 * 1024
+
+# Request methods whose bodies are read and checked
+BODY_METHODS = ('POST', 'PUT', 'PATCH')
+
+REJECTED = metrics.counter('docgen_request_limit_rejections_total',
+                           'Requests rejected by the request size limits', ['reason'])
+
+# Run of string content up to the closing quote; escape pairs are consumed whole
+_STRING_BODY_RE = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_STRUCTURE_RE = re.compile(rb'["{}\[\]:,]')
+
+# Longest member name tracked; longer names cannot match a field limit anyway
+_MAX_KEY_BYTES = 64
+
+
+class RequestTooLargeError(Exception):
+    """Raised when a request body or one of its fields exceeds its size limit"""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+class JsonLimitScanner:
+    """
+    Incremental JSON tokenizer that enforces per-field string limits as bytes arrive
+
+    Only the structure is tracked: container nesting, the path of member names
+    down to the current value, and the length of the string being read. Field
+    limits apply by member name to the top-level object and to the items of its
+    BATCH_MEMBER array, never to deeper members of the same name. Values are not
+    built; the complete body is parsed with the json module once it has passed.
+    Malformed JSON is left for that parse to reject.
+
+        scanner = JsonLimitScanner(FIELD_LIMITS)
+        for chunk in chunks:
+            scanner.feed(chunk)
+    """
+
+    def __init__(self, field_limits, default_limit=None):
+        self.field_limits = field_limits
+        self.default_limit = default_limit
+        self.containers = []  # b'{' or b'[' per nesting level
+        self.path = []  # Current member name per nesting level (None for arrays)
+        self.expect_key = False
+        self.in_string = False
+        self.escape = False
+        self.string_is_key = False
+        self.string_size = 0
+        self.string_limit = None
+        self.key_parts = []
+
+    def feed(self, data):
+        """
+        Scan the next piece of the body
+
+        Raises:
+            RequestTooLargeError: A string value is over its field limit
+        """
+        pos = 0
+        end = len(data)
+        while pos < end:
+            if self.in_string:
+                if self.escape:
+                    # The escaped character (or the first of \uXXXX) may start a new chunk
+                    self.escape = False
+                    self._string_bytes(data, pos, pos + 1)
+                    pos += 1
+                    continue
+                stop = _STRING_BODY_RE.match(data, pos).end()
+                self._string_bytes(data, pos, stop)
+                if stop == end:
+                    return
+                if data[stop] == 0x5c:  # Backslash ending the chunk
+                    self.escape = True
+                    self._string_bytes(data, stop, stop + 1)
+                else:
+                    self._end_string()
+                pos = stop + 1
+            else:
+                match = _STRUCTURE_RE.search(data, pos)
+                if match is None:
+                    return
+                token = data[match.start():match.start() + 1]
+                pos = match.start() + 1
+                if token == b'"':
+                    self._start_string()
+                elif token == b'{':
+                    self.containers.append(token)
+                    self.path.append(None)
+                    self.expect_key = True
+                elif token == b'[':
+                    self.containers.append(token)
+                    self.path.append(None)
+                elif token in (b'}', b']'):
+                    if self.containers:
+                        self.containers.pop()
+                        self.path.pop()
+                    self.expect_key = False
+                elif token == b':':
+                    self.expect_key = False
+                else:  # comma
+                    self.expect_key = bool(self.containers) and self.containers[-1] == b'{'
+
+    def _start_string(self):
+        self.in_string = True
+        self.string_size = 0
+        self.string_is_key = self.expect_key and bool(self.containers) and self.containers[-1] == b'{'
+        if self.string_is_key:
+            self.key_parts = []
+            self.string_limit = None
+        else:
+            self.string_limit = self.field_limits.get(self._field_name(), self.default_limit)
+
+    def _field_name(self):
+        """
+        Name of the member holding the current value, when field limits apply to it
+        """
+        if self.containers == [b'{']:
+            return self.path[0]
+        if self.containers == [b'{', b'[', b'{'] and self.path[0] == BATCH_MEMBER:
+            return self.path[2]
+        return None
+
+    def _string_bytes(self, data, start, stop):
+        self.string_size += stop - start
+        if self.string_is_key:
+            if self.string_size <= _MAX_KEY_BYTES:
+                self.key_parts.append(data[start:stop])
+        elif self.string_limit is not None and self.string_size > self.string_limit:
+            name = self._field_name()
+            label = f"Field {name}" if name else "A string value"
+            raise RequestTooLargeError(f"{label} exceeds the limit of {self.string_limit} bytes", 'field')
+
+    def _end_string(self):
+        self.in_string = False
+        if self.string_is_key:
+            self.path[-1] = _member_name(b''.join(self.key_parts))
+            self.key_parts = []
+
+
+def _member_name(raw):
+    """
+    Member name from the raw bytes of a JSON key, with escapes resolved the way
+    the JSON parse will resolve them
+    """
+    if b'\\' in raw:
+        try:
+            return json.loads(b'"' + raw + b'"')
+        except ValueError:
+            pass  # Malformed or cut off at _MAX_KEY_BYTES; cannot match a field limit as is
+    return raw.decode('utf-8', 'replace')
+
+
+class UnsupportedEncodingError(ValueError):
+    """Raised for a Content-Encoding the service cannot decode"""
+
+
+def _decoder(encoding):
+    """
+    Decompressor for a Content-Encoding, or None for identity
+    """
+    if encoding in ('', 'identity'):
+        return None
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return zlib.decompressobj(zlib.MAX_WBITS)
+    raise UnsupportedEncodingError(f"Unsupported Content-Encoding: {encoding}")
+
+
+def _raw_chunks(stream, length):
+    """
+    Read a request stream in pieces, up to length bytes (to EOF when length is None)
+    """
+    remaining = length
+    while remaining is None or remaining > 0:
+        size = READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining)
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+
+def _decoded_chunks(chunks, decoder):
+    """
+    Decompress a body in bounded pieces, so a small compressed body cannot
+    expand in memory before the size limit sees it
+    """
+    if decoder is None:
+        yield from chunks
+        return
+    for chunk in chunks:
+        yield decoder.decompress(chunk, READ_CHUNK_SIZE)
+        while decoder.unconsumed_tail:
+            yield decoder.decompress(decoder.unconsumed_tail, READ_CHUNK_SIZE)
+    yield decoder.flush()
+    if not decoder.eof:
+        raise ValueError("Compressed request body is truncated")
+
+
+def read_limited_body(stream, length, encoding='', is_json=False,
+                      max_bytes=MAX_REQUEST_BYTES, field_limits=FIELD_LIMITS):
+    """
+    Read and decode a request body, enforcing the size limits while it streams in
+
+    Args:
+        stream: The WSGI input stream
+        length (int|None): Content-Length, or None to read to EOF
+        encoding (str): Content-Encoding of the body ("gzip", "deflate" or identity)
+        is_json (bool): Scan the body as JSON and apply the per-field limits
+        max_bytes (int): Limit on the decoded body
+        field_limits (dict): Per-field limits for JSON string values
+
+    Returns:
+        bytes: The decoded body
+
+    Raises:
+        RequestTooLargeError: The body or a field is over its limit
+        UnsupportedEncodingError: The Content-Encoding is not supported
+        ValueError: Corrupt or truncated compressed data
+    """
+    decoder = _decoder(encoding)
+    scanner = JsonLimitScanner(field_limits) if is_json else None
+    body = BytesIO()
+    try:
+        for chunk in _decoded_chunks(_raw_chunks(stream, length), decoder):
+            if body.tell() + len(chunk) > max_bytes:
+                raise RequestTooLargeError(f"Request body exceeds the limit of {max_bytes} bytes", 'body')
+            if scanner is not None:
+                scanner.feed(chunk)
+            body.write(chunk)
+    except zlib.error as e:
+        raise ValueError(f"Request body is not valid {encoding} data: {e}")
+    return body.getvalue()
+
+
+def _error_response(start_response, status, message):
+    body = json.dumps({"error": message}).encode('utf-8')
+    start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body))),
+                            ('Connection', 'close')])
+    return [body]
+
+
+class RequestLimitMiddleware:
+    """
+    WSGI middleware that reads request bodies under the size limits before the app sees them
+
+    Oversized bodies are answered with 413 as soon as the limit is crossed:
+    immediately when Content-Length is too large, otherwise while streaming,
+    before the app parses anything. gzip and deflate bodies are decompressed on
+    the way in, and the app receives the decoded body.
+    """
+
+    def __init__(self, app, max_bytes=MAX_REQUEST_BYTES, field_limits=FIELD_LIMITS):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.field_limits = field_limits
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') not in BODY_METHODS:
+            return self.app(environ, start_response)
+
+        try:
+            length = int(environ['CONTENT_LENGTH']) if environ.get('CONTENT_LENGTH') else None
+        except ValueError:
+            return _error_response(start_response, '400 Bad Request', "Invalid Content-Length header")
+        if length is None and not environ.get('wsgi.input_terminated'):
+            # No length and no chunked framing: there is no body to read
+            return self.app(environ, start_response)
+
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if length is not None and length > self.max_bytes:
+            REJECTED.inc('content_length')
+            return _error_response(start_response, '413 Request Entity Too Large',
+                                   f"Request body exceeds the limit of {self.max_bytes} bytes")
+
+        is_json = 'json' in environ.get('CONTENT_TYPE', '').lower()
+        try:
+            body = read_limited_body(environ['wsgi.input'], length, encoding, is_json,
+                                     self.max_bytes, self.field_limits)
+        except RequestTooLargeError as e:
+            REJECTED.inc(e.reason)
+            return _error_response(start_response, '413 Request Entity Too Large', str(e))
+        except UnsupportedEncodingError as e:
+            return _error_response(start_response, '415 Unsupported Media Type', str(e))
+        except ValueError as e:
+            return _error_response(start_response, '400 Bad Request', str(e))
+
+        environ['wsgi.input'] = BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ.pop('HTTP_CONTENT_ENCODING', None)
+        environ.pop('wsgi.input_terminated', None)
+        return self.app(environ, start_response)
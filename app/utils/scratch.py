@@ -0,0 +1,123 @@
+import os
+import mmap
+import shutil
+import threading
+from app.utils.file_cleanup import file_cleanup, SCRATCH_ROOT
+
+# Put scratch directories on a memory-backed filesystem when one is available
+SCRATCH_TMPFS = os.environ.get('DOCGEN_SCRATCH_TMPFS', '').lower() in ('1', 'true', 'yes')
+TMPFS_ROOTS = ['/dev/shm']
+
+# Safety net: scratch directories outliving their request are removed after this many seconds
+SCRATCH_MAX_AGE = float(os.environ.get('DOCGEN_SCRATCH_MAX_AGE', 600))
+
+_scratch_root = None
+_scratch_root_lock = threading.Lock()
+
+
+def scratch_root():
+    """
+    Directory holding the per-request scratch directories
+
+    DOCGEN_SCRATCH_ROOT wins when set explicitly; otherwise, with
+    DOCGEN_SCRATCH_TMPFS enabled, the first writable tmpfs mount is used, and the
+    system temp directory is the fallback.
+    """
+    global _scratch_root
+    if _scratch_root is None:
+        with _scratch_root_lock:
+            if _scratch_root is None:
+                root = SCRATCH_ROOT
+                if SCRATCH_TMPFS and 'DOCGEN_SCRATCH_ROOT' not in os.environ:
+                    for candidate in TMPFS_ROOTS:
+                        if os.path.isdir(candidate) and os.access(candidate, os.W_OK):
+                            root = os.path.join(candidate, 'docgen-scratch')
+                            break
+                os.makedirs(root, exist_ok=True)
+                _scratch_root = root
+    return _scratch_root
+
+
+class ScratchSpace:
+    """
+    A private working directory for one request
+
+    Render stages create their files here and hand them on by path; the whole
+    directory is removed with one rmtree when the space is closed (or by the
+    cleanup manager after DOCGEN_SCRATCH_MAX_AGE if it never is).
+
+        with ScratchSpace() as scratch:
+            html_path = scratch.write_text('main.html', html)
+            pdf_path = scratch.path('main.pdf')
+    """
+
+    def __init__(self):
+        self.root = file_cleanup.scratch_dir(SCRATCH_MAX_AGE, root=scratch_root())
+
+    def path(self, name):
+        """
+        Path of a file in the scratch directory (the file is not created)
+        """
+        return os.path.join(self.root, name)
+
+    def write_text(self, name, text):
+        """
+        Write a UTF-8 text file into the scratch directory
+
+        Returns:
+            str: Path of the file
+        """
+        path = self.path(name)
+        # O_EXCL: never follow or reuse a file someone else placed there
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.measure()
+        return path
+
+    def measure(self):
+        """
+        Report the directory's current disk usage to the cleanup manager's cap
+
+        Call after a stage (e.g. a render) has written files into the directory.
+        """
+        file_cleanup.remeasure(self.root)
+
+    def close(self):
+        file_cleanup.delete_now(self.root)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def map_file(path):
+    """
+    Memory-map a finished file read-only, so readers use the page cache (or the
+    tmpfs pages themselves) instead of a private copy
+
+    Returns:
+        mmap.mmap: The mapping; close it when done
+    """
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def hand_off(path, output_path):
+    """
+    Deliver a finished scratch file to its destination
+
+    Paths are moved into place (a rename on the same filesystem); streams get
+    the file copied in.
+
+    Args:
+        path (str): Finished file in a scratch directory
+        output_path (str|file): Destination path or writable binary file object
+    """
+    if isinstance(output_path, str):
+        shutil.move(path, output_path)
+    else:
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, output_path)
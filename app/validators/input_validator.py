@@ -1,22 +1,38 @@
-def validate_document_request(data):
+from app.services.docx_templates import has_base_template
+from app.services.template_registry import TEMPLATE_ID_RE
+
+def validate_document_request(data, allow_formats=False):
     """
     Validates the document generation request data
     
     Args:
         data (dict): The request data
+        allow_formats (bool): Accept a formats list in place of document_type
         
     Returns:
         bool|str: True if valid, error message if invalid
     """
+    if not isinstance(data, dict):
+        return "Request body must be a JSON object"
+    
     # Check if required fields are present
-    required_fields = ['content_html', 'document_type']
+    required_fields = ['content_html']
+    if not (allow_formats and 'formats' in data):
+        required_fields.append('document_type')
     for field in required_fields:
         if field not in data:
             return f"Missing required field: {field}"
     
-    # Validate document type
+    # Validate document type (formats takes precedence over it)
     valid_doc_types = ['pdf', 'docx']
-    if data['document_type'].lower() not in valid_doc_types:
+    if allow_formats and 'formats' in data:
+        formats = data['formats']
+        if not isinstance(formats, list) or not formats:
+            return "Field formats must be a non-empty list"
+        for document_type in formats:
+            if not isinstance(document_type, str) or document_type.lower() not in valid_doc_types:
+                return f"Invalid format: {document_type}. Must be one of {valid_doc_types}"
+    elif not isinstance(data['document_type'], str) or data['document_type'].lower() not in valid_doc_types:
         return f"Invalid document_type: {data['document_type']}. Must be one of {valid_doc_types}"
     
     # Ensure HTML content fields are strings
@@ -30,4 +46,101 @@ def validate_document_request(data):
         if not isinstance(data['watermark'], str):
             return "Watermark must be a string"
     
-    return True
\ No newline at end of file
+    # Validate DOCX base template if present
+    if data.get('docx_template') is not None:
+        if not isinstance(data['docx_template'], str):
+            return "Field docx_template must be a string"
+        if not has_base_template(data['docx_template']):
+            return f"Unknown docx_template: {data['docx_template']}"
+    
+    return True
+
+def validate_batch_request(data, max_documents):
+    """
+    Validates the envelope of a batch generation request
+    
+    Individual documents are validated separately with validate_document_request
+    so that one bad item does not fail the whole batch.
+    
+    Args:
+        data (dict): The request data
+        max_documents (int): Maximum number of documents in one batch
+        
+    Returns:
+        bool|str: True if valid, error message if invalid
+    """
+    if not isinstance(data, dict) or 'documents' not in data:
+        return "Missing required field: documents"
+    
+    documents = data['documents']
+    if not isinstance(documents, list) or not documents:
+        return "Field documents must be a non-empty list"
+    
+    if len(documents) > max_documents:
+        return f"Too many documents: {len(documents)}. Maximum is {max_documents}"
+    
+    return True
+
+def validate_job_request(data):
+    """
+    Validates an asynchronous job request
+    
+    Args:
+        data (dict): The request data
+        
+    Returns:
+        bool|str: True if valid, error message if invalid
+    """
+    validation_result = validate_document_request(data)
+    if validation_result is not True:
+        return validation_result
+    
+    priority = data.get('priority', 0)
+    if not isinstance(priority, int) or isinstance(priority, bool):
+        return "Field priority must be an integer"
+    
+    callback_url = data.get('callback_url')
+    if callback_url is not None:
+        if not isinstance(callback_url, str) or not callback_url.startswith(('http://', 'https://')):
+            return "Field callback_url must be an http(s) URL"
+    
+    return True
+
+def validate_template_request(data):
+    """
+    Validates a template registration request
+    
+    Args:
+        data (dict): The request data
+        
+    Returns:
+        bool|str: True if valid, error message if invalid
+    """
+    if not isinstance(data, dict):
+        return "Request body must be a JSON object"
+    
+    if 'content_html' not in data:
+        return "Missing required field: content_html"
+    
+    template_id = data.get('template_id')
+    if template_id is not None:
+        if not isinstance(template_id, str) or not TEMPLATE_ID_RE.match(template_id):
+            return "Field template_id must be 1-64 letters, digits, '.', '_' or '-'"
+    
+    # Template fields are strings (HTML fields may contain Jinja2 syntax)
+    for field in ['content_html', 'header_html', 'footer_html', 'watermark']:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"Field {field} must be a string"
+    
+    valid_doc_types = ['pdf', 'docx']
+    if data.get('document_type') is not None:
+        if not isinstance(data['document_type'], str) or data['document_type'].lower() not in valid_doc_types:
+            return f"Invalid document_type: {data['document_type']}. Must be one of {valid_doc_types}"
+    
+    if data.get('docx_template') is not None:
+        if not isinstance(data['docx_template'], str):
+            return "Field docx_template must be a string"
+        if not has_base_template(data['docx_template']):
+            return f"Unknown docx_template: {data['docx_template']}"
+    
+    return True
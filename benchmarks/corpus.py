@@ -0,0 +1,90 @@
+"""
+Synthetic documents used by the benchmark harness
+
+Every case is generated from fixed text so runs are reproducible and need no
+network or fixture files.
+"""
+
+LOREM = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud "
+         "exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat.")
+
+PAGE_BREAK = '<p style="page-break-before: always"></p>'
+
+
+def letter():
+    """
+    A one-page letter
+    """
+    return {
+        'content_html': (
+            '<h1>Account Statement</h1>'
+            '<p>Dear Customer,</p>'
+            + ''.join(f'<p>{LOREM}</p>' for _ in range(4)) +
+            '<p>Kind regards,</p><p>The Accounts Team</p>'
+        ),
+        'header_html': '<div>ACME Corporation</div>',
+        'footer_html': '',
+        'watermark': None
+    }
+
+
+def report(pages=50):
+    """
+    A long report with headings, lists, a small table per section and explicit page breaks
+    """
+    sections = []
+    for page in range(pages):
+        sections.append(
+            (PAGE_BREAK if page else '') +
+            f'<h2>Section {page + 1}</h2>' +
+            ''.join(f'<p>{LOREM}</p>' for _ in range(5)) +
+            '<ul>' + ''.join(f'<li>Finding {page + 1}.{item}</li>' for item in range(1, 6)) + '</ul>' +
+            '<table><tr><th>Metric</th><th>Value</th></tr>' +
+            ''.join(f'<tr><td>Metric {row}</td><td>{row * page}</td></tr>' for row in range(5)) +
+            '</table>'
+        )
+    return {
+        'content_html': '<h1>Annual Report</h1>' + ''.join(sections),
+        'header_html': '<div>Annual Report - Confidential</div>',
+        'footer_html': '<div>End of report</div>',
+        'watermark': None
+    }
+
+
+def large_table(rows=10000):
+    """
+    A single table with a header row and many data rows
+    """
+    body = ''.join(
+        f'<tr><td>{row}</td><td>Item {row}</td><td>{row * 3 % 997}.00</td><td>In stock</td></tr>'
+        for row in range(rows)
+    )
+    return {
+        'content_html': (
+            '<h1>Inventory</h1><table>'
+            '<tr><th>#</th><th>Item</th><th>Price</th><th>Status</th></tr>' + body + '</table>'
+        ),
+        'header_html': '',
+        'footer_html': '',
+        'watermark': None
+    }
+
+
+def decorated(pages=10):
+    """
+    A multi-page document with a header, watermark and last-page footer
+    """
+    doc = report(pages)
+    doc['header_html'] = '<div><b>CONTRACT</b> - Reference 2024-0042</div>'
+    doc['footer_html'] = '<div>Signed: ____________________ Date: ____________</div>'
+    doc['watermark'] = '<span>CONFIDENTIAL DRAFT</span>'
+    return doc
+
+
+CASES = {
+    'letter': letter,
+    'report_50': report,
+    'table_10k': large_table,
+    'decorated': decorated
+}
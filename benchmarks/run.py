@@ -0,0 +1,291 @@
+"""
+Benchmark harness for the document generation service
+
+Runs the synthetic corpus through the API (Flask test client) and/or the
+render_pdf/generate_docx services directly, and reports throughput,
+latency percentiles, peak RSS and peak scratch disk usage. Results can be
+saved as JSON and compared against a previous run:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --baseline before.json --threshold 0.15
+
+The exit status is 1 when a case regressed past the threshold. Everything
+runs offline. Without wkhtmltopdf the PDF cases are skipped, or run against
+benchmarks/stub_renderer.py with --renderer stub.
+"""
+import os
+import sys
+import json
+import math
+import stat
+import time
+import uuid
+import argparse
+import platform
+import tempfile
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import CASES
+
+FORMATS = ('pdf', 'docx')
+MODES = ('api', 'service')
+
+# Latency growth ignored by the regression check, in seconds, so tiny cases do not flap
+NOISE_FLOOR = 0.002
+
+
+def install_stub_renderer():
+    """
+    Put a wkhtmltopdf wrapper around stub_renderer.py first on PATH
+    """
+    stub_dir = tempfile.mkdtemp(prefix='docgen-bench-')
+    wrapper = os.path.join(stub_dir, 'wkhtmltopdf')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_renderer.py')
+    with open(wrapper, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+    os.chmod(wrapper, os.stat(wrapper).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ['PATH'] = stub_dir + os.pathsep + os.environ.get('PATH', '')
+
+
+def resolve_renderer(choice):
+    """
+    Decide how PDF cases run: 'real', 'stub' or 'skip'
+    """
+    from app.services.renderer_pool import find_wkhtmltopdf
+    if choice == 'auto':
+        choice = 'real' if find_wkhtmltopdf() else 'skip'
+    if choice == 'real' and not find_wkhtmltopdf():
+        raise SystemExit("wkhtmltopdf is not installed; use --renderer stub or --renderer skip")
+    if choice == 'stub':
+        install_stub_renderer()
+    return choice
+
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    import resource
+    # ru_maxrss is in KB on Linux and bytes on macOS; only a lifetime peak is available here
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _disk_usage(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ResourceSampler:
+    """
+    Samples process RSS and scratch disk usage in the background, keeping the peaks
+    """
+
+    def __init__(self, scratch_root, interval=0.02):
+        self.scratch_root = scratch_root
+        self.interval = interval
+        self.peak_rss_mb = 0
+        self.peak_disk_bytes = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        self.peak_rss_mb = max(self.peak_rss_mb, _current_rss_mb())
+        self.peak_disk_bytes = max(self.peak_disk_bytes, _disk_usage(self.scratch_root))
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self._sample()
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _make_call(app, mode, document_type, doc):
+    """
+    Build the function timing one generation for a case
+    """
+    from app.services.pdf_backends import render_pdf
+    from app.services.docx_service import generate_docx
+
+    run_id = uuid.uuid4().hex
+
+    def call(iteration):
+        # A comment unique to this run and iteration keeps the render cache out of the measurement
+        content_html = doc['content_html'] + f'<!-- {run_id} {iteration} -->'
+        start = time.perf_counter()
+        if mode == 'api':
+            payload = dict(doc, content_html=content_html, document_type=document_type)
+            payload = {key: value for key, value in payload.items() if value is not None}
+            response = app.test_client().post('/api/v1/generate', json=payload)
+            response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"generate returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        else:
+            generate = render_pdf if document_type == 'pdf' else generate_docx
+            generate(content_html, doc['header_html'], doc['footer_html'], BytesIO(), doc['watermark'])
+        return time.perf_counter() - start
+
+    return call
+
+
+def run_case(app, scratch_root, case, document_type, mode, iterations, warmup, concurrency):
+    """
+    Time one case and summarise it
+
+    Returns:
+        dict: Throughput, latency percentiles (seconds) and resource peaks
+    """
+    call = _make_call(app, mode, document_type, CASES[case]())
+    for i in range(warmup):
+        call(-1 - i)
+
+    with ResourceSampler(scratch_root) as sampler:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = sorted(executor.map(call, range(iterations)))
+        wall = time.perf_counter() - start
+
+    return {
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'throughput': iterations / wall if wall else None,
+        'mean': sum(latencies) / len(latencies),
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'max': latencies[-1],
+        'peak_rss_mb': round(sampler.peak_rss_mb, 1),
+        'peak_temp_mb': round(sampler.peak_disk_bytes / (1024 * 1024), 2)
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Cases whose p50 or p95 latency grew by more than the threshold
+
+    Returns:
+        list: (case key, metric, baseline value, new value) tuples
+    """
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get('results', {}).get(key)
+        if not before or 'skipped' in result or 'skipped' in before:
+            continue
+        for metric in ('p50', 'p95'):
+            old, new = before.get(metric), result.get(metric)
+            if old and new and new > old * (1 + threshold) and new - old > NOISE_FLOOR:
+                regressions.append((key, metric, old, new))
+    return regressions
+
+
+def _split(value, allowed):
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = [item for item in items if item not in allowed]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown value(s): {', '.join(unknown)}")
+    return items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the document generation service')
+    parser.add_argument('--cases', type=lambda v: _split(v, CASES), default=list(CASES))
+    parser.add_argument('--formats', type=lambda v: _split(v, FORMATS), default=list(FORMATS))
+    parser.add_argument('--modes', type=lambda v: _split(v, MODES), default=list(MODES))
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--renderer', choices=['auto', 'real', 'stub', 'skip'], default='auto',
+                        help='How to run PDF cases (auto: real wkhtmltopdf if installed, otherwise skip)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Allowed relative p50/p95 latency growth over the baseline (default: 0.10)')
+    args = parser.parse_args(argv)
+
+    renderer = resolve_renderer(args.renderer)
+
+    from app.main import create_app
+    from app.utils.scratch import scratch_root
+    app = create_app()
+    root = scratch_root()
+
+    results = {}
+    for case in args.cases:
+        for document_type in args.formats:
+            for mode in args.modes:
+                key = f'{case}/{document_type}/{mode}'
+                if document_type == 'pdf' and renderer == 'skip':
+                    results[key] = {'skipped': 'wkhtmltopdf not installed'}
+                    print(f'{key:32} skipped (wkhtmltopdf not installed)')
+                    continue
+                result = run_case(app, root, case, document_type, mode,
+                                  args.iterations, args.warmup, args.concurrency)
+                results[key] = result
+                print(f"{key:32} {result['throughput']:8.2f}/s  p50 {result['p50'] * 1000:9.1f}ms  "
+                      f"p95 {result['p95'] * 1000:9.1f}ms  p99 {result['p99'] * 1000:9.1f}ms  "
+                      f"rss {result['peak_rss_mb']:7.1f}MB  temp {result['peak_temp_mb']:6.2f}MB")
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'renderer': renderer,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for key, metric, old, new in regressions:
+            print(f'REGRESSION {key} {metric}: {old * 1000:.1f}ms -> {new * 1000:.1f}ms '
+                  f'(+{(new / old - 1) * 100:.0f}%)')
+        if regressions:
+            return 1
+        print(f'No regressions beyond {args.threshold:.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Stand-in for wkhtmltopdf used when the real binary is not installed
+
+It accepts the same command lines as wkhtmltopdf (including the
+--read-args-from-stdin mode used by the renderer pool) and writes a PDF with one
+blank page per page break in the input. Timings measure the service around the
+renderer, not rendering itself.
+"""
+import re
+import sys
+import shlex
+from PyPDF2 import PdfWriter
+
+# A4 in points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+
+_PAGE_BREAK_RE = re.compile(r'page-break-(?:before|after)\s*:\s*always')
+
+
+def convert(args):
+    """
+    Write the output PDF for one wkhtmltopdf command line (input and output are the last two arguments)
+    """
+    input_path, output_path = args[-2], args[-1]
+    with open(input_path, encoding='utf-8', errors='replace') as f:
+        pages = len(_PAGE_BREAK_RE.findall(f.read())) + 1
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(PAGE_WIDTH, PAGE_HEIGHT)
+    writer.write(output_path)
+
+
+def main(argv):
+    if '--read-args-from-stdin' not in argv:
+        convert(argv)
+        return
+    for line in sys.stdin:
+        args = shlex.split(line)
+        try:
+            if args:
+                convert(args)
+        except Exception as e:
+            # No output file makes the pool report the failure
+            sys.stderr.write(f'Error: {e}\n')
+        # The renderer pool waits for "Done" after each conversion
+        sys.stderr.write('Done\n')
+        sys.stderr.flush()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
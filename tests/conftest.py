@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+# Keep the disk cache, scratch directories and job results of a test run out of the
+# service's default locations; these are read when the app modules are first imported.
+_ROOT = tempfile.mkdtemp(prefix='docgen-tests-')
+os.environ.setdefault('DOCGEN_CACHE_DIR', os.path.join(_ROOT, 'cache'))
+os.environ.setdefault('DOCGEN_SCRATCH_ROOT', os.path.join(_ROOT, 'scratch'))
+os.environ.setdefault('DOCGEN_JOB_RESULT_DIR', os.path.join(_ROOT, 'jobs'))
+
+import pytest
+
+
+@pytest.fixture
+def client():
+    from app.main import create_app
+    return create_app().test_client()
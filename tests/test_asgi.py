@@ -0,0 +1,79 @@
+import io
+import json
+import time
+import asyncio
+import threading
+import zipfile
+
+from app.asgi import AsyncDocumentServer
+from app.main import create_app
+from app.services import batch_service
+
+
+class _RenderCounter:
+    """Stand-in for generate_document that records how many renders run at once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.calls = 0
+
+    def __call__(self, content_html, header_html, footer_html, document_type, **kwargs):
+        with self.lock:
+            self.running += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(0.02)
+            return io.BytesIO(content_html.encode())
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+async def _request(server, path, payload):
+    body = json.dumps(payload).encode()
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http',
+        'method': 'POST',
+        'path': path,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    }
+    await server(scope, receive, send)
+    status = sent[0]['status']
+    return status, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def test_batch_renders_stay_under_the_render_cap(monkeypatch):
+    counter = _RenderCounter()
+    monkeypatch.setattr(batch_service, 'generate_document', counter)
+    monkeypatch.setattr(batch_service, 'BATCH_WORKERS', 1)
+    server = AsyncDocumentServer(create_app(), render_workers=2, io_workers=8, queue_timeout=30)
+
+    async def run():
+        return await asyncio.gather(*[
+            _request(server, '/api/v1/generate/batch', {'documents': [
+                {'content_html': f'<p>asgi cap {request} {item}</p>', 'document_type': 'PDF'}
+                for item in range(4)
+            ]})
+            for request in range(6)
+        ])
+
+    responses = asyncio.run(run())
+    for status, body in responses:
+        assert status == 200
+        manifest = json.loads(zipfile.ZipFile(io.BytesIO(body)).read('manifest.json'))
+        assert [entry['status'] for entry in manifest] == ['ok'] * 4
+    assert counter.calls == 24
+    assert counter.peak <= 2
+    assert server.stats() == {'inflight': 0, 'waiting': 0}
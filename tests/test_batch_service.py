@@ -0,0 +1,83 @@
+import io
+import json
+import zipfile
+import threading
+
+from app.services import batch_service
+
+
+class _Renderer:
+    """Stand-in for generate_document that counts the renders started"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = 0
+
+    def __call__(self, content_html, header_html, footer_html, document_type, **kwargs):
+        with self.lock:
+            self.started += 1
+        if 'fail' in content_html:
+            raise RuntimeError('renderer failed')
+        return io.BytesIO(content_html.encode())
+
+
+def _documents(prefix, count):
+    return [{'content_html': f'<p>{prefix} {index}</p>', 'document_type': 'PDF'} for index in range(count)]
+
+
+def test_renders_follow_the_consumer(monkeypatch):
+    renderer = _Renderer()
+    monkeypatch.setattr(batch_service, 'generate_document', renderer)
+    monkeypatch.setattr(batch_service, 'BATCH_WORKERS', 2)
+
+    stream = batch_service.generate_batch(_documents('bounded', 50))
+    next(stream)
+    assert renderer.started <= 4 + 1
+    stream.close()
+    assert renderer.started < 50
+
+
+def _archive(chunks):
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+def test_manifest_reports_each_item(monkeypatch):
+    monkeypatch.setattr(batch_service, 'generate_document', _Renderer())
+    documents = [
+        {'content_html': '<p>manifest ok</p>', 'document_type': 'PDF'},
+        {'content_html': '<p>manifest bad type</p>', 'document_type': 'odt'},
+        {'content_html': '<p>manifest fail</p>', 'document_type': 'docx'},
+        {'document_type': 'pdf'}
+    ]
+    archive = _archive(batch_service.generate_batch(documents))
+    manifest = json.loads(archive.read('manifest.json'))
+
+    assert [entry['index'] for entry in manifest] == [0, 1, 2, 3]
+    assert [entry['status'] for entry in manifest] == ['ok', 'error', 'error', 'error']
+    assert manifest[0]['filename'] == 'document_0000.pdf'
+    assert archive.read('document_0000.pdf') == b'<p>manifest ok</p>'
+    assert 'Invalid document_type' in manifest[1]['error']
+    assert manifest[2]['error'] == 'renderer failed'
+    assert manifest[3]['error'] == 'Missing required field: content_html'
+    assert sorted(archive.namelist()) == ['document_0000.pdf', 'manifest.json']
+
+
+def test_batch_endpoint_streams_rendered_documents(client):
+    response = client.post('/api/v1/generate/batch', json={'documents': [
+        {'content_html': '<p>batch endpoint one</p>', 'document_type': 'pdf'},
+        {'content_html': '<p>batch endpoint two</p>', 'document_type': 'docx'}
+    ]})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert archive.read('document_0000.pdf').startswith(b'%PDF-')
+    assert zipfile.is_zipfile(io.BytesIO(archive.read('document_0001.docx')))
+    assert [entry['status'] for entry in json.loads(archive.read('manifest.json'))] == ['ok', 'ok']
+
+
+def test_batch_endpoint_rejects_empty_and_oversized_batches(client, monkeypatch):
+    assert client.post('/api/v1/generate/batch', json={'documents': []}).status_code == 400
+    monkeypatch.setattr('app.api.document_api.MAX_BATCH_DOCUMENTS', 2)
+    response = client.post('/api/v1/generate/batch', json={'documents': _documents('too many', 3)})
+    assert response.status_code == 400
+    assert 'Too many documents' in response.json['error']
@@ -0,0 +1,43 @@
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from app.services import document_service
+from app.services.document_service import generate_document
+
+
+def test_documents_are_generated_into_a_memory_buffer():
+    buffer = generate_document('<p>spooled</p>', '', '', 'docx')
+    assert buffer.tell() == 0
+    assert not buffer._rolled
+    assert zipfile.is_zipfile(BytesIO(buffer.read()))
+    buffer.close()
+
+
+def test_large_documents_spill_to_disk(monkeypatch):
+    monkeypatch.setattr(document_service, 'SPOOL_MAX_SIZE', 1024)
+    buffer = generate_document('<p>spilled</p>', '', '', 'docx')
+    assert buffer._rolled
+    assert zipfile.is_zipfile(buffer)
+    buffer.close()
+
+
+def test_documents_can_be_written_to_a_path(tmp_path):
+    path = str(tmp_path / 'out.pdf')
+    assert generate_document('<p>to a path</p>', '', '', 'pdf', output_path=path) == path
+    with open(path, 'rb') as f:
+        assert f.read(5) == b'%PDF-'
+
+
+def test_unsupported_types_are_rejected():
+    with pytest.raises(ValueError):
+        generate_document('<p>x</p>', '', '', 'odt')
+
+
+def test_response_streams_the_whole_document(client):
+    response = client.post('/api/v1/generate', json={'content_html': '<p>streamed</p>', 'document_type': 'docx'})
+    assert response.status_code == 200
+    assert response.content_length == len(response.data)
+    assert response.headers['Content-Disposition'] == 'attachment; filename=document.docx'
+    assert response.mimetype == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
@@ -0,0 +1,62 @@
+import zipfile
+from io import BytesIO
+
+from docx import Document
+
+from app.services import docx_service, docx_stream
+from app.services.docx_service import generate_docx
+from app.services.docx_stream import BODY_MARKER, DOCUMENT_PART
+
+CONTENT = ''.join(f'<h2>Section {index}</h2><p>Paragraph {index}</p>' for index in range(25)) + \
+    '<table><tr><td>cell a</td><td>cell b</td></tr></table><ul><li>item one</li><li>item two</li></ul>'
+
+
+def _generate(watermark=None):
+    buffer = BytesIO()
+    generate_docx(CONTENT, '<p>Streamed header</p>', '<p>Streamed footer</p>', buffer, watermark=watermark)
+    buffer.seek(0)
+    return buffer
+
+
+def _stream_everything(monkeypatch):
+    monkeypatch.setattr(docx_service, 'STREAM_THRESHOLD', 0)
+    monkeypatch.setattr(docx_stream, 'STREAM_CHUNK_BLOCKS', 7)
+
+
+def test_streamed_docx_reopens_with_its_layout(monkeypatch):
+    _stream_everything(monkeypatch)
+    buffer = _generate()
+    assert BODY_MARKER.encode() not in zipfile.ZipFile(buffer).read(DOCUMENT_PART)
+
+    doc = Document(buffer)
+    texts = [paragraph.text for paragraph in doc.paragraphs]
+    assert texts[0] == 'Section 0'
+    assert 'Paragraph 24' in texts
+    assert 'item two' in texts
+    assert doc.tables[0].cell(0, 1).text == 'cell b'
+
+    assert all(section.header.paragraphs[0].text == 'Streamed header' for section in doc.sections)
+    assert [paragraph.text for paragraph in doc.sections[-1].footer.paragraphs] == ['Streamed footer']
+    assert all(not section.footer.paragraphs for section in doc.sections[:-1])
+
+
+def test_streamed_docx_keeps_the_watermark(monkeypatch):
+    _stream_everything(monkeypatch)
+    doc = Document(_generate(watermark='draft'))
+    assert all(b'DRAFT' in section.header.part.blob for section in doc.sections)
+    assert [paragraph.text for paragraph in doc.sections[-1].footer.paragraphs] == ['Streamed footer']
+
+
+def test_streamed_docx_matches_the_regular_build(monkeypatch):
+    regular = Document(_generate(watermark='draft'))
+    _stream_everything(monkeypatch)
+    streamed = Document(_generate(watermark='draft'))
+
+    def outline(doc):
+        return [(paragraph.style.name, paragraph.text) for paragraph in doc.paragraphs]
+
+    assert outline(streamed) == outline(regular)
+    assert len(streamed.sections) == len(regular.sections)
+    assert len(streamed.tables) == len(regular.tables)
+    assert [section.header.part.blob for section in streamed.sections] == \
+        [section.header.part.blob for section in regular.sections]
@@ -0,0 +1,40 @@
+import os
+
+from app.utils.file_cleanup import FileCleanupManager
+
+
+def _write(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    return path
+
+
+def test_cap_evicts_files_earliest_deadline_first(tmp_path):
+    manager = FileCleanupManager(delay=60, max_pending_bytes=250)
+    first = manager.mark_for_cleanup(_write(tmp_path / 'first', 100), delay=10)
+    second = manager.mark_for_cleanup(_write(tmp_path / 'second', 100), delay=20)
+    manager.mark_for_cleanup(_write(tmp_path / 'third', 100), delay=30)
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+    assert manager.stats()['pending_bytes'] == 200
+    assert manager.stats()['alarms'] == 1
+
+
+def test_scratch_directories_only_raise_one_alarm(tmp_path, caplog):
+    manager = FileCleanupManager(delay=60, max_pending_bytes=100, scratch_root=str(tmp_path))
+    scratch = manager.scratch_dir()
+    _write(os.path.join(scratch, 'render.pdf'), 200)
+    for _ in range(5):
+        manager.remeasure(scratch)
+    assert os.path.isdir(scratch)
+    assert manager.stats()['alarms'] == 1
+    assert len([record for record in caplog.records if 'over the' in record.message]) == 1
+
+    # Dropping back under the cap re-arms the alarm
+    manager.delete_now(scratch)
+    other = manager.scratch_dir()
+    manager.remeasure(other)
+    _write(os.path.join(other, 'render.pdf'), 200)
+    manager.remeasure(other)
+    assert manager.stats()['alarms'] == 2
+    manager.cleanup_all()
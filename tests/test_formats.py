@@ -0,0 +1,50 @@
+import zipfile
+from io import BytesIO
+
+from docx import Document
+from PyPDF2 import PdfReader
+
+from app.services.document_service import generate_documents
+from app.services.html_preprocess import PARSES
+
+
+def _parses():
+    return PARSES.values.get((), 0)
+
+
+def test_formats_share_one_parse():
+    before = _parses()
+    buffers = generate_documents('<h1>Shared parse</h1><p>Body</p>', '<p>Shared header</p>', '', ['pdf', 'docx', 'PDF'])
+    assert list(buffers) == ['pdf', 'docx']
+    # One parse each for the content and the header, used by both formats
+    assert _parses() - before == 2
+    assert 'Shared parse' in PdfReader(buffers['pdf']).pages[0].extract_text()
+    assert Document(buffers['docx']).paragraphs[0].text == 'Shared parse'
+
+
+def test_formats_request_returns_a_zip_of_each_format(client):
+    payload = {'content_html': '<p>formats zip</p>', 'footer_html': '<p>Footer</p>', 'formats': ['docx', 'pdf', 'docx']}
+    response = client.post('/api/v1/generate', json=payload)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=document.zip'
+
+    archive = zipfile.ZipFile(BytesIO(response.data))
+    assert archive.namelist() == ['document.docx', 'document.pdf']
+    assert archive.read('document.pdf').startswith(b'%PDF-')
+    assert Document(BytesIO(archive.read('document.docx'))).paragraphs[0].text == 'formats zip'
+
+    # The single-format cache entries are shared with plain generate requests
+    single = client.post('/api/v1/generate', json={'content_html': '<p>formats zip</p>', 'footer_html': '<p>Footer</p>',
+                                                   'document_type': 'pdf'})
+    assert single.data == archive.read('document.pdf')
+
+    etag = response.headers['ETag']
+    assert client.post('/api/v1/generate', json=payload, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_invalid_formats_are_rejected(client):
+    response = client.post('/api/v1/generate', json={'content_html': '<p>x</p>', 'formats': []})
+    assert response.status_code == 400
+    response = client.post('/api/v1/generate', json={'content_html': '<p>x</p>', 'formats': ['odt']})
+    assert response.status_code == 400
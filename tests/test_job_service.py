@@ -0,0 +1,135 @@
+import os
+import time
+import threading
+
+import pytest
+
+from app.services import job_service
+from app.services.job_service import JobManager, JobQueueFullError, SUCCEEDED, FAILED, CANCELLED, RUNNING
+
+
+def _fake_generate(content_html, header_html, footer_html, document_type, output_path, **kwargs):
+    with open(output_path, 'w') as f:
+        f.write(content_html)
+
+
+class _BlockingGenerator:
+    """Stand-in for generate_document that holds each job until released, recording the run order"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.order = []
+
+    def __call__(self, content_html, header_html, footer_html, document_type, output_path, **kwargs):
+        self.order.append(content_html)
+        self.release.wait(5)
+        if content_html == 'fail':
+            raise RuntimeError('render failed')
+        _fake_generate(content_html, header_html, footer_html, document_type, output_path)
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_leftover_results_are_swept_at_start(tmp_path):
+    stale = tmp_path / 'stale.pdf'
+    stale.write_text('old')
+    os.utime(stale, (time.time() - 120, time.time() - 120))
+    fresh = tmp_path / 'fresh.pdf'
+    fresh.write_text('another process')
+
+    manager = JobManager(workers=1, result_ttl=60, result_dir=str(tmp_path))
+    manager.start()
+    assert not stale.exists()
+    assert fresh.exists()
+
+
+def test_expired_results_are_purged_while_idle(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_service, 'generate_document', _fake_generate)
+    manager = JobManager(workers=1, result_ttl=0.1, result_dir=str(tmp_path), purge_interval=0.05)
+    job = manager.submit({'content_html': '<p>x</p>', 'document_type': 'pdf'})
+    assert _wait_for(lambda: job.status == SUCCEEDED)
+    assert os.path.exists(job.result_path)
+
+    # No submit or get from here on
+    assert _wait_for(lambda: not os.path.exists(job.result_path))
+    assert manager.stats()['retained'] == 0
+
+
+def test_jobs_run_by_priority(tmp_path, monkeypatch):
+    generator = _BlockingGenerator()
+    monkeypatch.setattr(job_service, 'generate_document', generator)
+    manager = JobManager(workers=1, result_dir=str(tmp_path))
+    first = manager.submit({'content_html': 'first', 'document_type': 'pdf'})
+    assert _wait_for(lambda: first.status == RUNNING)
+    low = manager.submit({'content_html': 'low', 'document_type': 'pdf'}, priority=0)
+    high = manager.submit({'content_html': 'high', 'document_type': 'pdf'}, priority=5)
+    generator.release.set()
+    assert _wait_for(lambda: low.status == SUCCEEDED and high.status == SUCCEEDED)
+    assert generator.order == ['first', 'high', 'low']
+
+
+def test_full_queue_is_rejected(tmp_path, monkeypatch):
+    generator = _BlockingGenerator()
+    monkeypatch.setattr(job_service, 'generate_document', generator)
+    manager = JobManager(workers=1, queue_size=1, result_dir=str(tmp_path))
+    running = manager.submit({'content_html': 'running', 'document_type': 'pdf'})
+    assert _wait_for(lambda: running.status == RUNNING)
+    manager.submit({'content_html': 'queued', 'document_type': 'pdf'})
+    with pytest.raises(JobQueueFullError):
+        manager.submit({'content_html': 'rejected', 'document_type': 'pdf'})
+    generator.release.set()
+
+
+def test_cancelled_jobs_never_keep_a_result(tmp_path, monkeypatch):
+    generator = _BlockingGenerator()
+    monkeypatch.setattr(job_service, 'generate_document', generator)
+    manager = JobManager(workers=1, result_dir=str(tmp_path))
+    running = manager.submit({'content_html': 'running', 'document_type': 'pdf'})
+    assert _wait_for(lambda: running.status == RUNNING)
+    queued = manager.submit({'content_html': 'queued', 'document_type': 'pdf'})
+
+    assert manager.cancel(queued.id).status == CANCELLED
+    assert manager.cancel(running.id).status == CANCELLED
+    generator.release.set()
+    assert _wait_for(lambda: manager.stats()['queued'] == 0 and os.listdir(str(tmp_path)) == [])
+    time.sleep(0.05)
+    assert generator.order == ['running']
+    assert running.status == CANCELLED
+    assert running.result_path is None
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_failed_jobs_report_the_error(tmp_path, monkeypatch):
+    generator = _BlockingGenerator()
+    generator.release.set()
+    monkeypatch.setattr(job_service, 'generate_document', generator)
+    manager = JobManager(workers=1, result_dir=str(tmp_path))
+    job = manager.submit({'content_html': 'fail', 'document_type': 'pdf'})
+    assert _wait_for(lambda: job.status == FAILED)
+    assert job.error == 'render failed'
+    assert job.to_dict()['expires_at'] is not None
+
+
+def test_job_api_round_trip(client):
+    response = client.post('/api/v1/jobs', json={'content_html': '<p>job api</p>', 'document_type': 'docx'})
+    assert response.status_code == 202
+    job_id = response.json['id']
+    assert response.headers['Location'].endswith(f'/api/v1/jobs/{job_id}')
+
+    assert _wait_for(lambda: client.get(f'/api/v1/jobs/{job_id}').json['status'] == SUCCEEDED)
+    result = client.get(f'/api/v1/jobs/{job_id}/result')
+    assert result.status_code == 200
+    assert result.headers['Content-Disposition'] == 'attachment; filename=document.docx'
+    assert result.data[:2] == b'PK'
+    result.close()
+
+    assert client.get('/api/v1/jobs/unknown').status_code == 404
+    assert client.delete('/api/v1/jobs/unknown').status_code == 404
+    assert client.get('/api/v1/jobs/unknown/result').status_code == 404
@@ -0,0 +1,64 @@
+from io import BytesIO
+
+import pytest
+from PyPDF2 import PdfReader
+
+from app.services import pdf_backends
+from app.services.html_preprocess import prepare_document
+from app.services.pdf_backends import PdfBackend, NativeBackend, WkhtmltopdfBackend, select_backend, render_pdf
+
+SIMPLE = '<h1>Report</h1><p>Plain paragraph.</p><ul><li>one</li><li>two</li></ul>'
+
+
+def _select(content_html, header_html='<p>Header</p>', footer_html='<p>Footer</p>', watermark=None):
+    return select_backend(prepare_document(content_html, header_html, footer_html, watermark)).name
+
+
+def test_simple_documents_use_the_native_backend():
+    assert NativeBackend().available()
+    assert _select(SIMPLE) == 'native'
+    assert _select(SIMPLE, watermark='DRAFT') == 'native'
+
+
+@pytest.mark.parametrize('content_html, header_html, watermark', [
+    ('<p>Some <b>bold</b> text</p>', '<p>Header</p>', None),
+    ('<p style="color: red">Styled</p>', '<p>Header</p>', None),
+    ('<p>Привет</p>', '<p>Header</p>', None),
+    (SIMPLE, '<img src="logo.png">', None),
+    (SIMPLE, '<p>Header</p>', 'ЧЕРНОВИК')
+])
+def test_other_documents_use_wkhtmltopdf(content_html, header_html, watermark):
+    assert _select(content_html, header_html, watermark=watermark) == 'wkhtmltopdf'
+
+
+def test_forced_backends(monkeypatch):
+    monkeypatch.setattr(pdf_backends, 'PDF_BACKEND', 'wkhtmltopdf')
+    assert _select(SIMPLE) == 'wkhtmltopdf'
+
+    # A forced backend that declines the document falls back to wkhtmltopdf
+    monkeypatch.setattr(pdf_backends, 'PDF_BACKEND', 'native')
+    assert _select(SIMPLE) == 'native'
+    assert _select('<p>Some <span>inline</span> markup</p>') == 'wkhtmltopdf'
+
+    monkeypatch.setattr(pdf_backends, 'PDF_BACKEND', 'prince')
+    with pytest.raises(ValueError, match='Unknown PDF backend'):
+        _select(SIMPLE)
+
+
+def test_backends_must_implement_render():
+    with pytest.raises(TypeError):
+        PdfBackend()
+    assert WkhtmltopdfBackend().accepts(prepare_document('<p>x</p>', '', ''))
+
+
+def test_native_pdf_has_header_on_every_page_and_footer_on_the_last():
+    content_html = ''.join(f'<p>Paragraph number {index} of a long report.</p>' for index in range(150))
+    buffer = BytesIO()
+    render_pdf(content_html, '<p>Running header</p>', '<p>Closing footer</p>', buffer, watermark='DRAFT')
+
+    pages = [page.extract_text() for page in PdfReader(BytesIO(buffer.getvalue())).pages]
+    assert len(pages) > 1
+    assert all('Running header' in text for text in pages)
+    assert ['Closing footer' in text for text in pages] == [False] * (len(pages) - 1) + [True]
+    assert 'Paragraph number 149' in pages[-1]
+    assert all('DRAFT' in text for text in pages)
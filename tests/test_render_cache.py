@@ -0,0 +1,79 @@
+import time
+
+from app.services.render_cache import RenderCache, make_cache_key, render_cache
+
+KEY = 'a' * 64
+OTHER = 'b' * 64
+
+
+def test_cache_key_covers_every_input():
+    base = ('<p>x</p>', '<p>h</p>', '<p>f</p>', 'pdf', 'DRAFT', None)
+    keys = {make_cache_key(*base)}
+    for index, value in enumerate(['<p>y</p>', '<p>H</p>', '<p>F</p>', 'docx', 'FINAL', 'letterhead']):
+        changed = list(base)
+        changed[index] = value
+        keys.add(make_cache_key(*changed))
+    assert len(keys) == 7
+    assert make_cache_key(*base) == make_cache_key(*base)
+
+
+def test_memory_then_disk_tier(tmp_path):
+    cache = RenderCache(memory_budget=1024, disk_budget=1024, cache_dir=str(tmp_path))
+    assert cache.get(KEY) is None
+    cache.put(KEY, b'document')
+    assert cache.get(KEY) == b'document'
+    assert cache.stats()['memory_hits'] == 1
+
+    # A new process finds the entry on disk and promotes it to memory
+    restarted = RenderCache(memory_budget=1024, disk_budget=1024, cache_dir=str(tmp_path))
+    assert restarted.get(KEY) == b'document'
+    assert restarted.get(KEY) == b'document'
+    assert restarted.stats()['disk_hits'] == 1
+    assert restarted.stats()['memory_hits'] == 1
+
+
+def test_budgets_evict_least_recently_used(tmp_path):
+    cache = RenderCache(memory_budget=400, disk_budget=150, cache_dir=str(tmp_path))
+    cache.put(KEY, b'x' * 100)
+    cache.put(OTHER, b'y' * 100)
+    stats = cache.stats()
+    assert stats['disk_items'] == 1
+    assert stats['disk_bytes'] == 100
+    assert stats['evictions'] == 1
+    assert not cache.accepts(0)
+    assert not cache.accepts(151)
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = RenderCache(memory_budget=1024, disk_budget=1024, cache_dir=str(tmp_path), ttl=0.05)
+    cache.put(KEY, b'document')
+    time.sleep(0.1)
+    assert cache.get(KEY) is None
+    assert cache.stats()['memory_items'] == 0
+    assert cache.stats()['disk_items'] == 0
+
+
+def test_repeat_requests_are_served_from_the_cache(client):
+    payload = {'content_html': '<p>render cache repeat</p>', 'document_type': 'docx'}
+    first = client.post('/api/v1/generate', json=payload)
+    assert first.status_code == 200
+    hits = render_cache.stats()['memory_hits']
+
+    second = client.post('/api/v1/generate', json=payload)
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert render_cache.stats()['memory_hits'] == hits + 1
+
+
+def test_matching_etag_is_not_modified(client):
+    payload = {'content_html': '<p>render cache etag</p>', 'document_type': 'pdf'}
+    etag = client.post('/api/v1/generate', json=payload).headers['ETag']
+
+    response = client.post('/api/v1/generate', json=payload, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    payload['watermark'] = 'DRAFT'
+    response = client.post('/api/v1/generate', json=payload, headers={'If-None-Match': etag})
+    assert response.status_code == 200
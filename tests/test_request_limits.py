@@ -0,0 +1,116 @@
+import gzip
+import json
+from io import BytesIO
+
+import pytest
+
+from app.utils.request_limits import JsonLimitScanner, RequestLimitMiddleware, RequestTooLargeError
+
+LIMITS = {'content_html': 16, 'watermark': 4}
+
+
+def _echo_app(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Type', 'application/octet-stream')])
+    return [body]
+
+
+def _call(body, encoding=None, content_type='application/json', max_bytes=1024):
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body)
+    }
+    if encoding:
+        environ['HTTP_CONTENT_ENCODING'] = encoding
+    response = {}
+
+    def start_response(status, headers):
+        response['status'] = int(status.split()[0])
+
+    middleware = RequestLimitMiddleware(_echo_app, max_bytes=max_bytes, field_limits=LIMITS)
+    response['body'] = b''.join(middleware(environ, start_response))
+    return response
+
+
+def _scan(chunks):
+    scanner = JsonLimitScanner(LIMITS)
+    for chunk in chunks:
+        scanner.feed(chunk)
+    return scanner
+
+
+def _bytewise(body):
+    return [body[i:i + 1] for i in range(len(body))]
+
+
+def test_escapes_split_across_chunks():
+    # 16 bytes of escaped quotes and backslashes, then a member the scanner must still see as a key
+    body = json.dumps({'content_html': '\\"' * 4, 'watermark': 'abcd'}).encode()
+    scanner = _scan(_bytewise(body))
+    assert not scanner.in_string
+    assert scanner.containers == []
+
+    # One byte more in the watermark is caught however the escapes are split
+    body = json.dumps({'content_html': '\\"' * 4, 'watermark': 'ab\\"c'}).encode()
+    with pytest.raises(RequestTooLargeError) as error:
+        _scan(_bytewise(body))
+    assert 'watermark' in str(error.value)
+
+
+def test_unicode_escape_split_across_chunks():
+    body = b'{"watermark": "\\u00e9", "content_html": "x"}'
+    with pytest.raises(RequestTooLargeError):
+        _scan([body[:16], body[16:]])
+
+
+def test_field_limits_apply_to_top_level_and_batch_items():
+    with pytest.raises(RequestTooLargeError):
+        _scan([json.dumps({'content_html': 'x' * 17}).encode()])
+    with pytest.raises(RequestTooLargeError):
+        _scan([json.dumps({'documents': [{'watermark': 'ok'}, {'watermark': 'x' * 5}]}).encode()])
+
+
+def test_nested_members_are_not_field_limited():
+    body = json.dumps({
+        'template_id': 'invoice',
+        'data': {'watermark': 'x' * 100, 'items': [{'content_html': 'x' * 100}]},
+        'documents': [{'data': {'watermark': 'x' * 100}}]
+    }).encode()
+    response = _call(body)
+    assert response['status'] == 200
+    assert response['body'] == body
+
+
+def test_gzip_bomb_is_rejected():
+    body = gzip.compress(b' ' * (10 * 1024 * 1024))
+    assert len(body) < 1024 * 64
+    response = _call(body, encoding='gzip', max_bytes=1024 * 1024)
+    assert response['status'] == 413
+
+
+def test_gzip_body_is_decoded():
+    body = json.dumps({'content_html': '<p>x</p>'}).encode()
+    response = _call(gzip.compress(body), encoding='gzip')
+    assert response['status'] == 200
+    assert response['body'] == body
+
+
+def test_unknown_encoding_is_unsupported():
+    response = _call(b'{}', encoding='br')
+    assert response['status'] == 415
+
+
+def test_truncated_body_is_bad_request():
+    body = gzip.compress(json.dumps({'content_html': '<p>x</p>'}).encode())
+    response = _call(body[:len(body) // 2], encoding='gzip')
+    assert response['status'] == 400
+
+
+def test_escaped_member_names_are_limited():
+    body = b'{"content\\u005fhtml": "' + b'x' * 17 + b'"}'
+    assert json.loads(body) == {'content_html': 'x' * 17}
+    with pytest.raises(RequestTooLargeError):
+        _scan(_bytewise(body))
+    assert _call(body)['status'] == 413
@@ -0,0 +1,116 @@
+import pytest
+
+from app.utils.request_limits import FIELD_LIMITS
+from app.services.template_registry import TemplateRegistry, TemplateError, TemplateTooLargeError, \
+    TemplateRegistryFullError
+
+INVOICE = {
+    'content_html': '<h1>Invoice {{ number }}</h1>{% for item in items %}<p>{{ item }}</p>{% endfor %}',
+    'header_html': '<p>ACME</p>',
+    'watermark': '{{ status }}',
+    'document_type': 'pdf'
+}
+
+
+def _registry(tmp_path=None, **kwargs):
+    return TemplateRegistry(template_dir=str(tmp_path) if tmp_path else None, **kwargs)
+
+
+def test_expand_renders_dynamic_fields_and_keeps_static_ones():
+    registry = _registry()
+    template = registry.register(INVOICE, 'invoice')
+    assert template.to_dict()['dynamic_fields'] == ['content_html', 'watermark']
+
+    expanded = registry.expand({'template_id': 'invoice', 'priority': 3,
+                                'data': {'number': 7, 'items': ['a', '<b>'], 'status': 'PAID'}})
+    assert expanded == {
+        'priority': 3,
+        'content_html': '<h1>Invoice 7</h1><p>a</p><p>&lt;b&gt;</p>',
+        'header_html': '<p>ACME</p>',
+        'watermark': 'PAID',
+        'document_type': 'pdf'
+    }
+    # Static fragments are passed through as the same object, so prepared assets are reused
+    assert expanded['header_html'] is INVOICE['header_html']
+
+
+def test_request_fields_override_the_template():
+    registry = _registry()
+    registry.register(INVOICE, 'invoice')
+    expanded = registry.expand({'template_id': 'invoice', 'watermark': 'COPY', 'document_type': 'docx'})
+    assert expanded['watermark'] == 'COPY'
+    assert expanded['document_type'] == 'docx'
+
+
+@pytest.mark.parametrize('request_data, message', [
+    ({'template_id': 'missing'}, 'Unknown template_id'),
+    ({'template_id': 'invoice', 'data': []}, 'must be an object'),
+    ({'template_id': 'invoice', 'content_html': '<p>x</p>'}, 'not both'),
+    ({'template_id': 'invoice', 'data': {'items': 5}}, 'failed to render content_html')
+])
+def test_bad_requests_raise_template_errors(request_data, message):
+    registry = _registry()
+    registry.register(INVOICE, 'invoice')
+    with pytest.raises(TemplateError, match=message):
+        registry.expand(request_data)
+
+
+def test_templates_are_sandboxed():
+    registry = _registry()
+    registry.register({'content_html': '{{ data.__class__.__mro__ }}'}, 'escape')
+    with pytest.raises(TemplateError):
+        registry.expand({'template_id': 'escape', 'data': {'data': {}}})
+    with pytest.raises(TemplateError, match='does not compile'):
+        registry.register({'content_html': '{% for %}'})
+
+
+def test_rendered_fields_are_held_to_the_field_limits():
+    registry = _registry()
+    template = registry.register({'content_html': '{% for i in range(n) %}<p>row</p>{% endfor %}'}, 'rows')
+    assert len(template.render({'n': 10}, {'content_html': 100})['content_html']) == 100
+    with pytest.raises(TemplateTooLargeError, match='over the limit of 100 bytes'):
+        template.render({'n': 11}, {'content_html': 100})
+
+
+def test_registration_is_idempotent_and_bounded():
+    registry = _registry(max_templates=1)
+    first = registry.register(INVOICE)
+    assert registry.register(dict(INVOICE)).id == first.id
+    with pytest.raises(TemplateRegistryFullError):
+        registry.register({'content_html': '<p>other</p>'})
+
+
+def test_templates_persist_and_bad_files_are_skipped(tmp_path):
+    _registry(tmp_path).register(INVOICE, 'invoice')
+    (tmp_path / 'broken.json').write_text('{not json')
+
+    reloaded = _registry(tmp_path)
+    assert [template.id for template in reloaded.list()] == ['invoice']
+    assert reloaded.delete('invoice') is not None
+    assert not (tmp_path / 'invoice.json').exists()
+
+
+def test_template_requests_through_the_api(client):
+    response = client.post('/api/v1/templates', json=dict(INVOICE, template_id='api-invoice'))
+    assert response.status_code == 201
+    assert client.get('/api/v1/templates/api-invoice').json['content_html'] == INVOICE['content_html']
+
+    data = {'number': 1, 'items': ['one'], 'status': 'DRAFT'}
+    response = client.post('/api/v1/generate', json={'template_id': 'api-invoice', 'data': data})
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF-')
+    response = client.post('/api/v1/generate', json={'template_id': 'api-unknown'})
+    assert response.status_code == 400
+
+    assert client.delete('/api/v1/templates/api-invoice').status_code == 204
+    assert client.get('/api/v1/templates/api-invoice').status_code == 404
+
+
+def test_oversized_template_renders_are_rejected(client, monkeypatch):
+    monkeypatch.setitem(FIELD_LIMITS, 'content_html', 1000)
+    client.post('/api/v1/templates', json={'template_id': 'api-rows', 'document_type': 'pdf',
+                                           'content_html': '{% for i in range(n) %}<p>row</p>{% endfor %}'})
+    response = client.post('/api/v1/generate', json={'template_id': 'api-rows', 'data': {'n': 1000}})
+    assert response.status_code == 413
+    response = client.post('/api/v1/jobs', json={'template_id': 'api-rows', 'data': {'n': 1000}})
+    assert response.status_code == 413